@@ -5,14 +5,17 @@ Created on Fri Apr 25 14:11:42 2025
 @author: ashka
 """
 
-import serial
+import sys
 import folium
 import webbrowser
 import time
 import os
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from serial_source import SerialSource
+
 # SETTINGS
-GPS_PORT = "COM6"
+GPS_PORT = None  # e.g. "COM6"; None finds the GPS by USB ID, then by its line format
 GPS_BAUD = 9600
 MAP_FILE = "live_gps_map.html"
 
@@ -45,18 +48,18 @@ def update_map(path_points):
     webbrowser.open("file://" + map_path)  # This will open a new tab every time — or cache reload in browser
 
 def main():
-    ser = serial.Serial(GPS_PORT, GPS_BAUD, timeout=1)
+    source = SerialSource(GPS_PORT, GPS_BAUD, sniff=r"GPS", name="GPS").start()
     print("Live GPS tracking started. Move around...")
 
     path_points = []
     last_update_time = 0
 
     while True:
-        line = ser.readline()
-        if not line:
+        item = source.get(timeout=1)
+        if item is None:
             continue
 
-        decoded_line = line.decode('ascii', errors='replace').strip()
+        decoded_line = item[1]
         print("Raw GPS:", decoded_line)
 
         lat, lon = extract_lat_lon(decoded_line)
@@ -9,20 +9,33 @@ from PIL import Image, ImageTk
 from math import sin, cos, radians
 from collections import deque
 from datetime import datetime
+import os
+import sys
 import time
 import threading
-import serial
 import numpy as np
-from scipy.signal import correlate, butter, filtfilt, welch
 import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from tkintermapview import TkinterMapView
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from ui_dispatch import UIDispatcher
+from kalman import AltitudeKalman
+from decimate import DecimatedSeries
+from geodesy import Station, Tracker
+from landing import LandingPredictor
+from serial_source import SerialSource
+from plot_panel import PlotPanel
+from sanity import RobustBaseline, SanityFilter
+from align import StreamAligner
+from telemetry_decode import decode_line
+from analysis_cache import WindowAnalysis, window_from
+
 # === MAIN WINDOW ===
 root = tk.Tk()
 root.title("🚀 Arbalest Rocketry - Telemetry Dashboard (Real GPS)")
 root.configure(bg="#1e1e1e")
 root.state("zoomed")
+ui = UIDispatcher(root)
 
 # === GRID CONFIG ===
 for i in range(6):
@@ -55,7 +68,7 @@ update_clock()
 
 # === TELEMETRY LABELS ===
 labels = {}
-fields = ["Yaw", "Pitch", "Roll", "Alt", "P", "T", "LED", "Lat", "Lon"]
+fields = ["Yaw", "Pitch", "Roll", "Alt", "Vel", "P", "T", "LED", "Lat", "Lon", "Rng", "Az", "El", "GSpd"]
 telemetry_frame = tk.Frame(root, bg="#1e1e1e")
 telemetry_frame.grid(row=2, column=0, sticky="nw", padx=20)
 for field in fields:
@@ -92,39 +105,30 @@ def draw_gauge(canvas, angle, label):
     canvas.create_line(cx, cy, x, y, fill="red", width=3)
     canvas.create_text(cx, cy + r + 10, text=f"{angle:.1f}°", font=("Arial", 10))
 
+def draw_gauges(yaw, pitch, roll):
+    draw_gauge(yaw_canvas, yaw % 360, "Yaw")
+    draw_gauge(pitch_canvas, pitch, "Pitch")
+    draw_gauge(roll_canvas, roll, "Roll")
+
 # === TELEMETRY PLOTS ===
-telemetry_data = {k: deque(maxlen=100) for k in ["time", "Alt", "P", "T", "Lat", "Lon"]}
+# Aligned rows only (see STREAM ALIGNMENT), so every channel here shares the time column
+telemetry_data = {k: deque(maxlen=100) for k in ["time", "Alt", "P", "T", "Pitch", "Roll", "Lat", "Lon"]}
 plot_fields = ["Alt", "P", "T", "Lat", "Lon"]
-figs, axes, plots = [], [], []
 plot_frame = tk.Frame(root, bg="#1e1e1e")
 plot_frame.grid(row=4, column=0, columnspan=2, sticky="nsew", padx=10, pady=10)
-for i, field in enumerate(plot_fields):
-    plot_frame.grid_rowconfigure(i // 2, weight=1)
-    plot_frame.grid_columnconfigure(i % 2, weight=1)
-    fig, ax = plt.subplots(figsize=(3, 1.5))
-    fig.patch.set_facecolor('#1e1e1e')
-    ax.set_facecolor('#2e2e2e')
-    ax.tick_params(colors='white')
-    ax.set_title(f"{field} vs Time", color='white', fontsize=8)
-    ax.set_xlabel("Time (s)", color='white', fontsize=6)
-    ax.set_ylabel(field, color='white', fontsize=6)
-    line, = ax.plot([], [], color='cyan', linewidth=1)
-    canvas = FigureCanvasTkAgg(fig, master=plot_frame)
-    canvas.get_tk_widget().grid(row=i // 2, column=i % 2, padx=5, pady=5, sticky="nsew")
-    figs.append(fig)
-    axes.append(ax)
-    plots.append((line, canvas))
+panel = PlotPanel(plot_frame, plot_fields)
+panel.widget.pack(fill="both", expand=True)
+
+# Full-session history per plotted field; the deques above keep the recent window
+history = {field: DecimatedSeries() for field in plot_fields}
 
 def update_plots():
-    times = telemetry_data["time"]
-    for i, field in enumerate(plot_fields):
-        line, canvas = plots[i]
-        y = telemetry_data[field]
-        if len(times) == len(y):
-            line.set_data(times, y)
-            axes[i].relim()
-            axes[i].autoscale_view()
-            canvas.draw()
+    for field in panel.channels:
+        series = history[field]
+        if len(series):
+            # Whole session, reduced to about one min/max pair per pixel column
+            panel.set_data(field, *series.view(panel.width))
+    panel.draw()
 
 # === MAP ===
 map_frame = tk.Frame(root)
@@ -133,60 +137,193 @@ map_widget = TkinterMapView(map_frame, width=400, height=400, corner_radius=10)
 map_widget.pack(fill="both", expand=True)
 map_widget.set_position(43.7735, -79.5015)
 map_marker = map_widget.set_marker(43.7735, -79.5015, text="Rocket")
+station = Station()
+map_widget.set_marker(station.lat, station.lon, text="Ground Station")
+
+# === STATE ESTIMATOR ===
+kf = AltitudeKalman()       # baro height above the pad, with GPS altitude fused through its datum offset
+tracker = Tracker(station)
+pad_alt = RobustBaseline()  # median of the first GPS altitudes; heights for az/el are taken relative to it
+baro_pad = RobustBaseline() # same for the telemetry baro altitude
+sanity = SanityFilter()
 
-def update_gps_data(lat, lon):
-    now = time.time() - start_time
-    telemetry_data["time"].append(now)
-    telemetry_data["Lat"].append(lat)
-    telemetry_data["Lon"].append(lon)
+# === STREAM ALIGNMENT ===
+# Telemetry (about 10 Hz) is the base timeline; GPS fixes (about 1 Hz) are interpolated onto it.
+# A row waits for the next fix, or at most 2 s, before it is stored.
+aligner = StreamAligner("telemetry", max_wait=2.0)
+aligner.add_stream("gps", ["Lat", "Lon", "GPS_Alt"], max_gap=2.5)
 
-    labels["Lat"].config(text=f"{lat:.5f}")
-    labels["Lon"].config(text=f"{lon:.5f}")
+def store_aligned(rows):
+    if rows:
+        analysis.bump()
+    for t, row in rows:
+        telemetry_data["time"].append(t)
+        for key, values in telemetry_data.items():
+            if key != "time":
+                values.append(row.get(key, np.nan))
 
+def update_map(lat, lon):
     map_marker.set_position(lat, lon)
     map_widget.set_position(lat, lon)
 
-    update_plots()
+def height_above_pad():
+    # On the baro zero once telemetry has arrived; GPS-only until then
+    if kf.baro_frame:
+        return kf.alt
+    return kf.alt - pad_alt.value if pad_alt.value is not None else 0.0
+
+def show_estimate():
+    ui.post_text(labels["Alt"], f"{height_above_pad():.1f}")     # above the pad, like every other consumer
+    ui.post_text(labels["Vel"], f"{kf.vel:.1f}")
+
+# Runs on the Tk loop via ui.submit(); widget refreshes are coalesced per batch
+def update_gps_data(now, lat, lon, alt=None):
+    fix = sanity.check(now, {"Lat": lat, "Lon": lon, "GPS_Alt": alt})
+    if "Lat" not in fix or "Lon" not in fix:
+        return
+    alt = fix.get("GPS_Alt")
+    store_aligned(aligner.push("gps", now, fix))
+    history["Lat"].append(now, lat)
+    history["Lon"].append(now, lon)
+    if alt is not None:
+        kf.update_gps(now, alt)
+        show_estimate()
+        pad_alt.add(alt)
+    height = height_above_pad()
+    track = tracker.update(now, lat, lon, station.alt + height)
+    if height > 5 and kf.vel < -2:
+        landing.maybe_run(now, {"lat": lat, "lon": lon, "alt": height, "vz": kf.vel, "drift": tracker.drift})
+    ui.post_text(labels["Rng"], f"{track['Range']:.0f} m")
+    ui.post_text(labels["Az"], f"{track['Az']:.1f}°")
+    ui.post_text(labels["El"], f"{track['El']:.1f}°")
+    if track["GSpd"] is not None:
+        ui.post_text(labels["GSpd"], f"{track['GSpd']:.1f} m/s")
+
+    ui.post_text(labels["Lat"], f"{lat:.5f}")
+    ui.post_text(labels["Lon"], f"{lon:.5f}")
+    ui.post("map", update_map, lat, lon)
+    ui.post("plots", update_plots)
+
+def update_telemetry_data(now, rec):
+    sanity.check(now, rec)
+    for key in ("Yaw", "Pitch", "Roll", "P", "T", "LED"):
+        if key in rec:
+            val = rec[key]
+            ui.post_text(labels[key], f"{val:.2f}" if isinstance(val, float) else str(val))
+    if isinstance(rec.get("Alt"), float):
+        rec["Alt"] -= baro_pad.add(rec["Alt"])     # plotted, stored and fused above the pad
+        kf.update_baro(now, rec["Alt"])
+        show_estimate()
+    for key in ("Alt", "P", "T"):
+        if key in rec:
+            history[key].append(now, rec[key])
+    ui.post("gauges", draw_gauges, rec.get("Yaw", 0.0), rec.get("Pitch", 0.0), rec.get("Roll", 0.0))
+    store_aligned(aligner.push("telemetry", now, rec))
+    ui.post("plots", update_plots)
+
+# === LANDING PREDICTION ===
+# Ensembles run on a process pool every few seconds while descending
+landing = LandingPredictor()
+landing_shapes = []
+
+def heat_color(w):
+    return f"#ff{int(220 * (1 - w)):02x}00"     # yellow (sparse) to red (dense)
+
+def draw_landing():
+    try:
+        result = landing.poll()
+        if result:
+            for shape in landing_shapes:
+                shape.delete()
+            landing_shapes.clear()
+            for corners, w in reversed(result["heat"]):
+                landing_shapes.append(map_widget.set_polygon(corners, fill_color=heat_color(w), outline_color=heat_color(w), border_width=1))
+            landing_shapes.append(map_widget.set_polygon(result["ellipse"], fill_color=None, outline_color="red", border_width=2))
+            landing_shapes.append(map_widget.set_marker(result["lat"], result["lon"], text=f"Landing ~{result['eta']:.0f}s"))
+    finally:
+        root.after(250, draw_landing)    # keep polling even if a map call fails
 
 # === REAL GPS SERIAL ===
+GPS_PORT = None  # e.g. 'COM7'; None finds the GPS by USB ID, then by its line format
+GPS_BAUD = 9600
+
+gps_source = SerialSource(GPS_PORT, GPS_BAUD, sniff=r"^GPS:", name="GPS")
+source_label = tk.Label(clock_frame, text="", font=("Consolas", 10), fg="white", bg="#1e1e1e")
+source_label.pack(anchor="w")
+
+# === TELEMETRY SERIAL ===
+TELEMETRY_PORT = None  # e.g. 'COM6'; None finds the receiver by USB ID, then by its line format
+TELEMETRY_BAUD = 115200
+
+tel_source = SerialSource(TELEMETRY_PORT, TELEMETRY_BAUD, sniff=r"Received:.*Yaw:", name="TLM")
+
+def update_source_status():
+    text = f"{gps_source.describe()} | {tel_source.describe()}"
+    if sanity.rejected_total:
+        text += f" [{sanity.rejected_total} rejected]"
+    source_label.config(text=text)
+    root.after(1000, update_source_status)
+
 def extract_lat_lon(line):
+    lat, lon, _ = extract_fix(line)
+    return lat, lon
+
+# "GPS: <lat> <lon> [<alt>]" - altitude is optional and fused when present
+def extract_fix(line):
     try:
         parts = line.split()
         if len(parts) >= 3 and parts[0] == "GPS:":
             lat = float(parts[1])
             lon = float(parts[2])
-            return lat, lon
+            alt = float(parts[3]) if len(parts) >= 4 else None
+            return lat, lon, alt
     except:
-        return None, None
-    return None, None
+        return None, None, None
+    return None, None, None
 
+# The source's own thread owns the port and reconnects; this one turns lines into UI work
 def read_gps_serial():
-    try:
-        ser = serial.Serial("COM7", 9600, timeout=1)
-        print("Reading GPS data from COM7...")
-    except Exception as e:
-        print(f"Failed to open serial: {e}")
-        return
-
+    gps_source.start()
     while True:
         try:
-            line = ser.readline().decode('ascii', errors='replace').strip()
+            item = gps_source.get(timeout=1.0)
+            if item is None:
+                continue
+            t, line = item
             print("GPS:", line)
-            lat, lon = extract_lat_lon(line)
+            lat, lon, alt = extract_fix(line)
             if lat and lon:
-                update_gps_data(lat, lon)
+                ui.submit(update_gps_data, t - start_time, lat, lon, alt)
         except Exception as e:
-            print("Serial read error:", e)
+            print("GPS parse error:", e)
+            continue
+
+def read_telemetry_serial():
+    tel_source.start()
+    while True:
+        try:
+            item = tel_source.get(timeout=1.0)
+            if item is None:
+                continue
+            t, line = item
+            if "Yaw:" not in line:
+                continue
+            rec = decode_line(line)
+            if rec:
+                ui.submit(update_telemetry_data, t - start_time, rec)
+        except Exception as e:
+            print("Telemetry parse error:", e)
             continue
 
 # === ADVANCED ANALYSIS ===
+# Results are memoised per window version, so pressing a button again without new data is free
+analysis = WindowAnalysis(window_from(telemetry_data))
+
 def plot_psd(field):
-    data = np.array(telemetry_data[field])
-    times = np.array(telemetry_data["time"])
+    times, data = analysis.series(field)
     if len(data) < 10:
         return
-    fs = 1 / (np.mean(np.diff(times)))
-    f, Pxx = welch(data, fs=fs, nperseg=min(256, len(data)))
+    f, Pxx = analysis.psd(field)
     fig, ax = plt.subplots(figsize=(5, 3))
     ax.semilogy(f, Pxx, color='lime')
     ax.set_title(f"PSD of {field}", fontsize=10)
@@ -197,33 +334,23 @@ def plot_psd(field):
     plt.show()
 
 def plot_cross_corr(x_key, y_key):
-    x = np.array(telemetry_data[x_key])
-    y = np.array(telemetry_data[y_key])
+    times, x, y = analysis.series(x_key, y_key)
     if len(x) < 10 or len(y) < 10:
         return
-    corr = correlate(x - np.mean(x), y - np.mean(y), mode='full')
-    lags = np.arange(-len(x)+1, len(x))
+    lags, corr = analysis.cross_corr(x_key, y_key)
     fig, ax = plt.subplots(figsize=(5, 3))
     ax.plot(lags, corr, color='orange')
     ax.set_title(f"Cross-Correlation: {x_key} vs {y_key}", fontsize=10)
-    ax.set_xlabel("Lag")
+    ax.set_xlabel("Lag [s]")
     ax.set_ylabel("Correlation")
     plt.tight_layout()
     plt.show()
 
-def low_pass_filter(data, fs, cutoff=0.2):
-    nyq = 0.5 * fs
-    norm_cutoff = cutoff / nyq
-    b, a = butter(2, norm_cutoff, btype='low', analog=False)
-    return filtfilt(b, a, data)
-
 def plot_filtered_altitude():
-    data = np.array(telemetry_data["Alt"])
-    times = np.array(telemetry_data["time"])
+    times, data = analysis.series("Alt")
     if len(data) < 10:
         return
-    fs = 1 / (np.mean(np.diff(times)))
-    filtered = low_pass_filter(data, fs)
+    filtered = analysis.lowpass("Alt", cutoff=0.2)
     fig, ax = plt.subplots(figsize=(5, 3))
     ax.plot(times, data, label="Raw", alpha=0.5)
     ax.plot(times, filtered, label="Filtered", color='magenta')
@@ -245,6 +372,11 @@ tk.Button(analysis_frame, text="Filter Altitude", command=plot_filtered_altitude
 
 # === START ===
 start_time = time.time()
+ui.start()
+draw_landing()
+update_source_status()
 gps_thread = threading.Thread(target=read_gps_serial, daemon=True)
 gps_thread.start()
+tel_thread = threading.Thread(target=read_telemetry_serial, daemon=True)
+tel_thread.start()
 root.mainloop()
@@ -5,15 +5,26 @@ Created on Fri May 27 22:12:00 2025
 @author: ashka
 """
 from vpython import *
-import serial
 import math
 import numpy as np
+import os
 import re
-from time import sleep
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from ahrs import Madgwick
+from geodesy import Station
+from link_monitor import LinkMonitor
+from sanity import RobustBaseline, SanityFilter
+from serial_source import SerialSource
+from telemetry_decode import decode_line
+from trail import APPEND, REBUILD, Trail
+from vehicles import DEFAULT_VEHICLE
 
 # === Serial Setup ===
-ad = serial.Serial('COM6', 115200)  # Change COM port if needed
-sleep(1)
+SERIAL_PORT = None  # e.g. 'COM6'; None finds the receiver by USB ID, then by its line format
+source = SerialSource(SERIAL_PORT, 115200, sniff=r"qw:|IMU:", name="Receiver").start()
 
 # === Scene Setup ===
 scene.range = 5
@@ -42,49 +53,206 @@ fin2 = box(length=0.1, height=1, width=1, color=color.white, pos=vector(-0.5, -0
 fin3 = box(length=1, height=1, width=0.1, color=color.white, pos=vector(0, -0.5, 0.5))
 fin4 = box(length=1, height=1, width=0.1, color=color.white, pos=vector(0, -0.5, -0.5))
 myObj = compound([stage1, stage2, nose, fin1, fin2, fin3, fin4])
+model_home = myObj.pos
+
+# === Link Quality Readout
+link = LinkMonitor()
+scene.append_to_caption("\nLINK: ")
+link_text = wtext(text="---")
+last_link_update = 0
+
+# === Vehicles
+# The full model follows the focused vehicle; every other vehicle gets one pointer arrow
+vehicle_lines = {}  # vehicle ID -> newest quaternion line (or AHRS quaternion) since the last frame
+filters = {}        # vehicle ID -> Madgwick, for payloads that send raw IMU lines
+pointers = {}
+focus = None
+last_vid = None     # vehicle heard most recently; bare GPS lines carry no ID and belong to it
+
+def set_focus(m):
+    global focus
+    focus = m.selected
+    for vid, pointer in pointers.items():
+        pointer.visible = vid != focus
+
+def pointer_home(vid):
+    return vector(8 * (list(pointers).index(vid) + 1), 0, 0)
+
+def add_vehicle(vid):
+    global focus
+    pointers[vid] = arrow(pos=vector(8 * (len(pointers) + 1), 0, 0), length=3, shaftwidth=0.3,
+                          color=color.yellow, visible=focus is not None)
+    trails[vid] = (Trail(TRAIL_POINTS, TRAIL_SPACING), curve(color=color.cyan, radius=0.15, visible=trajectory_mode))
+    vehicle_menu.choices = [c for c in vehicle_menu.choices if c != "---"] + [vid]
+    if focus is None:
+        focus = vid
+        vehicle_menu.selected = vid
+
+scene.append_to_caption("\nVehicle: ")
+vehicle_menu = menu(choices=["---"], bind=set_focus)
+
+# === Trajectory Mode
+# Models fly at their ENU position from the pad and leave a trail. The trail keeps at most
+# TRAIL_POINTS points and spaces them further apart as the path grows, so a whole flight
+# draws as fast as its first minute.
+TRAJ_SCALE = 0.05       # scene units per metre
+TRAIL_POINTS = 2000
+TRAIL_SPACING = 1.0     # m between trail points at the start
+trajectory_mode = False
+positions = {}          # vehicle ID -> [east, north, up] in m from the pad
+pads = {}               # vehicle ID -> geodesy.Station at the pad
+pad_fixes = {}          # vehicle ID -> RobustBaselines of lat, lon and height: the pad is their median
+alt_bases = {}          # vehicle ID -> RobustBaseline of the baro altitude
+sanity = {}             # vehicle ID -> SanityFilter for the position fields
+trails = {}             # vehicle ID -> (Trail, curve)
+
+def to_scene(p):
+    # x east, y up, z south (right-handed, y up like the model)
+    return vector(p[0], p[2], -p[1]) * TRAJ_SCALE
+
+def update_position(t, vid, text):
+    rec = decode_line(text)
+    if not rec:
+        return
+    sanity.setdefault(vid, SanityFilter()).check(t, rec)    # arrival time, so each line is rate-checked
+    p = positions.setdefault(vid, [0.0, 0.0, 0.0])
+    alt = rec.get("Alt", rec.get("Filt_Alt"))
+    if isinstance(alt, float):
+        p[2] = alt - alt_bases.setdefault(vid, RobustBaseline()).add(alt)
+    if isinstance(rec.get("Lat"), float) and isinstance(rec.get("Lon"), float):
+        h = rec.get("GPS_Alt", 0.0)
+        base = pad_fixes.setdefault(vid, (RobustBaseline(), RobustBaseline(), RobustBaseline()))
+        if not base[0].ready:
+            # One noisy first fix would offset the whole trail; follow the median until it settles
+            pads[vid] = Station(*(b.add(x) for b, x in zip(base, (rec["Lat"], rec["Lon"], h))))
+            if base[0].ready:
+                trails[vid][0].clear(TRAIL_SPACING)     # drawn around provisional origins
+                trails[vid][1].clear()
+        e, n, u = (float(c) for c in pads[vid].enu(rec["Lat"], rec["Lon"], h))
+        p[0], p[1] = e, n
+        if vid not in alt_bases and "GPS_Alt" in rec:
+            p[2] = u
+    trail, path = trails[vid]
+    action = trail.add(p)
+    if action == APPEND:
+        path.append(to_scene(p))
+    elif action == REBUILD:
+        path.clear()
+        path.append([to_scene(q) for q in trail.points])
+
+def set_trajectory(c):
+    global trajectory_mode
+    trajectory_mode = c.checked
+    for _, path in trails.values():
+        path.visible = trajectory_mode
+    if not trajectory_mode:
+        myObj.pos = model_home
+        for a in (frontArrow, upArrow, sideArrow):
+            a.pos = vector(0, 0, 0)
+        for vid, pointer in pointers.items():
+            pointer.pos = pointer_home(vid)
+    set_follow(follow_box)
+
+def set_follow(c):
+    scene.camera.follow(myObj if trajectory_mode and c.checked else None)
+
+scene.append_to_caption("  ")
+checkbox(text="Trajectory", bind=set_trajectory, checked=False)
+follow_box = checkbox(text="Follow camera", bind=set_follow, checked=True)
+
+def quaternion(data):
+    # Use regex to extract quaternion values robustly
+    match = re.search(r"qw[: ]\s*(-?[\d.]+)[, ]+qx[: ]\s*(-?[\d.]+)[, ]+qy[: ]\s*(-?[\d.]+)[, ]+qz[: ]\s*(-?[\d.]+)", data)
+    if not match:
+        return None
+    return tuple(float(g) for g in match.groups())
+
+def orientation(q):
+    q0, q1, q2, q3 = q
+
+    # Normalize quaternion
+    norm = math.sqrt(q0*q0 + q1*q1 + q2*q2 + q3*q3)
+    if norm == 0:
+        return None
+    q0, q1, q2, q3 = q0 / norm, q1 / norm, q2 / norm, q3 / norm
+
+    # Compute orientation
+    roll = -math.atan2(2*(q0*q1 + q2*q3), 1 - 2*(q1*q1 + q2*q2))
+    pitch = math.asin(2*(q0*q2 - q3*q1))
+    yaw = -math.atan2(2*(q0*q3 + q1*q2), 1 - 2*(q2*q2 + q3*q3)) - np.pi/2
+
+    k = vector(math.cos(yaw)*math.cos(pitch), math.sin(pitch), math.sin(yaw)*math.cos(pitch))
+    y_ref = vector(0, 1, 0)
+    s = cross(k, y_ref)
+    v = cross(s, k)
+    vrot = v * math.cos(roll) + cross(k, v) * math.sin(roll)
+    return k, vrot
 
 # === Main Loop
 while True:
     rate(60)
     try:
-        while ad.in_waiting:
-            last_line = ad.readline()
-        data = last_line.decode('utf-8', errors='ignore').strip()
-        # print("Raw:", data)
-
-        # Use regex to extract quaternion values robustly
-        match = re.search(r"qw[: ]\s*(-?[\d.]+)[, ]+qx[: ]\s*(-?[\d.]+)[, ]+qy[: ]\s*(-?[\d.]+)[, ]+qz[: ]\s*(-?[\d.]+)", data)
-        if not match:
-            continue
-
-        q0 = float(match.group(1))
-        q1 = float(match.group(2))
-        q2 = float(match.group(3))
-        q3 = float(match.group(4))
-
-        # Normalize quaternion
-        norm = math.sqrt(q0*q0 + q1*q1 + q2*q2 + q3*q3)
-        if norm == 0:
-            continue
-        q0, q1, q2, q3 = q0 / norm, q1 / norm, q2 / norm, q3 / norm
-
-        # Compute orientation
-        roll = -math.atan2(2*(q0*q1 + q2*q3), 1 - 2*(q1*q1 + q2*q2))
-        pitch = math.asin(2*(q0*q2 - q3*q1))
-        yaw = -math.atan2(2*(q0*q3 + q1*q2), 1 - 2*(q2*q2 + q3*q3)) - np.pi/2
-
-        k = vector(math.cos(yaw)*math.cos(pitch), math.sin(pitch), math.sin(yaw)*math.cos(pitch))
-        y_ref = vector(0, 1, 0)
-        s = cross(k, y_ref)
-        v = cross(s, k)
-        vrot = v * math.cos(roll) + cross(k, v) * math.sin(roll)
-
-        # Apply to model
-        frontArrow.axis = k
-        sideArrow.axis = cross(k, vrot)
-        upArrow.axis = vrot
-        myObj.axis = k
-        myObj.up = vrot
+        # Every line goes to the link monitor; only the newest quaternion per vehicle is drawn.
+        # Bare GPS lines are not link packets but still feed the trails, so classify every line
+        now = time.time()
+        for t, text in source.drain():
+            link.observe_line(t, text)
+            pose_line = "qw" in text or "IMU:" in text
+            fix_line = "Lat:" in text or "GPS:" in text or "Alt:" in text
+            if pose_line or fix_line:
+                m = re.search(r"\bID:\s*(\d+)", text)
+                bare_gps = text.startswith("GPS:")
+                if m:
+                    vid = m.group(1)
+                elif bare_gps and last_vid is not None:
+                    vid = last_vid
+                else:
+                    vid = DEFAULT_VEHICLE
+                if not bare_gps:
+                    last_vid = vid
+                if vid not in pointers:
+                    add_vehicle(vid)
+                if fix_line and not pose_line:
+                    # Positions feed the trails all the time, so switching the mode on shows the whole flight
+                    update_position(t, vid, text)
+                elif "IMU:" in text:
+                    # Raw samples: every batch goes through the filter, then its attitude is drawn
+                    rec = decode_line(text)
+                    if rec is not None:
+                        f = filters.setdefault(vid, Madgwick())
+                        vehicle_lines[vid] = f.update_batch(rec["IMU"], 1.0 / rec["IMU_rate"])
+                elif vid not in filters:
+                    vehicle_lines[vid] = text
+        if now - last_link_update >= 1:
+            link_text.text = f"{source.describe(now)} | {link.summary(now)}"
+            last_link_update = now
+
+        if trajectory_mode:
+            for vid, p in positions.items():
+                if vid == focus:
+                    myObj.pos = to_scene(p)
+                    for a in (frontArrow, upArrow, sideArrow):
+                        a.pos = myObj.pos
+                else:
+                    pointers[vid].pos = to_scene(p)
+
+        for vid, data in vehicle_lines.items():
+            q = data if isinstance(data, tuple) else quaternion(data)
+            pose = orientation(q) if q is not None else None
+            if pose is None:
+                continue
+            k, vrot = pose
+            if vid == focus:
+                # Apply to model
+                frontArrow.axis = k
+                sideArrow.axis = cross(k, vrot)
+                upArrow.axis = vrot
+                myObj.axis = k
+                myObj.up = vrot
+            else:
+                pointers[vid].axis = 3 * k
+                pointers[vid].up = vrot
+        vehicle_lines.clear()
 
     except Exception as e:
         print(f"⚠️ Error: {e}")
@@ -54,6 +54,11 @@ void loop() {
       Serial.print("Received: ");
       Serial.write(buf, len);
       Serial.println();
+      // Link quality for the ground station's link monitor
+      Serial.print("Link: RSSI: ");
+      Serial.print(rf95.lastRssi());
+      Serial.print(", SNR: ");
+      Serial.println(rf95.lastSNR());
     } else {
       Serial.println("Receive failed");
     }
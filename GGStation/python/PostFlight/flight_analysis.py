@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+"""
+Post-flight batch analysis of recorded ground-station logs.
+
+Logs are the raw receiver lines, one per line, optionally prefixed with a
+receive timestamp and a tab ("<seconds>\\t<line>"). Lines without a
+timestamp are spaced at --rate Hz. The first pass decodes each log in
+chunks into one .npy file per channel next to the log (<log>.cols/).
+Later runs reuse those and memory-map them instead of re-parsing.
+
+Each flight is then split into per-channel jobs (PSD, low-pass filter,
+summary figure) plus one per-flight job (flight events, cross-correlation,
+optional Kalman smoothing). All jobs run on a process pool. Output is one
+report.json plus PNG figures per flight, rendered with the Agg backend
+so no display is needed.
+
+    python flight_analysis.py flight1.log flight2.log -o reports --workers 4
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from scipy.signal import butter, sosfiltfilt, welch, correlate, detrend
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from telemetry_decode import decode_line
+from flight_events import FlightEventDetector
+from kalman import smooth
+from geodesy import Station, ground_speed, vincenty
+from align import align_batch
+from sanity import RobustBaseline
+
+CHUNK_LINES = 200_000
+PLOT_POINTS = 20_000
+ALT_KEYS = ("Filt_Alt", "Alt")
+ACC_KEYS = ("Filt_Acc",)
+CORR_PAIRS = (("Pitch", "Roll"), ("AngleX", "AngleY"), ("Alt", "P"))
+
+
+# === LOG READING ===
+def _split_stamp(line):
+    head, sep, rest = line.partition("\t")
+    if sep:
+        try:
+            return float(head), rest
+        except ValueError:
+            pass
+    return None, line
+
+
+def read_log_chunks(path, rate, chunk_lines=CHUNK_LINES):
+    """Yield (times, {channel: values}, events) for each chunk of decoded lines."""
+    index = 0
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        while True:
+            lines = list(itertools.islice(f, chunk_lines))
+            if not lines:
+                return
+            times, rows, events = [], [], []
+            for raw in lines:
+                stamp, line = _split_stamp(raw.strip())
+                rec = decode_line(line)
+                if rec is None:
+                    continue
+                t = stamp if stamp is not None else index / rate
+                index += 1
+                if "EVENT" in rec:
+                    events.append((t, rec["EVENT"]))
+                    continue
+                times.append(t)
+                rows.append(rec)
+            cols = {}
+            for i, rec in enumerate(rows):
+                for key, val in rec.items():
+                    if isinstance(val, float):
+                        if key not in cols:
+                            cols[key] = np.full(len(rows), np.nan)
+                        cols[key][i] = val
+            yield np.asarray(times, dtype=float), cols, events
+
+
+def cache_dir_for(path):
+    return path + ".cols"
+
+
+def build_cache(path, rate):
+    """Decode a log into per-channel .npy files unless an up-to-date cache exists."""
+    out = cache_dir_for(path)
+    meta_path = os.path.join(out, "meta.json")
+    st = os.stat(path)
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta["size"] == st.st_size and meta["mtime"] == st.st_mtime and meta["rate"] == rate:
+            return out
+    os.makedirs(out, exist_ok=True)
+
+    time_chunks, chunks, lengths, events = [], {}, [], []
+    for times, cols, evs in read_log_chunks(path, rate):
+        for key in cols:
+            if key not in chunks:
+                # Channel first seen in this chunk: pad the earlier chunks with NaN
+                chunks[key] = [np.full(n, np.nan) for n in lengths]
+        for key, parts in chunks.items():
+            parts.append(cols.get(key, np.full(len(times), np.nan)))
+        time_chunks.append(times)
+        lengths.append(len(times))
+        events.extend(evs)
+
+    np.save(os.path.join(out, "time.npy"), np.concatenate(time_chunks) if time_chunks else np.zeros(0))
+    for key, parts in chunks.items():
+        np.save(os.path.join(out, f"{key}.npy"), np.concatenate(parts))
+    meta = {"source": os.path.abspath(path), "size": st.st_size, "mtime": st.st_mtime, "rate": rate,
+            "rows": int(sum(lengths)), "channels": sorted(chunks), "events": events}
+    with open(meta_path, "w") as f:
+        json.dump(meta, f, indent=1)
+    return out
+
+
+def load_cache(cache):
+    with open(os.path.join(cache, "meta.json")) as f:
+        meta = json.load(f)
+    cols = {key: np.load(os.path.join(cache, f"{key}.npy"), mmap_mode="r") for key in meta["channels"]}
+    return np.load(os.path.join(cache, "time.npy"), mmap_mode="r"), cols, meta
+
+
+def channel_series(t, y):
+    mask = np.isfinite(y) & np.isfinite(t)
+    return np.asarray(t[mask]), np.asarray(y[mask])
+
+
+def sample_rate(t):
+    d = np.diff(t)
+    d = d[d > 0]
+    return 1.0 / np.median(d) if len(d) else 0.0
+
+
+def plot_stride(n):
+    return max(1, n // PLOT_POINTS)
+
+
+# === JOBS ===
+def analyze_channel(cache, channel, out_dir, cutoff, nperseg):
+    t_all, cols, _ = load_cache(cache)
+    t, y = channel_series(t_all, cols[channel])
+    summary = {"channel": channel, "samples": int(len(y))}
+    if len(y) < 10:
+        return summary
+    fs = sample_rate(t)
+    f, pxx = welch(detrend(y), fs=fs, nperseg=min(nperseg, len(y)))
+    summary.update(fs=fs, min=float(y.min()), max=float(y.max()), mean=float(y.mean()),
+                   std=float(y.std()), psd_peak_hz=float(f[1:][np.argmax(pxx[1:])]) if len(f) > 1 else 0.0)
+
+    fig, (ax_t, ax_f) = plt.subplots(2, 1, figsize=(8, 5))
+    s = plot_stride(len(y))
+    ax_t.plot(t[::s] - t[0], y[::s], lw=0.6, alpha=0.5, label="Raw")
+    if cutoff < 0.5 * fs:
+        sos = butter(2, cutoff, btype="low", fs=fs, output="sos")
+        filtered = sosfiltfilt(sos, y)
+        ax_t.plot(t[::s] - t[0], filtered[::s], lw=1.0, color="magenta", label=f"Low-pass {cutoff} Hz")
+        summary["filtered_max"] = float(filtered.max())
+    ax_t.set_xlabel("Time [s]")
+    ax_t.set_ylabel(channel)
+    ax_t.legend(fontsize=7)
+    ax_f.semilogy(f, pxx, color="green")
+    ax_f.set_xlabel("Frequency [Hz]")
+    ax_f.set_ylabel("PSD")
+    ax_f.grid(True)
+    fig.tight_layout()
+    fig.savefig(os.path.join(out_dir, f"{channel}.png"), dpi=110)
+    plt.close(fig)
+    return summary
+
+
+def analyze_flight(cache, out_dir, use_smoother):
+    t_all, cols, meta = load_cache(cache)
+    t_all = np.asarray(t_all)
+    result = {"rows": meta["rows"], "t0": float(t_all.min()) if len(t_all) else 0.0, "fc_events": meta["events"]}
+
+    alt_key = next((k for k in ALT_KEYS if k in cols), None)
+    acc_key = next((k for k in ACC_KEYS if k in cols), None)
+    alt = np.asarray(cols[alt_key]) if alt_key else np.full(len(t_all), np.nan)
+    acc = np.asarray(cols[acc_key]) if acc_key else np.full(len(t_all), np.nan)
+    stage = np.asarray(cols["Stage"]) if "Stage" in cols else np.full(len(t_all), np.nan)
+
+    order = np.argsort(t_all, kind="stable")
+    if alt_key:
+        # Pad altitude as the dashboards take it: median of the first pre-launch samples
+        pad = RobustBaseline()
+        first = alt[order]
+        for x in first[np.isfinite(first)][:pad.n]:
+            pad.add(float(x))
+        if pad.value is not None:
+            alt = alt - pad.value
+            result["max_alt"] = float(np.nanmax(alt))
+
+    detector = FlightEventDetector()
+    for i in order:
+        a, c, s = alt[i], acc[i], stage[i]
+        if np.isnan(a) and np.isnan(c) and np.isnan(s):
+            continue
+        detector.update(t_all[i], alt=None if np.isnan(a) else a, acc=None if np.isnan(c) else c,
+                        stage=None if np.isnan(s) else int(s))
+    result["events"] = [{"name": e.name, "t": float(e.t), "confidence": float(e.confidence),
+                         "alt": None if e.alt is None else float(e.alt)} for e in detector.events]
+
+    corrs = []
+    for x_key, y_key in CORR_PAIRS:
+        if x_key in cols and y_key in cols:
+            x, y = np.asarray(cols[x_key]), np.asarray(cols[y_key])
+            mask = np.isfinite(x) & np.isfinite(y)
+            x, y = x[mask], y[mask]
+            if len(x) < 10:
+                continue
+            x, y = x - x.mean(), y - y.mean()
+            c = correlate(x, y, mode="full", method="fft")
+            denom = np.sqrt(np.dot(x, x) * np.dot(y, y)) or 1.0
+            lag = int(np.argmax(np.abs(c))) - (len(x) - 1)
+            fs = sample_rate(t_all[mask])
+            corrs.append({"x": x_key, "y": y_key, "peak": float(c[lag + len(x) - 1] / denom),
+                          "lag_samples": lag, "lag_s": lag / fs if fs else None})
+    result["cross_correlation"] = corrs
+
+    if "Lat" in cols and "Lon" in cols:
+        result["tracking"] = track_summary(t_all, np.asarray(cols["Lat"]), np.asarray(cols["Lon"]), alt)
+
+    if use_smoother and alt_key:
+        gps = np.asarray(cols["GPS_Alt"]) if "GPS_Alt" in cols else None
+        ts, xs, _ = smooth(t_all, baro=alt, acc=acc if acc_key else None, gps=gps)
+        result["max_velocity"] = float(xs[:, 1].max())
+        result["min_velocity"] = float(xs[:, 1].min())
+        fig, ax = plt.subplots(2, 1, figsize=(8, 5), sharex=True)
+        s = plot_stride(len(ts))
+        ax[0].plot(ts[::s] - ts[0], xs[::s, 0], color="cyan")
+        ax[0].set_ylabel("Altitude [m]")
+        ax[1].plot(ts[::s] - ts[0], xs[::s, 1], color="orange")
+        ax[1].set_ylabel("Velocity [m/s]")
+        ax[1].set_xlabel("Time [s]")
+        for ev in detector.events:
+            for a in ax:
+                a.axvline(ev.t - ts[0], color="k", ls="--", lw=0.7)
+        fig.tight_layout()
+        fig.savefig(os.path.join(out_dir, "state_estimate.png"), dpi=110)
+        plt.close(fig)
+    return result
+
+
+def track_summary(t, lat, lon, alt):
+    """Range, look angles, ground speed and landing point from the ground station, all fixes at once."""
+    # Merged logs need not be in time order; pad, landing and the speed sampling all assume it
+    order = np.argsort(t, kind="stable")
+    t, lat, lon, alt = t[order], lat[order], lon[order], alt[order]
+    mask = np.isfinite(lat) & np.isfinite(lon) & (lat != 0)
+    if not mask.any():
+        return {}
+    t_alt, alt = channel_series(t, alt)
+    t, lat, lon = t[mask], lat[mask], lon[mask]
+    # In mixed logs altitude arrives on other lines than the fixes: interpolate it onto the fix times
+    h = np.nan_to_num(align_batch(t, t_alt, alt, max_gap=2.0))
+    station = Station()
+    az, el, rng = station.look(lat, lon, station.alt + h)
+    # Difference fixes about 1 s apart so GPS noise doesn't dominate at high packet rates
+    idx = np.unique(np.searchsorted(t, np.arange(t[0], t[-1] + 1.0, 1.0)).clip(0, len(t) - 1))
+    speed, _ = ground_speed(t[idx], lat[idx], lon[idx])
+    land_dist, land_brg, _ = vincenty(station.lat, station.lon, lat[-1], lon[-1])
+    pad_dist, _, _ = vincenty(lat[0], lon[0], lat[-1], lon[-1])
+    return {"max_range": float(rng.max()), "max_elevation": float(el.max()),
+            "azimuth_at_max_range": float(az[np.argmax(rng)]),
+            "max_ground_speed": float(np.nanmax(speed)) if len(speed) else None,
+            "landing": {"lat": float(lat[-1]), "lon": float(lon[-1]), "range_from_station": float(land_dist),
+                        "bearing_from_station": float(land_brg), "drift_from_pad": float(pad_dist)}}
+
+
+# === CLI ===
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch analysis of recorded ground-station logs")
+    parser.add_argument("logs", nargs="+", help="recorded receiver logs")
+    parser.add_argument("-o", "--out", default="reports", help="output directory")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="process pool size")
+    parser.add_argument("--rate", type=float, default=10.0, help="line rate (Hz) for logs without timestamps")
+    parser.add_argument("--channels", default=None, help="comma-separated channels (default: all)")
+    parser.add_argument("--cutoff", type=float, default=0.2, help="low-pass cutoff in Hz")
+    parser.add_argument("--nperseg", type=int, default=4096, help="Welch segment length")
+    parser.add_argument("--smooth", action="store_true", help="run the Kalman smoother over altitude")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    wanted = set(args.channels.split(",")) if args.channels else None
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        caches = list(pool.map(build_cache, args.logs, itertools.repeat(args.rate)))
+
+        jobs = []
+        for log, cache in zip(args.logs, caches):
+            out_dir = os.path.join(args.out, os.path.splitext(os.path.basename(log))[0])
+            os.makedirs(out_dir, exist_ok=True)
+            with open(os.path.join(cache, "meta.json")) as f:
+                channels = [c for c in json.load(f)["channels"] if wanted is None or c in wanted]
+            chan_jobs = [pool.submit(analyze_channel, cache, c, out_dir, args.cutoff, args.nperseg)
+                         for c in channels]
+            flight_job = pool.submit(analyze_flight, cache, out_dir, args.smooth)
+            jobs.append((log, out_dir, chan_jobs, flight_job))
+
+        for log, out_dir, chan_jobs, flight_job in jobs:
+            report = {"log": os.path.abspath(log),
+                      "params": {"rate": args.rate, "cutoff": args.cutoff, "nperseg": args.nperseg,
+                                 "smooth": args.smooth, "numpy": np.__version__},
+                      "channels": [j.result() for j in chan_jobs]}
+            report.update(flight_job.result())
+            with open(os.path.join(out_dir, "report.json"), "w") as f:
+                json.dump(report, f, indent=1)
+            events = ", ".join(f"{e['name']}@{e['t'] - report['t0']:.2f}s" for e in report["events"]) or "none"
+            print(f"{log}: {report['rows']} rows, max alt {report.get('max_alt', float('nan')):.1f} m, events: {events}")
+    print(f"Done in {time.perf_counter() - started:.1f} s -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
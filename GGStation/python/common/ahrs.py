@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Ground-side attitude estimation from raw IMU samples.
+
+Madgwick's gradient-descent orientation filter, in the IMU form (gyro +
+accelerometer) or the MARG form (with magnetometer, which also fixes
+yaw). The quaternion is [w, x, y, z] and rotates body vectors into the
+earth frame (z up; with a magnetometer x points to magnetic north,
+otherwise yaw is relative to the start). This is the same convention as
+the flight computer's qw/qx/qy/qz lines and flight_sim.euler_to_quat, so
+either source can drive the same display.
+
+The payload sends raw samples in batches (see telemetry_decode, "IMU:"
+lines). update_batch() takes a whole packet at once. Unit conversion and
+normalisation are done as array operations. The recursion itself runs
+per sample on Python floats, which costs a few microseconds each.
+"""
+
+import math
+
+import numpy as np
+
+
+def quat_to_euler(q):
+    """ZYX yaw, pitch, roll in degrees from [w, x, y, z]."""
+    w, x, y, z = q
+    roll = math.atan2(2 * (w * x + y * z), 1 - 2 * (x * x + y * y))
+    pitch = math.asin(max(-1.0, min(1.0, 2 * (w * y - z * x))))
+    yaw = math.atan2(2 * (w * z + x * y), 1 - 2 * (y * y + z * z))
+    return math.degrees(yaw), math.degrees(pitch), math.degrees(roll)
+
+
+def euler_to_quat(yaw, pitch, roll):
+    """[w, x, y, z] from ZYX yaw, pitch, roll in degrees."""
+    cy, sy = math.cos(math.radians(yaw) / 2), math.sin(math.radians(yaw) / 2)
+    cp, sp = math.cos(math.radians(pitch) / 2), math.sin(math.radians(pitch) / 2)
+    cr, sr = math.cos(math.radians(roll) / 2), math.sin(math.radians(roll) / 2)
+    return (cr * cp * cy + sr * sp * sy, sr * cp * cy - cr * sp * sy,
+            cr * sp * cy + sr * cp * sy, cr * cp * sy - sr * sp * cy)
+
+
+def _unit_rows(v):
+    """Rows of v scaled to unit length; rows of zero length come back as zeros."""
+    n = np.linalg.norm(v, axis=1, keepdims=True)
+    return np.divide(v, n, out=np.zeros_like(v), where=n > 0)
+
+
+class Madgwick:
+    def __init__(self, beta=0.1, gravity=9.81, acc_gate=0.15):
+        self.beta = beta                # gradient step; higher trusts the accelerometer more
+        self.gravity = gravity          # in the accelerometer's unit
+        self.acc_gate = acc_gate        # ignore the accelerometer when |a| is further than this from g
+        self.q = (1.0, 0.0, 0.0, 0.0)
+        self.samples = 0
+
+    @property
+    def active(self):
+        return self.samples > 0
+
+    def euler(self):
+        return list(quat_to_euler(self.q))
+
+    def align(self, acc, mag=None):
+        """Start from the attitude the gravity (and magnetic) vector implies."""
+        ax, ay, az = acc
+        roll = math.atan2(ay, az)
+        pitch = math.atan2(-ax, math.hypot(ay, az))
+        yaw = 0.0
+        if mag is not None and any(mag):
+            mx, my, mz = mag
+            cr, sr, cp, sp = math.cos(roll), math.sin(roll), math.cos(pitch), math.sin(pitch)
+            # Undo roll and pitch to get the field's horizontal components
+            hx = mx * cp + (my * sr + mz * cr) * sp
+            hy = my * cr - mz * sr
+            yaw = math.degrees(math.atan2(-hy, hx))
+        self.q = euler_to_quat(yaw, math.degrees(pitch), math.degrees(roll))
+
+    def update_batch(self, samples, dt):
+        """
+        Fuse one packet of samples and return the final quaternion.
+
+        samples: (n, 6) rows of gx gy gz [deg/s] ax ay az [m/s^2], or
+        (n, 9) with mx my mz [any unit] appended. dt: sample period in s.
+        Under thrust or shock the accelerometer does not point along
+        gravity; those rows are integrated from the gyro alone.
+        """
+        s = np.atleast_2d(np.asarray(samples, dtype=float))
+        if s.shape[0] == 0 or s.shape[1] not in (6, 9):
+            return self.q
+        gyro = np.radians(s[:, 0:3]).tolist()
+        acc = s[:, 3:6]
+        off = np.abs(np.linalg.norm(acc, axis=1) / self.gravity - 1) > self.acc_gate
+        acc = _unit_rows(np.where(off[:, None], 0.0, acc)).tolist()
+        if not self.active:
+            i = int(np.argmin(off))     # first row with a usable accelerometer, if any
+            self.align(_unit_rows(s[i:i + 1, 3:6])[0].tolist(), s[i, 6:9].tolist() if s.shape[1] == 9 else None)
+        if s.shape[1] == 9:
+            mag = _unit_rows(s[:, 6:9]).tolist()
+            for g, a, m in zip(gyro, acc, mag):
+                if any(m):
+                    self._step_marg(g, a, m, dt)
+                else:
+                    self._step_imu(g, a, dt)
+        else:
+            for g, a in zip(gyro, acc):
+                self._step_imu(g, a, dt)
+        self.samples += len(s)
+        return self.q
+
+    def _integrate(self, qd0, qd1, qd2, qd3, s0, s1, s2, s3, dt):
+        q0, q1, q2, q3 = self.q
+        norm = math.sqrt(s0 * s0 + s1 * s1 + s2 * s2 + s3 * s3)
+        if norm > 0:
+            b = self.beta / norm
+            qd0, qd1, qd2, qd3 = qd0 - b * s0, qd1 - b * s1, qd2 - b * s2, qd3 - b * s3
+        q0, q1, q2, q3 = q0 + qd0 * dt, q1 + qd1 * dt, q2 + qd2 * dt, q3 + qd3 * dt
+        n = math.sqrt(q0 * q0 + q1 * q1 + q2 * q2 + q3 * q3)
+        self.q = (q0 / n, q1 / n, q2 / n, q3 / n)
+
+    def _step_imu(self, g, a, dt):
+        q0, q1, q2, q3 = self.q
+        gx, gy, gz = g
+        ax, ay, az = a
+        # Rate of change of the quaternion from the gyro
+        qd0 = 0.5 * (-q1 * gx - q2 * gy - q3 * gz)
+        qd1 = 0.5 * (q0 * gx + q2 * gz - q3 * gy)
+        qd2 = 0.5 * (q0 * gy - q1 * gz + q3 * gx)
+        qd3 = 0.5 * (q0 * gz + q1 * gy - q2 * gx)
+        s0 = s1 = s2 = s3 = 0.0
+        if ax or ay or az:
+            # Gradient of the error between measured and predicted gravity
+            q0q0, q1q1, q2q2, q3q3 = q0 * q0, q1 * q1, q2 * q2, q3 * q3
+            s0 = 4 * q0 * q2q2 + 2 * q2 * ax + 4 * q0 * q1q1 - 2 * q1 * ay
+            s1 = (4 * q1 * q3q3 - 2 * q3 * ax + 4 * q0q0 * q1 - 2 * q0 * ay - 4 * q1
+                  + 8 * q1 * q1q1 + 8 * q1 * q2q2 + 4 * q1 * az)
+            s2 = (4 * q0q0 * q2 + 2 * q0 * ax + 4 * q2 * q3q3 - 2 * q3 * ay - 4 * q2
+                  + 8 * q2 * q1q1 + 8 * q2 * q2q2 + 4 * q2 * az)
+            s3 = 4 * q1q1 * q3 - 2 * q1 * ax + 4 * q2q2 * q3 - 2 * q2 * ay
+        self._integrate(qd0, qd1, qd2, qd3, s0, s1, s2, s3, dt)
+
+    def _step_marg(self, g, a, m, dt):
+        q0, q1, q2, q3 = self.q
+        gx, gy, gz = g
+        ax, ay, az = a
+        mx, my, mz = m
+        qd0 = 0.5 * (-q1 * gx - q2 * gy - q3 * gz)
+        qd1 = 0.5 * (q0 * gx + q2 * gz - q3 * gy)
+        qd2 = 0.5 * (q0 * gy - q1 * gz + q3 * gx)
+        qd3 = 0.5 * (q0 * gz + q1 * gy - q2 * gx)
+        if not (ax or ay or az):
+            self._integrate(qd0, qd1, qd2, qd3, 0.0, 0.0, 0.0, 0.0, dt)
+            return
+        q0q0, q0q1, q0q2, q0q3 = q0 * q0, q0 * q1, q0 * q2, q0 * q3
+        q1q1, q1q2, q1q3 = q1 * q1, q1 * q2, q1 * q3
+        q2q2, q2q3, q3q3 = q2 * q2, q2 * q3, q3 * q3
+        # Earth-frame field direction, flattened onto the x-z plane (magnetic north and dip)
+        hx = (mx * q0q0 - 2 * q0 * my * q3 + 2 * q0 * mz * q2 + mx * q1q1 + 2 * q1 * my * q2
+              + 2 * q1 * mz * q3 - mx * q2q2 - mx * q3q3)
+        hy = (2 * q0 * mx * q3 + my * q0q0 - 2 * q0 * mz * q1 + 2 * q1 * mx * q2 - my * q1q1
+              + my * q2q2 + 2 * q2 * mz * q3 - my * q3q3)
+        hz = (-2 * q0 * mx * q2 + 2 * q0 * my * q1 + mz * q0q0 + 2 * q1 * mx * q3 - mz * q1q1
+              + 2 * q2 * my * q3 - mz * q2q2 + mz * q3q3)
+        bx2, bz2 = 2 * math.sqrt(hx * hx + hy * hy), 2 * hz
+        # Residuals: predicted minus measured gravity and field, in the body frame
+        fgx = 2 * (q1q3 - q0q2) - ax
+        fgy = 2 * (q0q1 + q2q3) - ay
+        fgz = 1 - 2 * (q1q1 + q2q2) - az
+        fmx = bx2 * (0.5 - q2q2 - q3q3) + bz2 * (q1q3 - q0q2) - mx
+        fmy = bx2 * (q1q2 - q0q3) + bz2 * (q0q1 + q2q3) - my
+        fmz = bx2 * (q0q2 + q1q3) + bz2 * (0.5 - q1q1 - q2q2) - mz
+        s0 = (-2 * q2 * fgx + 2 * q1 * fgy - bz2 * q2 * fmx + (-bx2 * q3 + bz2 * q1) * fmy
+              + bx2 * q2 * fmz)
+        s1 = (2 * q3 * fgx + 2 * q0 * fgy - 4 * q1 * fgz + bz2 * q3 * fmx + (bx2 * q2 + bz2 * q0) * fmy
+              + (bx2 * q3 - 2 * bz2 * q1) * fmz)
+        s2 = (-2 * q0 * fgx + 2 * q3 * fgy - 4 * q2 * fgz + (-2 * bx2 * q2 - bz2 * q0) * fmx
+              + (bx2 * q1 + bz2 * q3) * fmy + (bx2 * q0 - 2 * bz2 * q2) * fmz)
+        s3 = (2 * q1 * fgx + 2 * q2 * fgy + (-2 * bx2 * q3 + bz2 * q1) * fmx
+              + (-bx2 * q0 + bz2 * q2) * fmy + bx2 * q1 * fmz)
+        self._integrate(qd0, qd1, qd2, qd3, s0, s1, s2, s3, dt)
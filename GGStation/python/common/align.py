@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Time alignment of streams that arrive on independent links.
+
+All samples are stamped with the ground station's clock on arrival
+(SerialSource does this), less a per-stream latency where one is known.
+StreamAligner puts every stream onto the timeline of one base stream.
+Slow channels are interpolated linearly between the samples either side
+of each base time. The others take the last sample at or before it (an
+as-of join). Samples more than max_gap away are not used, so a stalled
+stream shows up as missing fields rather than a stale value.
+
+A base row is held until every stream has a sample at or after it, or
+until max_wait seconds of base time have passed. After that wait it goes
+out with whatever is known as of then. Buffers are bounded: a stream
+keeps only the samples that can still bracket a pending row, capped at
+maxlen. At most max_pending base rows are held; past that the oldest goes
+out early, unaligned fields missing, and is counted in `overflowed`, so
+no base row is ever lost.
+
+align_batch() does the same join for whole recorded logs with
+searchsorted.
+"""
+
+from bisect import bisect_right
+from collections import deque
+import math
+
+import numpy as np
+
+
+class _Stream:
+    def __init__(self, channels, interpolate, max_gap, latency, maxlen):
+        self.channels = list(channels)
+        self.interpolate = interpolate
+        self.max_gap = max_gap
+        self.latency = latency
+        self.times = deque(maxlen=maxlen)
+        self.values = deque(maxlen=maxlen)
+
+    def add(self, t, rec):
+        t -= self.latency
+        if self.times and t <= self.times[-1]:
+            return                      # out of order or duplicate
+        vals = {k: rec[k] for k in self.channels if isinstance(rec.get(k), float) and math.isfinite(rec[k])}
+        if vals:
+            self.times.append(t)
+            self.values.append(vals)
+
+    def covers(self, t):
+        return bool(self.times) and self.times[-1] >= t
+
+    def at(self, t):
+        i = bisect_right(self.times, t)
+        if i == 0 or t - self.times[i - 1] > self.max_gap:
+            return {}
+        t0, left = self.times[i - 1], self.values[i - 1]
+        if not self.interpolate or i == len(self.times) or self.times[i] - t0 > self.max_gap:
+            return dict(left)
+        t1, right = self.times[i], self.values[i]
+        w = (t - t0) / (t1 - t0)
+        return {k: x + w * (right[k] - x) if k in right else x for k, x in left.items()}
+
+    def trim(self, t):
+        # Keep one sample at or before t to bracket it
+        while len(self.times) > 1 and self.times[1] <= t:
+            self.times.popleft()
+            self.values.popleft()
+
+
+class StreamAligner:
+    def __init__(self, base, max_wait=2.0, max_pending=1000):
+        self.base = base
+        self.max_wait = max_wait
+        self.streams = {}
+        self.max_pending = max_pending
+        self.pending = deque()
+        self.last_base = -math.inf
+        self.overflowed = 0             # rows sent before their streams caught up, to stay under max_pending
+
+    def add_stream(self, name, channels, interpolate=True, max_gap=2.0, latency=0.0, maxlen=256):
+        """Join channels from stream name onto the base rows."""
+        self.streams[name] = _Stream(channels, interpolate, max_gap, latency, maxlen)
+
+    def push(self, name, t, rec):
+        """Add one sample; returns the (t, row) pairs that are now complete, oldest first."""
+        if name == self.base:
+            if t <= self.last_base:
+                return []
+            self.pending.append((t, dict(rec)))
+            self.last_base = t
+        elif name in self.streams:
+            self.streams[name].add(t, rec)
+        return self._emit()
+
+    def _emit(self):
+        out = []
+        while self.pending:
+            t, row = self.pending[0]
+            if self.last_base - t < self.max_wait and not all(s.covers(t) for s in self.streams.values()):
+                if len(self.pending) <= self.max_pending:
+                    break
+                self.overflowed += 1
+            self.pending.popleft()
+            for s in self.streams.values():
+                row.update(s.at(t))
+            out.append((t, row))
+        horizon = self.pending[0][0] if self.pending else self.last_base
+        for s in self.streams.values():
+            s.trim(horizon)
+        return out
+
+
+def align_batch(t_base, t, values, interpolate=True, max_gap=np.inf, latency=0.0):
+    """values (n,) or (n, k) sampled at sorted times t, on t_base; NaN where nothing is within max_gap."""
+    t = np.asarray(t, dtype=float) - latency
+    values = np.asarray(values, dtype=float)
+    t_base = np.asarray(t_base, dtype=float)
+    out = np.full((len(t_base),) + values.shape[1:], np.nan)
+    if len(t) == 0:
+        return out
+    right = np.searchsorted(t, t_base, side="right")
+    left = (right - 1).clip(0)
+    nxt = right.clip(max=len(t) - 1)
+    age = t_base - t[left]
+    asof = (right > 0) & (age <= max_gap)
+    expand = (slice(None),) + (None,) * (values.ndim - 1)
+    out = np.where(asof[expand], values[left], out)
+    if interpolate:
+        span = t[nxt] - t[left]
+        ok = asof & (right < len(t)) & (span > 0) & (span <= max_gap)
+        w = np.where(ok, age / np.where(span > 0, span, 1.0), 0.0)
+        out = np.where(ok[expand], values[left] + w[expand] * (values[nxt] - values[left]), out)
+    return out
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Memoised analysis for the dashboard analysis buttons.
+
+AnalysisCache is an LRU of results with a memory cap; the size of a
+result is the total nbytes of the arrays in it. WindowAnalysis puts the
+cache in front of the analysis of the dashboard's recent window. Results
+are keyed on (what, channels, window version, parameters), and the
+dashboard bumps the version whenever samples are added. Pressing a
+button again without new data is a dictionary lookup.
+
+Intermediate results are shared between the analyses at the same
+version:
+- the masked window
+- the sample rate
+- the mean-removed channels, used by both the PSD and cross-correlation
+- the Butterworth coefficients, which depend only on the normalised
+  cutoff and are kept across versions
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+from scipy.signal import butter, correlate, filtfilt, welch
+
+
+def nbytes(value):
+    """Approximate memory held by a result: arrays count, everything else is small."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(nbytes(v) for v in value)
+    if isinstance(value, dict):
+        return sum(nbytes(v) for v in value.values())
+    return 64
+
+
+class AnalysisCache:
+    def __init__(self, max_bytes=32 * 2 ** 20, max_items=512):
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.items = OrderedDict()      # key -> (value, size), least recently used first
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def memo(self, key, compute):
+        """Cached value for key, computing and storing it on a miss."""
+        if key in self.items:
+            self.items.move_to_end(key)
+            self.hits += 1
+            return self.items[key][0]
+        self.misses += 1
+        value = compute()
+        size = nbytes(value)
+        if size <= self.max_bytes:
+            self.items[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes or len(self.items) > self.max_items:
+                _, (_, old) = self.items.popitem(last=False)
+                self.bytes -= old
+        return value
+
+    def clear(self):
+        self.items.clear()
+        self.bytes = 0
+
+
+def window_from(data, time_key="time"):
+    """Window function over a dict of equal-length deques: rows where all fields are finite."""
+    def window(fields):
+        times = np.array(data[time_key], dtype=float)
+        cols = [np.array(data[f], dtype=float) for f in fields]
+        n = min([len(times)] + [len(c) for c in cols])
+        times, cols = times[-n:], [c[-n:] for c in cols]
+        mask = np.isfinite(times) & np.logical_and.reduce([np.isfinite(c) for c in cols])
+        return (times[mask],) + tuple(c[mask] for c in cols)
+    return window
+
+
+class WindowAnalysis:
+    def __init__(self, window, cache=None):
+        self.window = window            # fields -> (times, *columns)
+        self.cache = cache or AnalysisCache()
+        self.version = 0
+
+    def bump(self):
+        """Call whenever the window gains samples."""
+        self.version += 1
+
+    # --- shared intermediates ---
+    def series(self, *fields):
+        return self.cache.memo(("series", fields, self.version), lambda: self.window(fields))
+
+    def fs(self, *fields):
+        def compute():
+            d = np.diff(self.series(*fields)[0])
+            return 1 / np.mean(d) if len(d) else 0.0
+        return self.cache.memo(("fs", fields, self.version), compute)
+
+    def detrended(self, field, fields=None):
+        """field with its mean removed, over the rows where all of fields are present."""
+        fields = fields or (field,)
+        def compute():
+            x = self.series(*fields)[1 + fields.index(field)]
+            return x - np.mean(x)
+        return self.cache.memo(("detrended", field, fields, self.version), compute)
+
+    def butter(self, order, cutoff, fs, btype="low"):
+        wn = round(cutoff / (0.5 * fs), 9)
+        return self.cache.memo(("butter", order, wn, btype), lambda: butter(order, wn, btype=btype, analog=False))
+
+    # --- analyses ---
+    def psd(self, field, nperseg=256):
+        def compute():
+            x = self.detrended(field)
+            # welch removes each segment's mean too, so starting from the demeaned window changes nothing
+            return welch(x, fs=self.fs(field), nperseg=min(nperseg, len(x)))
+        return self.cache.memo(("psd", field, self.version, nperseg), compute)
+
+    def cross_corr(self, x_key, y_key):
+        """(lags in s, correlation) over the rows where both channels are present."""
+        def compute():
+            fields = (x_key, y_key)
+            x, y = self.detrended(x_key, fields), self.detrended(y_key, fields)
+            fs = self.fs(*fields)
+            return np.arange(-len(x) + 1, len(x)) / fs, correlate(x, y, mode="full")
+        return self.cache.memo(("xcorr", x_key, y_key, self.version), compute)
+
+    def lowpass(self, field, cutoff=0.2, order=2):
+        def compute():
+            b, a = self.butter(order, cutoff, self.fs(field))
+            return filtfilt(b, a, self.series(field)[1])
+        return self.cache.memo(("lowpass", field, self.version, cutoff, order), compute)
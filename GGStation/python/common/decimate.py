@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Plot decimation so live plots can show a whole flight at fixed cost.
+
+minmax_decimate() and lttb() reduce an (x, y) series to about one point
+per pixel column. DecimatedSeries keeps the full session plus a pyramid of
+per-bucket min/max summaries (bucket size FANOUT**level) that is updated
+incrementally on append, so view() only touches about 2 * width points
+whatever the session length.
+"""
+
+import numpy as np
+
+FANOUT = 4
+
+
+def minmax_decimate(x, y, n_buckets):
+    """Keep the min and max sample of each of n_buckets equal-count buckets, in x order."""
+    x, y = np.asarray(x), np.asarray(y)
+    n = len(y)
+    if n <= 2 * n_buckets:
+        return x, y
+    size = -(-n // n_buckets)
+    pad = size * n_buckets - n
+    yb = np.concatenate([y, np.full(pad, y[-1])]).reshape(n_buckets, size)
+    base = np.arange(n_buckets) * size
+    lo = np.minimum(base + yb.argmin(axis=1), n - 1)
+    hi = np.minimum(base + yb.argmax(axis=1), n - 1)
+    idx = np.sort(np.stack([lo, hi], axis=1), axis=1).ravel()
+    return x[idx], y[idx]
+
+
+def lttb(x, y, n_out):
+    """Largest-Triangle-Three-Buckets downsampling to n_out points."""
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return x, y
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    out = np.empty(n_out, dtype=int)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        # Twice the triangle area (a, candidate, next-bucket centroid); the 1/2 doesn't change argmax
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return x[out], y[out]
+
+
+def _minmax_index(y, i0, i1):
+    """Indices of the min and max of y[i0:i1], or none for an empty range."""
+    if i1 <= i0:
+        return np.zeros(0, dtype=np.int64)
+    return i0 + np.array([np.argmin(y[i0:i1]), np.argmax(y[i0:i1])], dtype=np.int64)
+
+
+class DecimatedSeries:
+    """Append-only (x, y) series with incrementally maintained min/max levels."""
+
+    def __init__(self, capacity=1024):
+        self.n = 0
+        self.x = np.empty(capacity)
+        self.y = np.empty(capacity)
+        # levels[k] = [mins, maxs, argmins, argmaxs, count] for bucket size FANOUT**(k+1)
+        self.levels = []
+
+    def __len__(self):
+        return self.n
+
+    def append(self, x, y):
+        if self.n == len(self.x):
+            self.x = np.resize(self.x, 2 * self.n)
+            self.y = np.resize(self.y, 2 * self.n)
+        i = self.n
+        self.x[i] = x
+        self.y[i] = y
+        self.n += 1
+
+        size = FANOUT
+        for k in range(len(self.levels) + 1):
+            if k == len(self.levels):
+                if self.n <= size:
+                    break
+                self._add_level(size)
+            lvl = self.levels[k]
+            b = i // size
+            if b == lvl[4]:
+                if b == len(lvl[0]):
+                    for j in range(4):
+                        lvl[j] = np.resize(lvl[j], 2 * b)
+                lvl[0][b], lvl[1][b], lvl[2][b], lvl[3][b] = y, y, i, i
+                lvl[4] += 1
+            else:
+                if y < lvl[0][b]:
+                    lvl[0][b], lvl[2][b] = y, i
+                if y > lvl[1][b]:
+                    lvl[1][b], lvl[3][b] = y, i
+            size *= FANOUT
+
+    @classmethod
+    def from_arrays(cls, x, y):
+        """Series holding x, y with all levels built in bulk (e.g. when restoring a session)."""
+        n = len(y)
+        s = cls(capacity=max(1024, 2 * n))
+        s.x[:n], s.y[:n], s.n = x, y, n
+        size = FANOUT
+        while n > size:
+            s._add_level(size)
+            size *= FANOUT
+        return s
+
+    def _add_level(self, size):
+        # Build the new level once from the raw data; after that it is maintained on append
+        nb = -(-self.n // size)
+        cap = max(16, 2 * nb)
+        mins, maxs = np.empty(cap), np.empty(cap)
+        amin, amax = np.empty(cap, dtype=np.int64), np.empty(cap, dtype=np.int64)
+        y = self.y[:self.n]
+        pad = nb * size - self.n
+        base = np.arange(nb) * size
+        amin[:nb] = base + np.concatenate([y, np.full(pad, np.inf)]).reshape(nb, size).argmin(axis=1)
+        amax[:nb] = base + np.concatenate([y, np.full(pad, -np.inf)]).reshape(nb, size).argmax(axis=1)
+        mins[:nb], maxs[:nb] = y[amin[:nb]], y[amax[:nb]]
+        self.levels.append([mins, maxs, amin, amax, nb])
+
+    def view(self, width, x0=None, x1=None):
+        """About 2 * width points covering [x0, x1] (default: everything)."""
+        xs, ys = self.x[:self.n], self.y[:self.n]
+        i0 = 0 if x0 is None else int(np.searchsorted(xs, x0, side="left"))
+        i1 = self.n if x1 is None else int(np.searchsorted(xs, x1, side="right"))
+        m = i1 - i0
+        width = max(1, int(width))
+        if m <= 2 * width:
+            return xs[i0:i1], ys[i0:i1]
+        size = FANOUT
+        for lvl in self.levels:
+            if m // size <= width:
+                # Buckets wholly inside the range come from the level; the partial buckets
+                # at either edge (fewer than size samples each) from the raw data
+                b0 = -(-i0 // size)
+                b1 = lvl[4] if i1 == self.n else i1 // size
+                left, right = min(b0 * size, i1), max(b1 * size, i0)
+                idx = np.concatenate([_minmax_index(ys, i0, left), lvl[2][b0:b1], lvl[3][b0:b1],
+                                      _minmax_index(ys, right, i1)]) if b0 < b1 else _minmax_index(ys, i0, i1)
+                idx = np.unique(idx)
+                return xs[idx], ys[idx]
+            size *= FANOUT
+        return minmax_decimate(xs[i0:i1], ys[i0:i1], width)
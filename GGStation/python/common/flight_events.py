@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Online flight-event detection from the live altitude/acceleration channels.
+
+FlightEventDetector.update() is called once per decoded packet and does a
+fixed amount of work, so an event is reported in the same call as the
+packet that confirms it. Detected events: LIFTOFF, BURNOUT, APOGEE, STAGE.
+"""
+
+from collections import namedtuple
+import math
+
+FlightEvent = namedtuple("FlightEvent", ["name", "t", "confidence", "alt"])
+
+PAD, BOOST, COAST, DESCENT = "PAD", "BOOST", "COAST", "DESCENT"
+
+_STATE = ("phase", "stage", "vel", "alt", "max_alt", "t_max", "_prev_t", "_prev_vel", "_count", "_first_t")
+
+
+class FlightEventDetector:
+    def __init__(self, launch_alt=10.0, launch_acc=20.0, burnout_acc=0.0,
+                 apogee_drop=3.0, confirm=3, tau=0.3):
+        self.launch_alt = launch_alt        # m above pad
+        self.launch_acc = launch_acc        # m/s^2, same units as Filt_Acc
+        self.burnout_acc = burnout_acc      # thrust gone once acc drops below this
+        self.apogee_drop = apogee_drop      # m below max altitude to call apogee
+        self.confirm = confirm              # consecutive samples needed
+        self.tau = tau                      # s, smoothing time constant for alt and climb rate
+        self.subscribers = []
+        self.reset()
+
+    def reset(self):
+        self.phase = PAD
+        self.events = []
+        self.stage = None
+        self.vel = 0.0
+        self.alt = None
+        self.max_alt = None
+        self.t_max = None
+        self._prev_t = None
+        self._prev_vel = 0.0
+        self._count = 0
+        self._first_t = None
+
+    def state_dict(self):
+        """Phase, smoothing state and events as plain values, for session snapshots."""
+        state = {k: getattr(self, k) for k in _STATE}
+        state["events"] = [list(ev) for ev in self.events]
+        return state
+
+    def load_state(self, state):
+        """Restore without notifying subscribers; the events already happened."""
+        for k in _STATE:
+            setattr(self, k, state[k])
+        self.events = [FlightEvent(*ev) for ev in state["events"]]
+
+    def subscribe(self, fn):
+        """fn(event) is called for every detected event."""
+        self.subscribers.append(fn)
+
+    def update(self, t, alt=None, acc=None, stage=None, vel=None):
+        """
+        Feed one sample; returns the list of events it confirmed.
+
+        vel may be passed in from a state estimator; otherwise the climb
+        rate is derived from the smoothed altitude.
+        """
+        found = []
+        if alt is not None:
+            self._update_altitude(t, alt, vel)
+            alt = self.alt
+
+        if stage is not None:
+            if self.stage is not None and stage != self.stage:
+                found.append(FlightEvent("STAGE", t, 1.0, alt))
+            self.stage = stage
+
+        if self.phase == PAD:
+            by_acc = acc is not None and acc > self.launch_acc
+            by_alt = alt is not None and alt > self.launch_alt and self.vel > 0
+            if self._confirmed(t, by_acc or by_alt):
+                self.phase = BOOST
+                found.append(FlightEvent("LIFTOFF", self._first_t, 1.0 if by_acc and by_alt else 0.7, alt))
+                self._count = 0
+
+        elif self.phase == BOOST:
+            if acc is not None:
+                ended, conf = acc < self.burnout_acc, 0.9
+            else:
+                ended, conf = self.vel < self._prev_vel, 0.6
+            if self._confirmed(t, ended):
+                self.phase = COAST
+                found.append(FlightEvent("BURNOUT", self._first_t, conf, alt))
+                self._count = 0
+
+        elif self.phase == COAST:
+            if self._confirmed(t, acc is not None and acc > self.launch_acc):
+                # Upper-stage ignition. When the flight computer sends a Stage field,
+                # that field already reported it; only infer the event without one
+                if self.stage is None:
+                    found.append(FlightEvent("STAGE", self._first_t, 0.6, alt))
+                self.phase = BOOST
+                self._count = 0
+
+        if self.phase in (BOOST, COAST) and alt is not None and self.max_alt is not None:
+            drop = self.max_alt - alt
+            if self.vel <= 0 and drop >= self.apogee_drop:
+                self.phase = DESCENT
+                found.append(FlightEvent("APOGEE", self.t_max, min(1.0, drop / (2 * self.apogee_drop)), self.max_alt))
+
+        for ev in found:
+            self.events.append(ev)
+            for fn in self.subscribers:
+                fn(ev)
+        return found
+
+    def _update_altitude(self, t, alt, vel):
+        if self._prev_t is None:
+            self.alt = alt
+        elif t > self._prev_t:
+            # Time-constant EMAs so the smoothing is the same at 10 Hz or 1 kHz
+            w = 1.0 - math.exp(-(t - self._prev_t) / self.tau)
+            prev_alt = self.alt
+            self.alt += w * (alt - self.alt)
+            self._prev_vel = self.vel
+            if vel is None:
+                self.vel += w * ((self.alt - prev_alt) / (t - self._prev_t) - self.vel)
+        if vel is not None:
+            self._prev_vel, self.vel = self.vel, vel
+        self._prev_t = t
+        alt = self.alt
+        if self.phase == PAD or self.max_alt is None or alt > self.max_alt:
+            self.max_alt, self.t_max = alt, t
+
+    def _confirmed(self, t, cond):
+        if not cond:
+            self._count = 0
+            return False
+        if self._count == 0:
+            self._first_t = t
+        self._count += 1
+        return self._count >= self.confirm
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+WGS84 geodesy for tracking: ECEF/ENU transforms, range, bearing, look angles.
+
+Every function takes scalars or NumPy arrays (broadcast against each other),
+so the same code serves one fix at packet rate and a whole log at once.
+Angles are in degrees, distances in metres, heights above the ellipsoid
+(or any common datum: only differences matter for the local ENU frame).
+
+Station caches its ECEF position and ENU rotation so per-packet look
+angles are a handful of multiplies; Tracker adds ground speed and course
+from successive fixes of one vehicle.
+"""
+
+import math
+
+import numpy as np
+
+A = 6378137.0                   # WGS84 semi-major axis, m
+F = 1 / 298.257223563           # flattening
+B = A * (1 - F)
+E2 = F * (2 - F)                # first eccentricity squared
+R_MEAN = 6371008.8              # mean Earth radius for haversine, m
+
+GROUND_STATION = (47.986916, -81.848300, 0.0)
+
+
+# === FRAMES ===
+def geodetic_to_ecef(lat, lon, h=0.0):
+    lat, lon = np.radians(lat), np.radians(lon)
+    sl, cl = np.sin(lat), np.cos(lat)
+    n = A / np.sqrt(1 - E2 * sl * sl)
+    return ((n + h) * cl * np.cos(lon),
+            (n + h) * cl * np.sin(lon),
+            (n * (1 - E2) + h) * sl)
+
+
+def ecef_to_geodetic(x, y, z):
+    """Bowring's method; sub-millimetre for anything near the surface."""
+    x, y, z = np.asarray(x, dtype=float), np.asarray(y, dtype=float), np.asarray(z, dtype=float)
+    ep2 = E2 / (1 - E2)
+    p = np.hypot(x, y)
+    th = np.arctan2(z * A, p * B)
+    lat = np.arctan2(z + ep2 * B * np.sin(th) ** 3, p - E2 * A * np.cos(th) ** 3)
+    n = A / np.sqrt(1 - E2 * np.sin(lat) ** 2)
+    h = p / np.cos(lat) - n
+    return np.degrees(lat), np.degrees(np.arctan2(y, x)), h
+
+
+def enu_rotation(lat0, lon0):
+    """3x3 matrix taking ECEF offsets to east/north/up at (lat0, lon0)."""
+    la, lo = np.radians(lat0), np.radians(lon0)
+    sla, cla, slo, clo = np.sin(la), np.cos(la), np.sin(lo), np.cos(lo)
+    return np.array([[-slo, clo, 0.0],
+                     [-sla * clo, -sla * slo, cla],
+                     [cla * clo, cla * slo, sla]])
+
+
+def geodetic_to_enu(lat, lon, h, lat0, lon0, h0=0.0):
+    x, y, z = geodetic_to_ecef(lat, lon, h)
+    x0, y0, z0 = geodetic_to_ecef(lat0, lon0, h0)
+    r = enu_rotation(lat0, lon0)
+    d = np.stack(np.broadcast_arrays(x - x0, y - y0, z - z0))
+    e, n, u = np.tensordot(r, d, axes=1)
+    return e, n, u
+
+
+def enu_to_geodetic(e, n, u, lat0, lon0, h0=0.0):
+    x0, y0, z0 = geodetic_to_ecef(lat0, lon0, h0)
+    r = enu_rotation(lat0, lon0)
+    d = np.tensordot(r.T, np.stack(np.broadcast_arrays(e, n, u)), axes=1)
+    return ecef_to_geodetic(x0 + d[0], y0 + d[1], z0 + d[2])
+
+
+# === DISTANCE AND BEARING ===
+def haversine(lat1, lon1, lat2, lon2):
+    """Great-circle distance on the mean sphere (~0.3% worst case vs the ellipsoid)."""
+    p1, p2 = np.radians(lat1), np.radians(lat2)
+    dp, dl = p2 - p1, np.radians(np.asarray(lon2) - lon1)
+    a = np.sin(dp / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(dl / 2) ** 2
+    return 2 * R_MEAN * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def bearing(lat1, lon1, lat2, lon2):
+    """Initial great-circle bearing from point 1 to point 2, 0-360 from north."""
+    p1, p2 = np.radians(lat1), np.radians(lat2)
+    dl = np.radians(np.asarray(lon2) - lon1)
+    y = np.sin(dl) * np.cos(p2)
+    x = np.cos(p1) * np.sin(p2) - np.sin(p1) * np.cos(p2) * np.cos(dl)
+    return np.degrees(np.arctan2(y, x)) % 360
+
+
+def vincenty(lat1, lon1, lat2, lon2, tol=1e-12, max_iter=200):
+    """Ellipsoidal distance, initial bearing and forward bearing at point 2 (Vincenty inverse).
+
+    Iterates all points together and stops when every one has converged;
+    nearly antipodal pairs that never converge fall back to haversine.
+    """
+    u1 = np.arctan((1 - F) * np.tan(np.radians(lat1)))
+    u2 = np.arctan((1 - F) * np.tan(np.radians(lat2)))
+    big_l = np.radians(np.asarray(lon2, dtype=float) - lon1)
+    u1, u2, big_l = np.broadcast_arrays(u1, u2, big_l)
+    su1, cu1, su2, cu2 = np.sin(u1), np.cos(u1), np.sin(u2), np.cos(u2)
+    lam = big_l.copy()
+    converged = np.zeros(lam.shape, dtype=bool)
+    for _ in range(max_iter):
+        sl, cl = np.sin(lam), np.cos(lam)
+        sin_s = np.hypot(cu2 * sl, cu1 * su2 - su1 * cu2 * cl)
+        cos_s = su1 * su2 + cu1 * cu2 * cl
+        sigma = np.arctan2(sin_s, cos_s)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            sin_a = np.where(sin_s == 0, 0.0, cu1 * cu2 * sl / sin_s)
+            cos2_a = 1 - sin_a ** 2
+            cos_2sm = np.where(cos2_a == 0, 0.0, cos_s - 2 * su1 * su2 / cos2_a)
+        c = F / 16 * cos2_a * (4 + F * (4 - 3 * cos2_a))
+        lam_new = big_l + (1 - c) * F * sin_a * (
+            sigma + c * sin_s * (cos_2sm + c * cos_s * (-1 + 2 * cos_2sm ** 2)))
+        converged = np.abs(lam_new - lam) < tol
+        lam = lam_new
+        if converged.all():
+            break
+    u_sq = cos2_a * (A ** 2 - B ** 2) / B ** 2
+    k_a = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+    k_b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+    d_sigma = k_b * sin_s * (cos_2sm + k_b / 4 * (cos_s * (-1 + 2 * cos_2sm ** 2)
+                                                 - k_b / 6 * cos_2sm * (-3 + 4 * sin_s ** 2) * (-3 + 4 * cos_2sm ** 2)))
+    dist = B * k_a * (sigma - d_sigma)
+    sl, cl = np.sin(lam), np.cos(lam)
+    az1 = np.degrees(np.arctan2(cu2 * sl, cu1 * su2 - su1 * cu2 * cl)) % 360
+    az2 = np.degrees(np.arctan2(cu1 * sl, -su1 * cu2 + cu1 * su2 * cl)) % 360
+    if not converged.all():
+        fallback = haversine(lat1, lon1, lat2, lon2) * np.ones_like(dist)
+        dist = np.where(converged, dist, fallback)
+    return dist, az1, az2
+
+
+# === TRACKING ===
+def look_angles(lat0, lon0, h0, lat, lon, h):
+    """Azimuth, elevation and slant range from an observer to a target."""
+    e, n, u = geodetic_to_enu(lat, lon, h, lat0, lon0, h0)
+    return enu_look(e, n, u)
+
+
+def enu_look(e, n, u):
+    ground = np.hypot(e, n)
+    return (np.degrees(np.arctan2(e, n)) % 360,
+            np.degrees(np.arctan2(u, ground)),
+            np.sqrt(ground * ground + u * u))
+
+
+def ground_speed(t, lat, lon):
+    """Speed (m/s) and course (deg) between successive fixes; arrays of length n - 1."""
+    t, lat, lon = np.asarray(t, dtype=float), np.asarray(lat, dtype=float), np.asarray(lon, dtype=float)
+    dist = haversine(lat[:-1], lon[:-1], lat[1:], lon[1:])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        speed = np.where(np.diff(t) > 0, dist / np.diff(t), np.nan)
+    return speed, bearing(lat[:-1], lon[:-1], lat[1:], lon[1:])
+
+
+class Station:
+    """Fixed observer with its ECEF position and ENU rotation cached."""
+
+    def __init__(self, lat=GROUND_STATION[0], lon=GROUND_STATION[1], alt=GROUND_STATION[2]):
+        self.lat, self.lon, self.alt = lat, lon, alt
+        self.ecef = np.array(geodetic_to_ecef(lat, lon, alt))
+        self.rot = enu_rotation(lat, lon)
+
+    def enu(self, lat, lon, h):
+        x, y, z = geodetic_to_ecef(lat, lon, h)
+        d = np.stack(np.broadcast_arrays(x, y, z)) - self.ecef.reshape((3,) + (1,) * np.ndim(x))
+        return np.tensordot(self.rot, d, axes=1)
+
+    def look(self, lat, lon, h):
+        """(azimuth, elevation, slant range) to the target; scalars or arrays."""
+        e, n, u = self.enu(lat, lon, h)
+        return enu_look(e, n, u)
+
+
+class Tracker:
+    """Live range/bearing/look angles and ground speed for one vehicle."""
+
+    def __init__(self, station, tau=2.0):
+        self.station = station
+        self.tau = tau              # smoothing time constant for the velocity, s
+        self.last = None            # (t, east, north) of the previous fix
+        self.speed = None
+        self.course = None
+        self.drift = (0.0, 0.0)     # smoothed horizontal velocity (east, north), m/s
+
+    def update(self, t, lat, lon, h):
+        """Fields for the dashboard from one fix; h is height on the station's datum."""
+        e, n, u = (float(c) for c in self.station.enu(lat, lon, h))
+        az, el, rng = (float(c) for c in enu_look(e, n, u))
+        if self.last is not None and t > self.last[0]:
+            dt = t - self.last[0]
+            w = 1 - math.exp(-dt / self.tau)
+            # Smooth the velocity vector, not its magnitude: per-fix position noise
+            # averages out in each component but always adds to hypot()
+            ve = self.drift[0] + w * ((e - self.last[1]) / dt - self.drift[0])
+            vn = self.drift[1] + w * ((n - self.last[2]) / dt - self.drift[1])
+            self.drift = (ve, vn)
+            self.speed = math.hypot(ve, vn)
+            if self.speed > 0.5:        # course is noise when nearly stationary
+                self.course = math.degrees(math.atan2(ve, vn)) % 360
+        self.last = (t, e, n)
+        return {"Range": rng, "Az": az, "El": el, "Dist": math.hypot(e, n),
+                "GSpd": self.speed, "Crs": self.course}
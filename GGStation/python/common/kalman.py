@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+Vertical-state Kalman filter: altitude, vertical velocity, acceleration.
+
+Fuses baro altitude (Alt / Filt_Alt), acceleration (Filt_Acc) and GPS
+altitude with a constant-acceleration model driven by white jerk noise.
+The baro altitude is relative to the pad and GPS altitude is on its own
+datum, so a fourth state holds the datum offset: GPS observes altitude
+plus offset, and the offset follows a slow random walk for baro drift.
+Until the first baro sample the offset is pinned at zero and GPS alone
+sets the altitude. That first sample moves the altitude onto the baro
+zero and hands the difference to the offset.
+Gaps in the data are handled by predicting across the real dt, NaN
+measurements are skipped, and late (out-of-order) samples are slotted in
+by rewinding to the last state before them and replaying the short
+measurement history. smooth() runs the same model forward over a whole
+log and then a Rauch-Tung-Striebel pass backwards for post-flight use.
+"""
+
+from collections import deque
+import math
+import numpy as np
+
+BARO, ACC, GPS = "baro", "acc", "gps"
+# Measurement rows over [alt, vel, acc, datum offset]
+_H = {BARO: np.array([1.0, 0.0, 0.0, 0.0]),
+      ACC: np.array([0.0, 0.0, 1.0, 0.0]),
+      GPS: np.array([1.0, 0.0, 0.0, 1.0])}
+_FIRST = {BARO: 0, ACC: 2, GPS: 0}     # state a first sample initialises
+DATUM_VAR = 1e6                         # prior on the offset once the baro sets the zero, m^2
+
+
+def transition(dt, jerk_std, datum_std=0.0):
+    """State transition F and process noise Q for a step of dt seconds."""
+    F = np.array([[1.0, dt, 0.5 * dt * dt, 0.0],
+                  [0.0, 1.0, dt, 0.0],
+                  [0.0, 0.0, 1.0, 0.0],
+                  [0.0, 0.0, 0.0, 1.0]])
+    d2, d3, d4, d5 = dt ** 2, dt ** 3, dt ** 4, dt ** 5
+    Q = np.zeros((4, 4))
+    Q[:3, :3] = jerk_std ** 2 * np.array([[d5 / 20, d4 / 8, d3 / 6],
+                                          [d4 / 8, d3 / 3, d2 / 2],
+                                          [d3 / 6, d2 / 2, dt]])
+    Q[3, 3] = datum_std ** 2 * dt
+    return F, Q
+
+
+class AltitudeKalman:
+    def __init__(self, jerk_std=5.0, baro_std=1.0, acc_std=0.5, gps_std=8.0,
+                 datum_std=0.05, acc_offset=0.0, history=32):
+        self.jerk_std = jerk_std
+        self.datum_std = datum_std      # baro/GPS offset drift, m per sqrt(s)
+        self.noise = {BARO: baro_std ** 2, ACC: acc_std ** 2, GPS: gps_std ** 2}
+        self.acc_offset = acc_offset    # subtracted from raw acc (e.g. 9.81 if it includes g)
+        self.history = history
+        self.late_dropped = 0
+        self.reset()
+
+    def reset(self):
+        self.t = None
+        self.x = np.zeros(4)
+        self.P = np.diag([100.0, 25.0, 25.0, 0.0])     # offset pinned until a baro sample
+        self._base = (None, self.x.copy(), self.P.copy())
+        self._log = deque()     # (t, kind, z, x_post, P_post), time-ordered
+
+    @property
+    def alt(self):
+        return self.x[0]
+
+    @property
+    def vel(self):
+        return self.x[1]
+
+    @property
+    def acc(self):
+        return self.x[2]
+
+    @property
+    def baro_frame(self):
+        """True once a baro sample has set the zero; alt is then height above it."""
+        return self.P[3, 3] > 0
+
+    def update_baro(self, t, alt):
+        return self.update(t, BARO, alt)
+
+    def update_acc(self, t, acc):
+        return self.update(t, ACC, acc - self.acc_offset)
+
+    def update_gps(self, t, alt):
+        return self.update(t, GPS, alt)
+
+    def update(self, t, kind, z):
+        """Apply one measurement of the given kind; returns the state [h, v, a, offset]."""
+        if z is None or math.isnan(z):
+            return self.x
+        if self.t is None and not self._log:
+            # First sample: start at the measured value rather than at zero
+            i = _FIRST[kind]
+            self.x[i] = z
+            self.P[i, i] = self.noise[kind]
+            if kind == BARO:
+                self.P[3, 3] = DATUM_VAR
+            self.t = t
+            self._base = (t, self.x.copy(), self.P.copy())
+            return self.x
+        if t >= self.t:
+            self._step(t, kind, z)
+            self._log.append((t, kind, z, self.x.copy(), self.P.copy()))
+            self._trim()
+            return self.x
+
+        # Late sample: rewind to the newest state older than it and replay
+        if self._base[0] is None or t < self._base[0]:
+            self.late_dropped += 1
+            return self.x
+        replay = [(t, kind, z)]
+        while self._log and self._log[-1][0] > t:
+            lt, lk, lz, _, _ = self._log.pop()
+            replay.append((lt, lk, lz))
+        if self._log:
+            self.t, _, _, x, P = self._log[-1]
+        else:
+            self.t, x, P = self._base
+        self.x, self.P = x.copy(), P.copy()
+        for rt, rk, rz in sorted(replay, key=lambda m: m[0]):
+            self._step(rt, rk, rz)
+            self._log.append((rt, rk, rz, self.x.copy(), self.P.copy()))
+        self._trim()
+        return self.x
+
+    def state_dict(self):
+        """Current estimate as plain values, for session snapshots."""
+        return {"t": self.t, "x": self.x.tolist(), "P": self.P.tolist(), "late_dropped": self.late_dropped}
+
+    def load_state(self, state):
+        self.reset()
+        self.t = state["t"]
+        x = np.array(state["x"], dtype=float)
+        P = np.array(state["P"], dtype=float)
+        if len(x) == 3:
+            # Snapshot from before the offset state; those filters only ever saw baro
+            x, P = np.append(x, 0.0), np.pad(P, ((0, 1), (0, 1)))
+            P[3, 3] = DATUM_VAR
+        self.x, self.P = x, P
+        self._base = (self.t, self.x.copy(), self.P.copy())
+        self.late_dropped = state["late_dropped"]
+
+    def predict(self, t):
+        """State extrapolated to time t without touching the filter."""
+        if self.t is None or t <= self.t:
+            return self.x.copy()
+        F, _ = transition(t - self.t, self.jerk_std)
+        return F @ self.x
+
+    def _step(self, t, kind, z):
+        dt = t - self.t
+        pinned = self.P[3, 3] == 0
+        if dt > 0:
+            F, Q = transition(dt, self.jerk_std, 0.0 if pinned else self.datum_std)
+            self.x = F @ self.x
+            self.P = F @ self.P @ F.T + Q
+        self.t = t
+        if kind == BARO and pinned:
+            self._rezero(z)
+            return
+        # Scalar innovation: one measurement row, so S and K need no matrix inverse
+        h = _H[kind]
+        Ph = self.P @ h
+        S = h @ Ph + self.noise[kind]
+        K = Ph / S
+        self.x = self.x + K * (z - h @ self.x)
+        self.P = self.P - np.outer(K, Ph)
+
+    def _rezero(self, z):
+        # Altitude so far is on the GPS datum: move it onto the baro zero and
+        # keep the difference, with the old altitude's error, as the offset
+        r = self.noise[BARO]
+        self.x[3], self.x[0] = self.x[0] - z, z
+        P = self.P
+        P[3, :] = P[0, :]
+        P[:, 3] = P[:, 0]
+        P[0, :] = 0.0
+        P[:, 0] = 0.0
+        P[0, 0] = r
+        P[0, 3] = P[3, 0] = -r
+        P[3, 3] += r
+
+    def _trim(self):
+        while len(self._log) > self.history:
+            t, _, _, x, P = self._log.popleft()
+            self._base = (t, x, P)
+
+
+def smooth(times, baro=None, acc=None, gps=None, **kwargs):
+    """
+    Fixed-interval RTS smoother over a recorded log.
+
+    times and the measurement arrays are aligned, NaN marks a missing
+    value, and rows may be in any order. Returns (t, x, P) with x of shape
+    (n, 4) holding altitude, velocity, acceleration and the GPS datum
+    offset. Altitude is on the baro zero when there is any baro data,
+    else on the GPS datum.
+    """
+    kf = AltitudeKalman(**kwargs)
+    times = np.asarray(times, dtype=float)
+    order = np.argsort(times, kind="stable")
+    t = times[order]
+    n = len(t)
+    cols = []
+    for kind, arr in ((BARO, baro), (ACC, acc), (GPS, gps)):
+        if arr is not None:
+            arr = np.asarray(arr, dtype=float)[order]
+            if kind == ACC:
+                arr = arr - kf.acc_offset
+            cols.append((kind, arr))
+    # Without baro the offset is left unobserved: GPS then measures altitude directly
+    has_baro = any(kind == BARO and np.isfinite(arr).any() for kind, arr in cols)
+    rows = dict(_H, **({} if has_baro else {GPS: _H[BARO]}))
+
+    x_pred = np.zeros((n, 4))
+    P_pred = np.zeros((n, 4, 4))
+    x_filt = np.zeros((n, 4))
+    P_filt = np.zeros((n, 4, 4))
+    F_all = np.zeros((n, 4, 4))
+    x, P = kf.x, kf.P
+    P[3, 3] = DATUM_VAR
+    for k in range(n):
+        dt = t[k] - t[k - 1] if k else 0.0
+        F, Q = transition(dt, kf.jerk_std, kf.datum_std)
+        x = F @ x
+        P = F @ P @ F.T + Q
+        F_all[k], x_pred[k], P_pred[k] = F, x, P
+        for kind, arr in cols:
+            z = arr[k]
+            if math.isnan(z):
+                continue
+            h = rows[kind]
+            Ph = P @ h
+            K = Ph / (h @ Ph + kf.noise[kind])
+            x = x + K * (z - h @ x)
+            P = P - np.outer(K, Ph)
+        x_filt[k], P_filt[k] = x, P
+
+    # Smoother gains for every step at once: C_k = P_k|k F_k+1^T P_k+1|k^-1
+    x_s = x_filt.copy()
+    P_s = P_filt.copy()
+    if n > 1:
+        FP = P_filt[:-1] @ np.transpose(F_all[1:], (0, 2, 1))
+        C = np.transpose(np.linalg.solve(P_pred[1:], np.transpose(FP, (0, 2, 1))), (0, 2, 1))
+        for k in range(n - 2, -1, -1):
+            x_s[k] = x_filt[k] + C[k] @ (x_s[k + 1] - x_pred[k + 1])
+            P_s[k] = P_filt[k] + C[k] @ (P_s[k + 1] - P_pred[k + 1]) @ C[k].T
+    return t, x_s, P_s
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+Monte Carlo landing-zone prediction during descent.
+
+descend() integrates an ensemble of descent trajectories from the current
+estimated state (position, height above the pad, descent rate, recent
+drift) as arrays, one row per sample. Each sample draws its own drag
+(descent rate), wind bias, wind shear exponent and gust history, so the
+spread of landing points reflects the uncertainty in all of them.
+
+LandingPredictor splits the ensemble across a process pool every few
+seconds and summarize() turns the landing points into what the map
+draws: the mean landing point, a probability ellipse and a coarse
+heatmap, all in lat/lon.
+"""
+
+import math
+import multiprocessing
+import os
+import sys
+
+import numpy as np
+
+from geodesy import enu_to_geodetic
+
+P_ELLIPSE = 0.95
+
+
+def density_ratio(h):
+    """ISA rho(h) / rho(0) in the troposphere."""
+    return (1 - 2.2558e-5 * np.asarray(h, dtype=float)) ** 4.2559
+
+
+# === ENSEMBLE ===
+def descend(state, n, seed, dt=0.5, rate_std=0.15, wind_bias_std=1.5, shear_std=0.05,
+            gust_std=1.5, gust_tau=20.0, main_alt=None, main_rate=None, max_time=1800.0):
+    """Landing offsets (east, north) in metres and time to landing for n samples.
+
+    state: dict with alt (m above the pad), vz (m/s, negative when
+    descending) and drift (east, north) m/s at the current height.
+    """
+    rng = np.random.default_rng(seed)
+    h0 = max(float(state["alt"]), 1.0)
+    h = np.full(n, h0)
+    east, north, t_land = np.zeros(n), np.zeros(n), np.full(n, np.nan)
+
+    # Terminal rate scales with 1/sqrt(rho); sample a sea-level rate with lognormal drag error
+    rate0 = max(-float(state["vz"]), 1.0) * math.sqrt(density_ratio(h0))
+    rate0 = rate0 * np.exp(rng.normal(0.0, rate_std, n))
+    if main_alt is not None and main_rate is not None and h0 > main_alt:
+        main0 = main_rate * np.exp(rng.normal(0.0, rate_std, n))
+    else:
+        main0 = None
+
+    # Wind profile w(h) = (drift + bias) * (h / h0) ** alpha, 1/7 power law with a spread
+    drift = np.asarray(state.get("drift", (0.0, 0.0)), dtype=float)
+    w_ref = drift + rng.normal(0.0, wind_bias_std, (n, 2))
+    alpha = np.clip(rng.normal(1 / 7, shear_std, n), 0.0, 0.5)
+    gust = np.zeros((n, 2))
+    g_decay = math.exp(-dt / gust_tau)
+    g_kick = gust_std * math.sqrt(1 - g_decay ** 2)
+
+    active = np.arange(n)
+    t = 0.0
+    while len(active) and t < max_time:
+        ha = h[active]
+        rate = rate0[active]
+        if main0 is not None:
+            rate = np.where(ha < main_alt, main0[active], rate)
+        rate = rate / np.sqrt(density_ratio(ha))
+        shear = (np.maximum(ha, 2.0) / h0) ** alpha[active]
+        gust[active] = gust[active] * g_decay + g_kick * rng.standard_normal((len(active), 2))
+        # A parachute's horizontal response time is a few seconds, so it moves with the wind
+        ve = w_ref[active, 0] * shear + gust[active, 0]
+        vn = w_ref[active, 1] * shear + gust[active, 1]
+        step = np.minimum(dt, ha / rate)        # stop exactly at the ground
+        east[active] += ve * step
+        north[active] += vn * step
+        h[active] = ha - rate * step
+        landed = h[active] <= 1e-9
+        t_land[active[landed]] = t + step[landed]
+        active = active[~landed]
+        t += dt
+    return east, north, t_land
+
+
+def summarize(state, east, north, t_land, cells=24, max_cells=60, p=P_ELLIPSE):
+    """Mean landing point, probability ellipse and heatmap cells in lat/lon."""
+    lat0, lon0 = state["lat"], state["lon"]
+    mean = np.array([east.mean(), north.mean()])
+    cov = np.cov(east, north)
+    vals, vecs = np.linalg.eigh(cov)
+    k = math.sqrt(-2 * math.log(1 - p))          # Mahalanobis radius for p in 2-D
+    a = np.linspace(0, 2 * np.pi, 48, endpoint=False)
+    circle = np.stack([np.cos(a), np.sin(a)]) * (k * np.sqrt(np.maximum(vals, 0)))[:, None]
+    ring = mean[:, None] + vecs @ circle
+    e_lat, e_lon, _ = enu_to_geodetic(ring[0], ring[1], 0.0, lat0, lon0)
+
+    counts, xe, ye = np.histogram2d(east, north, bins=cells)
+    order = np.argsort(counts, axis=None)[::-1][:max_cells]
+    heat = []
+    peak = counts.max()
+    for flat in order:
+        i, j = np.unravel_index(flat, counts.shape)
+        if counts[i, j] == 0:
+            break
+        ce = np.array([xe[i], xe[i + 1], xe[i + 1], xe[i]])
+        cn = np.array([ye[j], ye[j], ye[j + 1], ye[j + 1]])
+        c_lat, c_lon, _ = enu_to_geodetic(ce, cn, 0.0, lat0, lon0)
+        heat.append((list(zip(c_lat.tolist(), c_lon.tolist())), float(counts[i, j] / peak)))
+
+    m_lat, m_lon, _ = enu_to_geodetic(mean[0], mean[1], 0.0, lat0, lon0)
+    return {"lat": float(m_lat), "lon": float(m_lon),
+            "ellipse": list(zip(e_lat.tolist(), e_lon.tolist())),
+            "semi_axes": (k * np.sqrt(np.maximum(vals, 0))).tolist(),
+            "heat": heat, "eta": float(np.nanmedian(t_land)), "samples": len(east)}
+
+
+# === PROCESS POOL ===
+def start_pool(workers):
+    """Process pool whose workers don't re-run the calling dashboard.
+
+    With the spawn start method (Windows) every worker re-imports the main
+    script, and the dashboards build their Tk window at import time. The
+    script path is hidden while the pool starts its workers.
+    """
+    main = sys.modules["__main__"]
+    path = getattr(main, "__file__", None)
+    if path is not None:
+        del main.__file__
+    try:
+        return multiprocessing.Pool(workers)
+    finally:
+        if path is not None:
+            main.__file__ = path
+
+
+class LandingPredictor:
+    def __init__(self, samples=4000, interval=3.0, workers=None, **model):
+        self.samples = samples
+        self.interval = interval
+        self.workers = workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self.model = model
+        self.pool = None
+        self.pending = None
+        self.state = None
+        self.last_run = None
+        self.result = None
+
+    def maybe_run(self, now, state):
+        """Start an ensemble for state if the last one finished and the interval has passed."""
+        if self.pending is not None or (self.last_run is not None and now - self.last_run < self.interval):
+            return False
+        if self.pool is None:
+            self.pool = start_pool(self.workers)
+        chunk = -(-self.samples // self.workers)
+        seeds = np.random.SeedSequence().spawn(self.workers)
+        args = [(state, chunk, seed) for seed in seeds]
+        self.pending = self.pool.starmap_async(_descend_job, [(a, self.model) for a in args])
+        self.state = state
+        self.last_run = now
+        return True
+
+    def poll(self):
+        """The new summary once a run has finished, else None; never blocks.
+
+        A failed run is printed and dropped, so the next maybe_run() starts
+        a fresh one instead of the error reaching the dashboard's timer.
+        """
+        if self.pending is None or not self.pending.ready():
+            return None
+        try:
+            parts = self.pending.get()
+            east, north, t_land = (np.concatenate(x) for x in zip(*parts))
+            self.result = summarize(self.state, east, north, t_land)
+        except Exception as e:
+            print("Landing prediction failed:", e)
+            return None
+        finally:
+            self.pending = None
+        return self.result
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+
+
+def _descend_job(args, model):
+    return descend(*args, **model)
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+LoRa link-quality tracking for the ground-station receivers.
+
+LinkMonitor is fed every line the receiver prints. Telemetry packets
+("Received: ...") count as arrivals; "Receive failed" lines and packets
+the dashboard could not parse count as errors; "Link: RSSI: x, SNR: y"
+lines (printed by Receiver.ino after each packet) update signal stats.
+
+Loss comes from a "Seq: n" field when the payload has one, otherwise from
+inter-arrival gaps against the learned packet period. All statistics are
+kept over a sliding time window with running sums, so each update is O(1),
+and the once-per-second history is a bounded deque.
+"""
+
+from collections import deque
+import math
+import re
+
+_SEQ = re.compile(r"\bSeq:\s*(\d+)")
+_RSSI = re.compile(r"RSSI:\s*(-?\d+(?:\.\d+)?)")
+_SNR = re.compile(r"SNR:\s*(-?\d+(?:\.\d+)?)")
+
+
+class RollingStat:
+    """Mean/std over a time window using running sums."""
+
+    def __init__(self, window):
+        self.window = window
+        self.samples = deque()
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def add(self, t, value):
+        self.samples.append((t, value))
+        self.total += value
+        self.total_sq += value * value
+        self.expire(t)
+
+    def expire(self, now):
+        while self.samples and self.samples[0][0] < now - self.window:
+            _, value = self.samples.popleft()
+            self.total -= value
+            self.total_sq -= value * value
+
+    @property
+    def mean(self):
+        return self.total / len(self.samples) if self.samples else math.nan
+
+    @property
+    def std(self):
+        n = len(self.samples)
+        if n < 2:
+            return math.nan
+        return math.sqrt(max(0.0, self.total_sq / n - (self.total / n) ** 2))
+
+
+class LinkMonitor:
+    def __init__(self, window=10.0, seq_modulo=65536, history=600):
+        self.window = window
+        self.seq_modulo = seq_modulo
+        self.received = 0
+        self.lost = 0
+        self.errors = 0
+        self.period = None          # learned packet period when there is no Seq field
+        self.jitter = 0.0           # RFC 3550 style smoothed inter-arrival variation, s
+        self.rssi = RollingStat(window)
+        self.snr = RollingStat(window)
+        self.history = deque(maxlen=history)
+        self._events = deque()      # (t, received, lost, errors, nbytes) inside the window
+        self._sums = [0, 0, 0, 0]
+        self._last_t = None
+        self._last_seq = None
+        self._last_gap = None
+        self._last_snapshot = None
+
+    # --- feeding ---
+    def observe_line(self, t, line):
+        """Classify one raw receiver line; returns True if it was a telemetry packet."""
+        if "Receive failed" in line:
+            self.on_error(t)
+            return False
+        if line.startswith("Link:"):
+            rssi, snr = _RSSI.search(line), _SNR.search(line)
+            self.on_signal(t, float(rssi.group(1)) if rssi else None, float(snr.group(1)) if snr else None)
+            return False
+        if line.startswith("Received:") or "qw" in line:
+            seq = _SEQ.search(line)
+            self.on_packet(t, len(line) + 2, int(seq.group(1)) if seq else None)
+            return True
+        return False
+
+    def on_packet(self, t, nbytes, seq=None):
+        lost = 0
+        if seq is not None:
+            if self._last_seq is not None:
+                gap = (seq - self._last_seq) % self.seq_modulo
+                # gap 0 is a duplicate; a huge gap is a sender restart, not loss
+                if 0 < gap < self.seq_modulo // 2:
+                    lost = gap - 1
+            self._last_seq = seq
+        if self._last_t is not None:
+            gap_t = t - self._last_t
+            if seq is None:
+                lost = self._gap_loss(gap_t)
+            if self._last_gap is not None:
+                self.jitter += (abs(gap_t - self._last_gap) - self.jitter) / 16.0
+            self._last_gap = gap_t
+        self._last_t = t
+        self.received += 1
+        self.lost += lost
+        self._push(t, 1, lost, 0, nbytes)
+
+    def on_error(self, t):
+        self.errors += 1
+        self._push(t, 0, 0, 1, 0)
+
+    def on_signal(self, t, rssi=None, snr=None):
+        if rssi is not None:
+            self.rssi.add(t, rssi)
+        if snr is not None:
+            self.snr.add(t, snr)
+
+    def _gap_loss(self, gap):
+        if gap <= 0:
+            return 0
+        if self.period is None:
+            self.period = gap
+            return 0
+        if gap > 1.5 * self.period:
+            return max(0, int(round(gap / self.period)) - 1)
+        # Only learn the period from gaps that look like back-to-back packets
+        self.period += 0.05 * (gap - self.period)
+        return 0
+
+    def _push(self, t, received, lost, errors, nbytes):
+        self._events.append((t, received, lost, errors, nbytes))
+        for i, v in enumerate((received, lost, errors, nbytes)):
+            self._sums[i] += v
+        self._expire(t)
+
+    def _expire(self, now):
+        while self._events and self._events[0][0] < now - self.window:
+            old = self._events.popleft()
+            for i in range(4):
+                self._sums[i] -= old[i + 1]
+
+    # --- reporting ---
+    def stats(self, now):
+        self._expire(now)
+        self.rssi.expire(now)
+        self.snr.expire(now)
+        received, lost, errors, nbytes = self._sums
+        expected = received + lost
+        span = min(self.window, now - self._events[0][0]) if self._events else 0.0
+        return {
+            "received": self.received,
+            "lost": self.lost,
+            "errors": self.errors,
+            "loss_rate": lost / expected if expected else 0.0,
+            "rate_hz": received / span if span > 0 else 0.0,
+            "throughput_bps": 8 * nbytes / span if span > 0 else 0.0,
+            "jitter_ms": 1000 * self.jitter,
+            "rssi": self.rssi.mean,
+            "snr": self.snr.mean,
+        }
+
+    def snapshot(self, now, every=1.0):
+        """Append stats to the bounded history at most once per `every` seconds."""
+        if self._last_snapshot is None or now - self._last_snapshot >= every:
+            self._last_snapshot = now
+            self.history.append((now, self.stats(now)))
+        return self.history[-1][1]
+
+    def summary(self, now):
+        s = self.snapshot(now)
+        return (f"Loss {100 * s['loss_rate']:.1f}% | {s['rate_hz']:.1f} Hz | "
+                f"{s['throughput_bps'] / 1000:.2f} kbit/s | jitter {s['jitter_ms']:.0f} ms | "
+                f"RSSI {s['rssi']:.0f} dBm | SNR {s['snr']:.1f} dB")
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+One-figure live plot panel for the Tk dashboards.
+
+All channels share a single Figure, a single FigureCanvasTkAgg and a
+common time axis. Lines are animated artists. Each frame restores the
+cached background, draws the lines and blits the figure once. A full
+render happens only when axis limits have to grow (with headroom, so
+rarely), when markers change, or when channels are added or removed.
+Channels can be added or removed at runtime; only the axes are rebuilt,
+the Tk widget stays.
+"""
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+HEADROOM = 0.15
+
+
+class PlotPanel:
+    def __init__(self, master, channels, figsize=(6, 4), bg="#1e1e1e", ax_bg="#2e2e2e",
+                 color="cyan", marker_color="yellow", xlabel="Time (s)"):
+        self.figure = Figure(figsize=figsize)
+        self.figure.patch.set_facecolor(bg)
+        self.canvas = FigureCanvasTkAgg(self.figure, master=master)
+        self.widget = self.canvas.get_tk_widget()
+        self.ax_bg, self.color, self.marker_color, self.xlabel = ax_bg, color, marker_color, xlabel
+        self.channels = []
+        self.axes = {}
+        self.lines = {}
+        self.data = {}                  # channel -> (x, y) last set
+        self.markers = []               # x positions of vertical event markers
+        self._fitted = set()            # channels whose axes have limits from real data
+        self._background = None
+        self._dirty = True
+        self.canvas.mpl_connect("draw_event", self._on_draw)
+        self.set_channels(channels)
+
+    # --- layout ---
+    def set_channels(self, channels):
+        """Show exactly these channels, in order."""
+        self.channels = list(channels)
+        self.figure.clear()
+        self.axes, self.lines = {}, {}
+        self._fitted.clear()
+        n = max(1, len(self.channels))
+        first = None
+        for i, name in enumerate(self.channels):
+            ax = self.figure.add_subplot(n, 1, i + 1, sharex=first)
+            first = first or ax
+            ax.set_facecolor(self.ax_bg)
+            ax.tick_params(colors="white", labelsize=6)
+            ax.set_ylabel(name, color="white", fontsize=7)
+            if i < n - 1:
+                ax.tick_params(labelbottom=False)
+            else:
+                ax.set_xlabel(self.xlabel, color="white", fontsize=6)
+            line, = ax.plot([], [], color=self.color, linewidth=1, animated=True)
+            self.axes[name], self.lines[name] = ax, line
+            for x in self.markers:
+                ax.axvline(x, color=self.marker_color, linestyle="--", linewidth=0.8)
+            if name in self.data:
+                line.set_data(*self.data[name])
+                self._fit(name, *self.data[name])
+        self.figure.subplots_adjust(left=0.1, right=0.98, top=0.98, bottom=0.08, hspace=0.08)
+        self._dirty = True
+
+    def add_channel(self, name):
+        if name not in self.channels:
+            self.set_channels(self.channels + [name])
+
+    def remove_channel(self, name):
+        if name in self.channels:
+            self.set_channels([c for c in self.channels if c != name])
+
+    @property
+    def width(self):
+        """Plot width in pixels, for decimating series to one point pair per column."""
+        return self.widget.winfo_width()
+
+    # --- data ---
+    def set_data(self, name, x, y):
+        self.data[name] = (x, y)
+        if name in self.lines:
+            self.lines[name].set_data(x, y)
+            self._fit(name, x, y)
+
+    def add_marker(self, x):
+        self.markers.append(x)
+        for ax in self.axes.values():
+            ax.axvline(x, color=self.marker_color, linestyle="--", linewidth=0.8)
+        self._dirty = True
+
+    def clear_markers(self):
+        self.markers.clear()
+        for ax in self.axes.values():
+            for line in list(ax.lines):
+                if line not in self.lines.values():
+                    line.remove()
+        self._dirty = True
+
+    def _fit(self, name, x, y):
+        # Grow limits with headroom so a full redraw is needed only now and then
+        if len(x) == 0:
+            return
+        ax = self.axes[name]
+        x0, x1 = float(x[0]), float(x[-1])
+        lo, hi = ax.get_xlim()
+        if x0 < lo or x1 > hi or name not in self._fitted:
+            span = max(x1 - x0, 1.0)
+            ax.set_xlim(x0, x1 + HEADROOM * span)
+            self._dirty = True
+        y = np.asarray(y, dtype=float)
+        if not np.isfinite(y).any():
+            return
+        y0, y1 = float(np.nanmin(y)), float(np.nanmax(y))
+        lo, hi = ax.get_ylim()
+        if y0 < lo or y1 > hi or name not in self._fitted:
+            pad = HEADROOM * max(y1 - y0, abs(y1) * 1e-3, 1e-6)
+            ax.set_ylim(y0 - pad, y1 + pad)
+            self._fitted.add(name)
+            self._dirty = True
+
+    # --- drawing ---
+    def draw(self):
+        """Render one frame: a blit of the lines, or a full draw when the layout changed."""
+        if self._dirty or self._background is None:
+            self._dirty = False
+            self.canvas.draw()          # _on_draw caches the background and blits the lines
+            return
+        self.canvas.restore_region(self._background)
+        self._draw_lines()
+        self.canvas.blit(self.figure.bbox)
+
+    def _on_draw(self, event):
+        self._background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self._draw_lines()
+        self.canvas.blit(self.figure.bbox)
+
+    def _draw_lines(self):
+        for name, line in self.lines.items():
+            self.axes[name].draw_artist(line)
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming sanity checks between decode and the dashboard buffers.
+
+SanityFilter.check() removes bad values from a decoded record before it
+is buffered. Each channel can have three checks, applied in order:
+
+  range   value outside [lo, hi]
+  hampel  rate of change (against the last accepted value) more than k
+          scaled MADs from its rolling median, with a floor of `scale`
+  rate    |rate of change| above max_rate
+
+The Hampel test runs on the rate of change rather than the level, so a
+fast but smooth climb during boost is not mistaken for a glitch. Keep it
+off channels that really do step, such as acceleration at ignition.
+
+Rejections are counted per channel and per reason. The rolling median
+uses two heaps with lazy deletion, so an update is O(log w); the heaps
+are rebuilt from the window when stale entries outnumber live ones, so
+memory stays bounded. The Hampel
+scale is the rolling median of past absolute deviations, so it is also
+O(log w). RobustBaseline replaces first-sample capture: the pad
+reference is the median of the first N accepted samples.
+"""
+
+from collections import Counter, deque
+import heapq
+import math
+
+# Limits per channel name, covering both receiver formats
+DEFAULT_RULES = {
+    "Alt":      {"lo": -500.0, "hi": 30000.0, "max_rate": 800.0, "hampel": 15, "scale": 30.0},
+    "Filt_Alt": {"lo": -500.0, "hi": 30000.0, "max_rate": 800.0, "hampel": 15, "scale": 30.0},
+    "P":        {"lo": 1000.0, "hi": 110000.0, "max_rate": 10000.0, "hampel": 15, "scale": 400.0},
+    "T":        {"lo": -60.0, "hi": 85.0, "max_rate": 20.0},
+    "Filt_Acc": {"lo": -200.0, "hi": 200.0},
+    "Yaw":      {"lo": -360.0, "hi": 360.0},
+    "Pitch":    {"lo": -180.0, "hi": 180.0},
+    "Roll":     {"lo": -180.0, "hi": 180.0},
+    "AngleX":   {"lo": -360.0, "hi": 360.0},
+    "AngleY":   {"lo": -180.0, "hi": 180.0},
+    "Stage":    {"lo": 0.0, "hi": 9.0},
+    "Lat":      {"lo": -90.0, "hi": 90.0, "max_rate": 0.05},
+    "Lon":      {"lo": -180.0, "hi": 180.0, "max_rate": 0.05},
+    "GPS_Alt":  {"lo": -500.0, "hi": 30000.0, "max_rate": 800.0},
+}
+
+MAD_SCALE = 1.4826      # MAD -> standard deviation for Gaussian noise
+
+
+class RollingMedian:
+    """Sliding-window median: two heaps with lazy deletion, O(log w) per push."""
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.low = []           # max-heap of the smaller half (negated)
+        self.high = []          # min-heap of the larger half
+        self.n_low = 0          # live element counts (heaps also hold stale entries)
+        self.n_high = 0
+        self.stale = Counter()
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def median(self):
+        if not self.values:
+            return math.nan
+        if self.n_low > self.n_high:
+            return -self.low[0]
+        return 0.5 * (-self.low[0] + self.high[0])
+
+    def push(self, x):
+        self.values.append(x)
+        if self.n_low == 0 or x <= -self.low[0]:
+            heapq.heappush(self.low, -x)
+            self.n_low += 1
+        else:
+            heapq.heappush(self.high, x)
+            self.n_high += 1
+        if len(self.values) > self.window:
+            self._remove(self.values.popleft())
+        self._balance()
+        if len(self.low) + len(self.high) > 2 * len(self.values) + 16:
+            self._rebuild()
+
+    def _remove(self, x):
+        self.stale[x] += 1
+        if x <= -self.low[0]:
+            self.n_low -= 1
+            if x == -self.low[0]:
+                self._prune(self.low, -1)
+        else:
+            self.n_high -= 1
+            if self.high and x == self.high[0]:
+                self._prune(self.high, 1)
+
+    def _balance(self):
+        # Keep n_low == n_high or n_low == n_high + 1
+        if self.n_low > self.n_high + 1:
+            heapq.heappush(self.high, -heapq.heappop(self.low))
+            self.n_low -= 1
+            self.n_high += 1
+            self._prune(self.low, -1)
+        elif self.n_low < self.n_high:
+            heapq.heappush(self.low, -heapq.heappop(self.high))
+            self.n_high -= 1
+            self.n_low += 1
+            self._prune(self.high, 1)
+
+    def _rebuild(self):
+        # Stale entries below the heap tops are never popped; start over from the live window
+        live = sorted(self.values)
+        k = (len(live) + 1) // 2
+        self.low = [-x for x in live[:k]]
+        self.high = live[k:]
+        heapq.heapify(self.low)
+        heapq.heapify(self.high)
+        self.n_low, self.n_high = k, len(live) - k
+        self.stale.clear()
+
+    def _prune(self, heap, sign):
+        while heap:
+            x = sign * heap[0]
+            if self.stale[x]:
+                self.stale[x] -= 1
+                if not self.stale[x]:
+                    del self.stale[x]
+                heapq.heappop(heap)
+            else:
+                break
+
+
+class Hampel:
+    """Flags x when |x - median| > k * 1.4826 * MAD over the last window samples.
+
+    Every sample enters the window, flagged or not, so a real step change
+    moves the median and stops being flagged after about window / 2 samples.
+    """
+
+    def __init__(self, window=15, k=4.0, min_scale=1e-6):
+        self.med = RollingMedian(window)
+        self.dev = RollingMedian(window)
+        self.k = k
+        self.min_scale = min_scale
+        self.warmup = max(3, window // 2)
+
+    def is_outlier(self, x):
+        outlier = False
+        if len(self.med) >= self.warmup:
+            m = self.med.median
+            scale = max(MAD_SCALE * self.dev.median, self.min_scale)
+            outlier = abs(x - m) > self.k * scale
+            self.dev.push(abs(x - m))
+        else:
+            self.dev.push(abs(x - self.med.median) if len(self.med) else 0.0)
+        self.med.push(x)
+        return outlier
+
+
+class SanityFilter:
+    def __init__(self, rules=DEFAULT_RULES, k=4.0, max_rate_rejects=3):
+        self.rules = rules
+        self.max_rate_rejects = max_rate_rejects
+        self.hampel = {ch: Hampel(r["hampel"], k, r.get("scale", 1e-6))
+                       for ch, r in rules.items() if r.get("hampel")}
+        self.last = {}                  # channel -> (t, value) of the last accepted sample
+        self.rate_streak = Counter()
+        self.rejected = Counter()       # (channel, reason) -> count
+        self.total = 0
+
+    @property
+    def rejected_total(self):
+        return sum(self.rejected.values())
+
+    def check(self, t, rec):
+        """Drop rejected channels from rec in place and return it."""
+        for ch in list(rec):
+            rule = self.rules.get(ch)
+            x = rec[ch]
+            if rule is None or not isinstance(x, float):
+                continue
+            self.total += 1
+            reason = self._reason(ch, rule, t, x)
+            if reason:
+                self.rejected[(ch, reason)] += 1
+                del rec[ch]
+            else:
+                self.last[ch] = (t, x)
+        return rec
+
+    def _reason(self, ch, rule, t, x):
+        if not math.isfinite(x):
+            return "nan"
+        if ("lo" in rule and x < rule["lo"]) or ("hi" in rule and x > rule["hi"]):
+            return "range"
+        if ch not in self.last or t <= self.last[ch][0]:
+            return None
+        t0, x0 = self.last[ch]
+        rate = (x - x0) / (t - t0)
+        reason = None
+        if ch in self.hampel and self.hampel[ch].is_outlier(rate):
+            reason = "hampel"
+        elif "max_rate" in rule and abs(rate) > rule["max_rate"]:
+            reason = "rate"
+        if reason:
+            # After a run of rejections the old value is the suspect one; accept and re-anchor
+            self.rate_streak[ch] += 1
+            if self.rate_streak[ch] <= self.max_rate_rejects:
+                return reason
+        self.rate_streak[ch] = 0
+        return None
+
+    def summary(self):
+        return ", ".join(f"{ch} {reason}: {n}" for (ch, reason), n in self.rejected.most_common())
+
+    def state_dict(self):
+        """Last accepted values and counts; the Hampel windows refill after a restore."""
+        return {"last": self.last, "total": self.total,
+                "rejected": [[ch, reason, n] for (ch, reason), n in self.rejected.items()]}
+
+    def load_state(self, state):
+        self.last = {ch: tuple(tx) for ch, tx in state["last"].items()}
+        self.total = state["total"]
+        self.rejected = Counter({(ch, reason): n for ch, reason, n in state["rejected"]})
+
+
+class RobustBaseline:
+    """Median of the first n samples; provisional median until then."""
+
+    def __init__(self, n=20):
+        self.n = n
+        self.samples = []
+        self.value = None
+
+    @property
+    def ready(self):
+        return len(self.samples) >= self.n
+
+    def state_dict(self):
+        return {"samples": self.samples}
+
+    def load_state(self, state):
+        self.samples = []
+        self.value = None
+        for x in state["samples"][:self.n]:
+            self.add(x)
+
+    def add(self, x):
+        if not self.ready:
+            self.samples.append(x)
+            s = sorted(self.samples)
+            m = len(s) // 2
+            self.value = s[m] if len(s) % 2 else 0.5 * (s[m - 1] + s[m])
+        return self.value
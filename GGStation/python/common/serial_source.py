@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+Self-healing serial input for the dashboards.
+
+SerialSource owns the port on a background thread and hands complete
+lines, stamped with their arrival time, to the UI through a bounded
+queue. The port is found by name if one is configured, otherwise by USB
+VID/PID of the usual receiver boards and then by sniffing each candidate
+for a line that matches the dashboard's format.
+
+When the port errors out (cable bump, board reset, USB re-enumeration)
+the thread closes it and retries straight away, backing off from 50 ms to
+at most 0.5 s, so a replug is picked up within a few hundred
+milliseconds. Dashboard state lives outside the source and is untouched.
+The port is read in bulk (whatever is buffered) and split into lines on
+the thread; lines that arrive in one read share a timestamp.
+Each outage's duration is recorded for display. Several sources can run
+in one process (GPS and telemetry); a port held by one is never probed by
+another.
+"""
+
+from collections import deque
+import queue
+import re
+import threading
+import time
+
+import serial
+from serial.tools import list_ports
+
+# USB bridges on the receiver boards we fly with: Arduino, CH340, CP210x, FTDI (pid None = any)
+RECEIVER_USB_IDS = [(0x2341, None), (0x1A86, 0x7523), (0x10C4, 0xEA60), (0x0403, 0x6001)]
+MAX_LINE = 1 << 16
+
+
+def find_ports(usb_ids=RECEIVER_USB_IDS):
+    """Device names whose VID/PID match usb_ids, then every other port."""
+    matched, others = [], []
+    for p in sorted(list_ports.comports(), key=lambda p: p.device):
+        if p.vid is not None and any(p.vid == vid and pid in (None, p.pid) for vid, pid in usb_ids):
+            matched.append(p.device)
+        else:
+            others.append(p.device)
+    return matched, others
+
+
+class SerialSource:
+    claimed = set()                         # devices open by any source in this process
+    claim_lock = threading.Lock()
+
+    def __init__(self, port=None, baud=115200, sniff=None, usb_ids=RECEIVER_USB_IDS, name="serial",
+                 queue_size=20000, backoff=(0.05, 0.5), probe_time=1.5, read_timeout=0.1, encoding="utf-8"):
+        self.port = port                    # fixed port name, or None to discover
+        self.baud = baud
+        self.sniff = re.compile(sniff) if isinstance(sniff, str) else sniff
+        self.usb_ids = usb_ids
+        self.name = name
+        self.backoff = backoff
+        self.probe_time = probe_time
+        self.read_timeout = read_timeout
+        self.encoding = encoding
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.ser = None
+        self.partial = b""                  # bytes after the last newline, waiting for the rest of the line
+        self.device = None                  # port currently (or last) open
+        self.dropped = 0                    # lines discarded because the UI fell behind
+        self.outages = deque(maxlen=100)    # durations of finished outages, s
+        self.down_since = None              # start of the current outage
+        self.started = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    # --- lifecycle ---
+    def start(self):
+        self.started = time.time()
+        self._thread = threading.Thread(target=self._run, name=f"{self.name}-reader", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        self._close_port()
+
+    # --- consuming ---
+    def drain(self, max_lines=None):
+        """All queued (t, line) pairs without blocking."""
+        out = []
+        while max_lines is None or len(out) < max_lines:
+            try:
+                out.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return out
+
+    def get(self, timeout=None):
+        """Next (t, line), waiting up to timeout; None if nothing arrived."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    @property
+    def connected(self):
+        return self.ser is not None
+
+    def describe(self, now=None):
+        now = time.time() if now is None else now
+        if self.ser is None:
+            since = self.down_since or self.started or now
+            what = "searching" if self.device is None else f"{self.device} lost"
+            return f"{self.name}: {what} {now - since:.1f} s"
+        text = f"{self.name}: {self.device}"
+        if self.outages:
+            text += f" ({len(self.outages)} outages, last {self.outages[-1]:.2f} s)"
+        if self.dropped:
+            text += f" [{self.dropped} dropped]"
+        return text
+
+    # --- reader thread ---
+    def _run(self):
+        delay = self.backoff[0]
+        while not self._stop.is_set():
+            if self.ser is None:
+                if self._connect():
+                    delay = self.backoff[0]
+                else:
+                    self._stop.wait(delay)
+                    delay = min(2 * delay, self.backoff[1])
+                continue
+            try:
+                # Everything already buffered in one call; pyserial's readline() costs a syscall per byte
+                raw = self.ser.read(max(1, self.ser.in_waiting))
+            except (serial.SerialException, OSError) as e:
+                print(f"⚠️ {self.name}: {self.device} lost: {e}")
+                self._close_port()
+                self.down_since = time.time()
+                continue
+            if raw:
+                *lines, self.partial = (self.partial + raw).split(b"\n")
+                if len(self.partial) > MAX_LINE:
+                    self.partial = b""      # no newline in sight: noise, not telemetry
+                now = time.time()
+                for raw_line in lines:
+                    line = raw_line.decode(self.encoding, errors="ignore").strip()
+                    if line:
+                        self._put(now, line)
+
+    def _put(self, t, line):
+        try:
+            self.queue.put_nowait((t, line))
+        except queue.Full:
+            # Keep the newest data: drop the oldest line
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            self.dropped += 1
+            self.queue.put_nowait((t, line))
+
+    def _candidates(self):
+        if self.port:
+            return [(self.port, False)]
+        matched, others = find_ports(self.usb_ids)
+        ordered = []
+        if self.device in matched + others:
+            ordered.append(self.device)     # the port we just lost usually comes back under its old name
+        ordered += [p for p in matched if p not in ordered]
+        if self.sniff is not None:
+            ordered += [p for p in others if p not in ordered]
+        ordered = [p for p in ordered if p not in SerialSource.claimed]
+        # Sniff whenever there is a pattern, unless the port is the one that was already verified
+        return [(p, self.sniff is not None and p != self.device) for p in ordered]
+
+    def _connect(self):
+        for device, probe in self._candidates():
+            with SerialSource.claim_lock:
+                if device in SerialSource.claimed:
+                    continue
+                SerialSource.claimed.add(device)
+            try:
+                ser = serial.Serial(device, self.baud, timeout=self.read_timeout)
+            except (serial.SerialException, OSError, ValueError):
+                SerialSource.claimed.discard(device)
+                continue
+            if probe and not self._probe(ser):
+                ser.close()
+                SerialSource.claimed.discard(device)
+                continue
+            self.ser, self.device = ser, device
+            if self.down_since is not None:
+                self.outages.append(time.time() - self.down_since)
+                print(f"✅ {self.name}: {device} back after {self.outages[-1]:.2f} s")
+            else:
+                print(f"✅ {self.name}: reading {device}")
+            self.down_since = None
+            return True
+        return False
+
+    def _probe(self, ser):
+        """Read for up to probe_time; True if a line matches the sniff pattern (lines are kept)."""
+        deadline = time.time() + self.probe_time
+        seen = []
+        try:
+            while time.time() < deadline and not self._stop.is_set():
+                raw = ser.readline()
+                line = raw.decode(self.encoding, errors="ignore").strip() if raw else ""
+                if not line:
+                    continue
+                seen.append((time.time(), line))
+                if self.sniff.search(line):
+                    for t, kept in seen:
+                        self._put(t, kept)
+                    return True
+        except (serial.SerialException, OSError):
+            pass
+        return False
+
+    def _close_port(self):
+        if self.ser is not None:
+            try:
+                self.ser.close()
+            except (serial.SerialException, OSError):
+                pass
+            SerialSource.claimed.discard(self.device)
+            self.ser = None
+            self.partial = b""
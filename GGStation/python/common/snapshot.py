@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Session snapshots, so a restarted dashboard resumes where it stopped.
+
+SessionSnapshot mirrors every vehicle's history series (GPS track
+included) into memory-mapped float64 files of (t, y) rows. A save copies
+only the samples added since the last save, so its cost follows the new
+data rather than the session length. The small state goes to state.json:
+- the pad baseline
+- the Kalman and flight-event detector state
+- the sanity filter's last values
+- the latest labels and the focused vehicle
+
+state.json is written to a temporary file and renamed into place, so a
+crash during a save leaves the previous snapshot intact. The sample
+counts in state.json are the commit point; rows past them are ignored on
+load.
+
+restore() rebuilds the vehicles from a snapshot that is recent enough.
+The series are read from the mapped files and decimated in bulk, so a
+long session resumes in milliseconds.
+"""
+
+import json
+import os
+import time
+
+import numpy as np
+
+from decimate import DecimatedSeries
+
+STATE_FILE = "state.json"
+
+
+class SessionSnapshot:
+    def __init__(self, path, max_age=1800.0, capacity=4096):
+        self.path = path
+        self.max_age = max_age              # s; older snapshots belong to another session
+        self.capacity = capacity
+        self.maps = {}                      # (vehicle dir, channel) -> memmap of shape (cap, 2)
+        self.written = {}                   # (vehicle dir, channel) -> rows on disk
+        self.dirs = {}                      # vehicle id -> subdirectory name
+        os.makedirs(path, exist_ok=True)
+
+    # --- saving ---
+    def save(self, vehicles, extra=None):
+        """Write the samples added since the last save, then commit state.json."""
+        entries = []
+        for v in vehicles:
+            vdir = self._vehicle_dir(v.id)
+            counts = {}
+            for ch, series in v.history.items():
+                counts[ch] = self._write_series(vdir, ch, series)
+            entries.append({"id": v.id, "dir": vdir, "counts": counts, "latest": v.latest,
+                            "attitude": list(v.attitude), "baseline": v.baseline.state_dict(),
+                            "kf": v.kf.state_dict(), "detector": v.detector.state_dict(),
+                            "sanity": v.sanity.state_dict()})
+        for mm in self.maps.values():
+            mm.flush()
+        state = {"saved_at": time.time(), "focus": vehicles.focus, "vehicles": entries, "extra": extra or {}}
+        tmp = os.path.join(self.path, STATE_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, os.path.join(self.path, STATE_FILE))
+
+    def _vehicle_dir(self, vid):
+        if vid not in self.dirs:
+            self.dirs[vid] = f"v{len(self.dirs)}"
+            os.makedirs(os.path.join(self.path, self.dirs[vid]), exist_ok=True)
+        return self.dirs[vid]
+
+    def _write_series(self, vdir, ch, series):
+        key = (vdir, ch)
+        k, n = self.written.get(key, 0), len(series)
+        mm = self.maps.get(key)
+        if mm is None or n > len(mm):
+            cap = max(self.capacity, len(mm) if mm is not None else 0)
+            while cap < n:
+                cap *= 2
+            if mm is not None:
+                mm.flush()
+                del self.maps[key], mm      # drop the old mapping before the file grows
+            path = self._series_path(vdir, ch)
+            mode = "r+" if key in self.written and os.path.exists(path) else "w+"
+            mm = self.maps[key] = np.memmap(path, dtype=np.float64, mode=mode, shape=(cap, 2))
+        if n > k:
+            mm[k:n, 0] = series.x[k:n]
+            mm[k:n, 1] = series.y[k:n]
+        self.written[key] = n
+        return n
+
+    def _series_path(self, vdir, ch):
+        return os.path.join(self.path, vdir, f"{ch}.f8")
+
+    # --- loading ---
+    def load(self):
+        """The saved state, or None if there is none or it is older than max_age."""
+        try:
+            with open(os.path.join(self.path, STATE_FILE)) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - state["saved_at"] > self.max_age:
+            return None
+        return state
+
+    def restore(self, vehicles):
+        """Rebuild the registry's vehicles from the snapshot; returns its extra dict, or None."""
+        state = self.load()
+        if state is None:
+            return None
+        for entry in state["vehicles"]:
+            v = vehicles.get(entry["id"])
+            vdir = entry["dir"]
+            self.dirs[v.id] = vdir
+            for ch, n in entry["counts"].items():
+                if ch not in v.history:
+                    continue
+                key = (vdir, ch)
+                path = self._series_path(vdir, ch)
+                if n == 0 or not os.path.exists(path):
+                    self.written[key] = 0
+                    continue
+                rows = os.path.getsize(path) // 16
+                mm = self.maps[key] = np.memmap(path, dtype=np.float64, mode="r+", shape=(rows, 2))
+                v.history[ch] = DecimatedSeries.from_arrays(mm[:n, 0], mm[:n, 1])
+                self.written[key] = n
+            _refill_window(v)
+            v.latest.update(entry["latest"])
+            v.attitude = entry["attitude"]
+            v.baseline.load_state(entry["baseline"])
+            v.kf.load_state(entry["kf"])
+            v.detector.load_state(entry["detector"])
+            v.sanity.load_state(entry["sanity"])
+        if state["focus"] in vehicles.vehicles:
+            vehicles.focus = state["focus"]
+        return state["extra"]
+
+
+def _refill_window(v):
+    # The recent-window deques are the tail of the full history
+    for ch, series in v.history.items():
+        if ch in v.data:
+            n = len(series)
+            v.data[ch].extend(series.y[max(0, n - v.data[ch].maxlen):n])
+    first = next(iter(v.history.values()), None)
+    if first is not None:
+        n = len(first)
+        v.data["time"].extend(first.x[max(0, n - v.data["time"].maxlen):n])
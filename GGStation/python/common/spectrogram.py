@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Live spectrogram (waterfall) of telemetry channels.
+
+StftStream keeps the last nfft samples of one channel in a ring. Every
+hop samples it computes one STFT column: the frame is windowed, one
+rfft is taken, and the PSD in dB is written into a preallocated
+(frequency x columns) image. The image is also a ring: `head` is the
+column written next. Each column costs one nfft-point FFT whatever the
+session length, so ingest never stalls behind the display.
+
+The sample rate is taken from the timestamps spanning each frame, so it
+follows the link rate without configuration.
+
+SpectrogramPanel shows the images of several channels in one Figure,
+like PlotPanel does for lines. Each image is a single AxesImage that
+gets set_data() on the same array, and a sweep cursor marks the newest
+column. Frames are blitted; a full render is needed only when the
+frequency axis changes.
+"""
+
+import math
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from scipy.signal import get_window
+
+
+class StftStream:
+    def __init__(self, nfft=128, hop=32, columns=300):
+        self.nfft, self.hop, self.columns = nfft, hop, columns
+        self.window = get_window("hann", nfft)     # same window and scaling as welch()
+        self.win_power = float(np.sum(self.window ** 2))
+        self.samples = np.zeros(nfft)           # ring of the last nfft samples
+        self.times = np.zeros(nfft)
+        self.pos = 0                            # next slot in the sample ring
+        self.count = 0
+        self.since_column = 0
+        self.image = np.full((nfft // 2 + 1, columns), np.nan)
+        self.head = 0                           # next column in the image ring
+        self.written = 0                        # columns computed so far
+        self.fs = 0.0
+        self.peak = -math.inf                   # slowly decaying maximum, in dB
+
+    def push(self, t, x):
+        """Add one sample; returns True when it completed a new column."""
+        self.samples[self.pos] = x
+        self.times[self.pos] = t
+        self.pos = (self.pos + 1) % self.nfft
+        self.count += 1
+        self.since_column += 1
+        if self.count < self.nfft or self.since_column < self.hop:
+            return False
+        self.since_column = 0
+        self._column()
+        return True
+
+    def _column(self):
+        p = self.pos
+        span = self.times[p - 1] - self.times[p]    # newest minus oldest sample time
+        if span > 0:
+            self.fs = (self.nfft - 1) / span
+        frame = np.concatenate((self.samples[p:], self.samples[:p]))
+        frame -= frame.mean()
+        psd = np.abs(np.fft.rfft(frame * self.window)) ** 2 / (self.win_power * max(self.fs, 1e-9))
+        psd[1:-1] *= 2                              # one-sided
+        col = 10 * np.log10(psd + 1e-12)
+        self.image[:, self.head] = col
+        self.head = (self.head + 1) % self.columns
+        self.written += 1
+        self.peak = max(self.peak - 0.05, float(col.max()))
+
+
+class SpectrogramPanel:
+    def __init__(self, master, channels, figsize=(6, 4), bg="#1e1e1e", ax_bg="#2e2e2e",
+                 cmap="viridis", cursor_color="white", dynamic_range=60.0):
+        self.figure = Figure(figsize=figsize)
+        self.figure.patch.set_facecolor(bg)
+        self.canvas = FigureCanvasTkAgg(self.figure, master=master)
+        self.widget = self.canvas.get_tk_widget()
+        self.cmap = cmap
+        self.dynamic_range = dynamic_range
+        self.channels = list(channels)
+        self.axes, self.images, self.cursors = {}, {}, {}
+        self.nyquist = {}                   # channel -> top of the frequency axis, Hz
+        self.seen = {}                      # channel -> (stream, columns) already shown
+        self._background = None
+        self._dirty = True
+        n = max(1, len(self.channels))
+        first = None
+        for i, name in enumerate(self.channels):
+            ax = self.figure.add_subplot(n, 1, i + 1, sharex=first)
+            first = first or ax
+            ax.set_facecolor(ax_bg)
+            ax.tick_params(colors="white", labelsize=6)
+            ax.set_ylabel(f"{name} (Hz)", color="white", fontsize=7)
+            if i < n - 1:
+                ax.tick_params(labelbottom=False)
+            else:
+                ax.set_xlabel("Sweep (columns)", color="white", fontsize=6)
+            self.axes[name] = ax
+            self.images[name] = None
+            self.cursors[name] = ax.axvline(0, color=cursor_color, linewidth=0.8, animated=True)
+        self.figure.subplots_adjust(left=0.1, right=0.98, top=0.98, bottom=0.08, hspace=0.08)
+        self.canvas.mpl_connect("draw_event", self._on_draw)
+
+    # --- data ---
+    def set_stream(self, name, stream):
+        """Point the channel's image at the stream's buffer; returns True if there is anything new."""
+        if name not in self.axes or stream.written == 0:
+            return False
+        ax, im = self.axes[name], self.images[name]
+        top = 0.5 * stream.fs
+        if im is None or im.get_array().shape != stream.image.shape:
+            if im is not None:
+                im.remove()
+            im = self.images[name] = ax.imshow(stream.image, origin="lower", aspect="auto", cmap=self.cmap,
+                                               interpolation="nearest", animated=True,
+                                               extent=(0, stream.columns, 0, top))
+            self.nyquist[name] = top
+            self._dirty = True
+        elif abs(top - self.nyquist[name]) > 0.05 * self.nyquist[name]:
+            im.set_extent((0, stream.columns, 0, top))
+            self.nyquist[name] = top
+            self._dirty = True
+        new = (id(stream), stream.written) != self.seen.get(name)
+        if new:
+            im.set_data(stream.image)       # same array; marks the image stale
+            im.set_clim(stream.peak - self.dynamic_range, stream.peak)
+            self.cursors[name].set_xdata([stream.head, stream.head])
+            self.seen[name] = (id(stream), stream.written)
+        return new
+
+    # --- drawing ---
+    def draw(self):
+        if self._dirty or self._background is None:
+            self._dirty = False
+            self.canvas.draw()
+            return
+        self.canvas.restore_region(self._background)
+        self._draw_images()
+        self.canvas.blit(self.figure.bbox)
+
+    def _on_draw(self, event):
+        self._background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self._draw_images()
+        self.canvas.blit(self.figure.bbox)
+
+    def _draw_images(self):
+        for name, ax in self.axes.items():
+            if self.images[name] is not None:
+                ax.draw_artist(self.images[name])
+            ax.draw_artist(self.cursors[name])
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Tk-free decoding of the receiver line formats.
+
+  Received: Yaw: 12.3, Pitch: 1.0, Roll: -4.2, Alt: 152.3m, P: 99876Pa, T: 21.5C, LED: ON
+  Received: Filt_Alt: 152.3, Filt_Acc: 3.10, AngleX: 1.2, AngleY: -0.4, Stage: 1
+  qw: 0.99, qx: 0.01, qy: 0.02, qz: 0.00
+  Received: IMU: 200; gx,gy,gz,ax,ay,az[,mx,my,mz]; ...
+  GPS: 43.77350 -79.50150 [alt]
+  Received: EVENT ...
+  Link: RSSI: -87, SNR: 7.25
+
+decode_line() returns a dict of field -> float (text for non-numeric
+values such as LED or EVENT), or None if the line carries no telemetry.
+An IMU line decodes to {"IMU_rate": Hz, "IMU": (n, 6 or 9) array} with
+one row per raw sample, for ahrs.Madgwick.update_batch().
+"""
+
+import re
+
+import numpy as np
+
+_QUAT = re.compile(r"qw[: ]\s*(-?[\d.]+)[, ]+qx[: ]\s*(-?[\d.]+)[, ]+qy[: ]\s*(-?[\d.]+)[, ]+qz[: ]\s*(-?[\d.]+)")
+_UNITS = ("Pa", "m", "C")
+
+
+def _value(val):
+    val = val.strip()
+    for unit in _UNITS:
+        if val.endswith(unit):
+            val = val[:-len(unit)]
+            break
+    try:
+        return float(val)
+    except ValueError:
+        return val
+
+
+def _fields(body):
+    rec = {}
+    for part in body.split(", "):
+        if ": " in part:
+            key, val = part.split(": ", 1)
+            rec[key.strip()] = _value(val)
+    return rec
+
+
+def _imu(body):
+    head, _, rest = body.partition("IMU:")
+    rate, _, rows = rest.partition(";")
+    rows = rows.replace(" ", "").strip(";")
+    try:
+        width = rows.split(";", 1)[0].count(",") + 1
+        samples = np.array(rows.replace(";", ",").split(","), dtype=float).reshape(-1, width)
+        rec = _fields(head.rstrip(", "))
+        rec.update({"IMU_rate": float(rate), "IMU": samples})
+        return rec
+    except ValueError:
+        return None
+
+
+def decode_line(line):
+    line = line.strip()
+    if not line:
+        return None
+    body = line.replace("Received: ", "")
+
+    if "EVENT" in body:
+        return {"EVENT": body}
+
+    if body.startswith("Link:"):
+        body = body[len("Link:"):].strip()
+
+    if body.startswith("GPS:"):
+        parts = body.split()
+        try:
+            rec = {"Lat": float(parts[1]), "Lon": float(parts[2])}
+            if len(parts) >= 4:
+                rec["GPS_Alt"] = float(parts[3])
+            return rec
+        except (IndexError, ValueError):
+            return None
+
+    if "IMU:" in body:
+        return _imu(body)
+
+    match = _QUAT.search(body)
+    if match:
+        return dict(zip(("qw", "qx", "qy", "qz"), map(float, match.groups())))
+
+    return _fields(body) or None
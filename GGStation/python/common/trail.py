@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+Flight-path trail with a fixed point budget, for the 3D view.
+
+Trail keeps the points to draw. A new point is kept only if it is at
+least min_dist from the last kept one. When the budget is full, every
+other point is dropped and min_dist doubles, so the spacing follows the
+length of the path. The number of points never exceeds the budget. A
+thinning pass happens once per doubling of the path length, so the
+rebuild cost over a whole flight is logarithmic in its length.
+
+add() says what the renderer has to do: append the new point, rebuild
+from points, or nothing.
+"""
+
+import math
+
+APPEND = "append"
+REBUILD = "rebuild"
+
+
+class Trail:
+    def __init__(self, budget=2000, min_dist=1.0):
+        self.budget = budget
+        self.min_dist = min_dist        # current spacing, in the points' unit
+        self.points = []
+
+    def __len__(self):
+        return len(self.points)
+
+    def add(self, p):
+        """Offer one point; returns APPEND, REBUILD or None."""
+        if self.points and math.dist(p, self.points[-1]) < self.min_dist:
+            return None
+        self.points.append(tuple(p))
+        if len(self.points) <= self.budget:
+            return APPEND
+        thinned = self.points[::2]
+        if thinned[-1] is not self.points[-1]:
+            thinned.append(self.points[-1])
+        self.points = thinned
+        self.min_dist *= 2
+        return REBUILD
+
+    def clear(self, min_dist=1.0):
+        self.points = []
+        self.min_dist = min_dist
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Thread-safe UI update queue for the Tk dashboards.
+
+Worker threads never touch widgets. They hand decoded data to the Tk loop
+with submit() (every call is applied, in order) and request widget refreshes
+with post() (only the latest call per key is kept). Everything queued is
+applied in one batch per tick from root.after().
+"""
+
+import threading
+from collections import deque
+
+
+class UIDispatcher:
+    def __init__(self, root, interval_ms=30):
+        self.root = root
+        self.interval_ms = interval_ms
+        self._lock = threading.Lock()
+        self._calls = deque()
+        self._latest = {}
+        self._texts = {}
+
+    # --- worker-thread side ---
+    def submit(self, fn, *args):
+        """Queue fn(*args); every submitted call runs, in submission order."""
+        with self._lock:
+            self._calls.append((fn, args))
+
+    def post(self, key, fn, *args):
+        """Queue fn(*args) under key, replacing any pending call for that key."""
+        with self._lock:
+            self._latest[key] = (fn, args)
+
+    def post_text(self, label, text):
+        self.post(label, self.set_text, label, text)
+
+    # --- Tk-thread side ---
+    def set_text(self, label, text):
+        """config(text=...) only when the text actually changed."""
+        if self._texts.get(label) != text:
+            self._texts[label] = text
+            label.config(text=text)
+
+    def flush(self):
+        with self._lock:
+            calls, self._calls = self._calls, deque()
+        for fn, args in calls:
+            self._apply(fn, args)
+        # Data handlers above may post refreshes; apply them in this same batch
+        with self._lock:
+            latest, self._latest = self._latest, {}
+        for fn, args in latest.values():
+            self._apply(fn, args)
+
+    def start(self):
+        self.flush()
+        self.root.after(self.interval_ms, self.start)
+
+    def _apply(self, fn, args):
+        try:
+            fn(*args)
+        except Exception as e:
+            print("UI update error:", e)
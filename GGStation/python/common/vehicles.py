@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Per-vehicle state for dashboards that share one radio frequency.
+
+Packets carry an optional "ID: n" field; packets without one belong to
+DEFAULT_VEHICLE, so single-vehicle flights behave as before. Bare GPS
+lines never carry an ID; their fixes go to the vehicle heard most
+recently. State for a vehicle is created the first time its ID is seen. The registry tracks
+which vehicle has focus; dashboards buffer and estimate for every vehicle
+but only draw labels, gauges and plots for the focused one.
+
+VehicleState.ingest() is the estimation every receiver shares, for both
+packet formats. The dashboards and the headless service call it and keep
+only their own buffering and display.
+"""
+
+from collections import deque
+
+from ahrs import Madgwick
+from decimate import DecimatedSeries
+from flight_events import FlightEventDetector
+from kalman import AltitudeKalman
+from sanity import RobustBaseline, SanityFilter
+
+DEFAULT_VEHICLE = "1"
+GPS_FIELDS = {"Lat", "Lon", "GPS_Alt"}
+
+
+def vehicle_id(rec):
+    """Remove and return the vehicle ID from a decoded record."""
+    vid = rec.pop("ID", None)
+    if vid is None:
+        return DEFAULT_VEHICLE
+    if isinstance(vid, float):
+        return str(int(vid))
+    return str(vid)
+
+
+def is_gps_fix(rec):
+    """True for a record decoded from a bare GPS line."""
+    return bool(rec) and rec.keys() <= GPS_FIELDS
+
+
+class VehicleState:
+    def __init__(self, vid, channels, window=100):
+        self.id = vid
+        self.data = {k: deque(maxlen=window) for k in ["time"] + list(channels)}
+        self.history = {k: DecimatedSeries() for k in channels}
+        self.latest = {}                    # label -> latest value shown for it
+        self.attitude = [0.0, 0.0, 0.0]     # yaw, pitch, roll in degrees
+        self.ahrs = Madgwick()              # attitude from raw IMU lines, when the payload sends them
+        self.spectra = {}                   # channel -> spectrogram.StftStream, for dashboards with a waterfall
+        self.baseline = RobustBaseline()    # pad altitude: median of the first samples
+        self.sanity = SanityFilter()
+        self.kf = AltitudeKalman()
+        self.detector = FlightEventDetector()
+        self.marker = None
+        self.tracker = None                 # geodesy.Tracker, set by dashboards with a map
+
+    def ingest(self, t, rec):
+        """
+        Run one decoded packet through the estimators; returns (alt, acc, vel).
+
+        Glitched fields are dropped from rec and, once raw IMU batches drive
+        the AHRS, so are the flight computer's angles. alt is the baro altitude
+        above the pad; baro, Filt_Acc and GPS_Alt all go into the Kalman
+        filter, and the event detector gets the result. Each value is None
+        when the packet did not carry it.
+        """
+        if "IMU" in rec:
+            self.ahrs.update_batch(rec["IMU"], 1.0 / rec["IMU_rate"])
+            self.attitude = self.ahrs.euler()
+            return None, None, None
+        self.sanity.check(t, rec)
+        if self.ahrs.active:
+            for key in ("Yaw", "Pitch", "Roll", "AngleX", "AngleY"):
+                rec.pop(key, None)
+        elif "AngleX" in rec:
+            self.attitude = [rec["AngleX"], rec.get("AngleY", 0.0), 0.0]
+        elif "Yaw" in rec:
+            self.attitude = [rec["Yaw"], rec.get("Pitch", 0.0), rec.get("Roll", 0.0)]
+
+        alt = rec.get("Alt", rec.get("Filt_Alt"))
+        acc = rec.get("Filt_Acc")
+        alt = alt - self.baseline.add(alt) if isinstance(alt, float) else None
+        acc = acc if isinstance(acc, float) else None
+        if alt is not None:
+            self.kf.update_baro(t, alt)
+        if acc is not None:
+            self.kf.update_acc(t, acc)
+        if isinstance(rec.get("GPS_Alt"), float):
+            self.kf.update_gps(t, rec["GPS_Alt"])
+        vel = self.kf.vel if alt is not None else None
+        stage = rec.get("Stage")
+        self.detector.update(t, alt=alt, acc=acc, stage=int(stage) if isinstance(stage, float) else None, vel=vel)
+        return alt, acc, vel
+
+
+class VehicleRegistry:
+    def __init__(self, factory):
+        self.factory = factory
+        self.vehicles = {}
+        self.focus = None
+        self.last = None                    # vehicle heard most recently; owns ID-less GPS fixes
+
+    def __iter__(self):
+        return iter(self.vehicles.values())
+
+    def __len__(self):
+        return len(self.vehicles)
+
+    def get(self, vid):
+        """State for vid, created on first use; the first vehicle seen gets focus."""
+        v = self.vehicles.get(vid)
+        if v is None:
+            v = self.vehicles[vid] = self.factory(vid)
+            if self.focus is None:
+                self.focus = vid
+        return v
+
+    def route(self, rec):
+        """State a decoded record belongs to; removes its ID."""
+        if "ID" not in rec and is_gps_fix(rec) and self.last is not None:
+            return self.vehicles[self.last]
+        v = self.get(vehicle_id(rec))
+        if not is_gps_fix(rec):
+            self.last = v.id
+        return v
+
+    def focused(self):
+        return self.vehicles.get(self.focus)
+
+    def is_focused(self, v):
+        return v.id == self.focus
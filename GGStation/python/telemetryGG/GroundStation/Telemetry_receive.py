@@ -5,27 +5,33 @@ Created on Wed Apr 16 12:49:20 2025
 @author: ashka
 """
 
-import serial
 import tkinter as tk
 from PIL import Image, ImageTk
+import os
 import sys
 from math import sin, cos, radians
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from collections import deque
 from datetime import datetime
 import time
 from tkintermapview import TkinterMapView
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from flight_events import DESCENT
+from geodesy import Station, Tracker
+from landing import LandingPredictor
+from link_monitor import LinkMonitor
+from plot_panel import PlotPanel
+from serial_source import SerialSource
+from snapshot import SessionSnapshot
+from spectrogram import SpectrogramPanel, StftStream
+from telemetry_decode import decode_line
+from vehicles import VehicleRegistry, VehicleState
+
 # === SERIAL CONFIG ===
-SERIAL_PORT = 'COM6'
+SERIAL_PORT = None  # e.g. 'COM6'; None finds the receiver by USB ID, then by its line format
 BAUD_RATE = 115200
 
-try:
-    ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1)
-except Exception as e:
-    print(f"❌ Could not open {SERIAL_PORT}: {e}")
-    ser = None
+source = SerialSource(SERIAL_PORT, BAUD_RATE, sniff=r"Received:.*(Yaw|IMU):", name="Receiver").start()
+SNAPSHOT_DIR = "receive_session"  # resumed on launch if it was saved in the last 30 min
 
 root = tk.Tk()
 root.title("🚀 Arbalest Rocketry - Telemetry Dashboard")
@@ -62,7 +68,7 @@ update_clock()
 
 # === TELEMETRY LABELS ===
 labels = {}
-fields = ["Yaw", "Pitch", "Roll", "Alt", "P", "T", "LED"]
+fields = ["Yaw", "Pitch", "Roll", "Alt", "Vel", "P", "T", "LED", "Rng", "Az", "El", "GSpd"]
 telemetry_frame = tk.Frame(root, bg="#1e1e1e")
 telemetry_frame.grid(row=2, column=0, sticky="nw", padx=20)
 
@@ -80,6 +86,23 @@ tk.Label(event_frame, text="EVENT:", font=("Helvetica", 11, "bold"), fg="white",
 labels["EVENT"] = tk.Label(event_frame, text="---", font=("Helvetica", 11), fg="cyan", bg="#1e1e1e")
 labels["EVENT"].pack(side="left")
 
+# === LINK QUALITY ===
+link_frame = tk.Frame(root, bg="#1e1e1e")
+link_frame.grid(row=5, column=0, columnspan=2, sticky="w", padx=20, pady=5)
+tk.Label(link_frame, text="LINK:", font=("Helvetica", 11, "bold"), fg="white", bg="#1e1e1e").pack(side="left")
+labels["LINK"] = tk.Label(link_frame, text="---", font=("Consolas", 10), fg="cyan", bg="#1e1e1e")
+labels["LINK"].pack(side="left")
+link = LinkMonitor()
+
+def rejected_text():
+    n = sum(v.sanity.rejected_total for v in vehicles)
+    return f" | {n} rejected" if n else ""
+
+def update_link():
+    now = time.time()
+    labels["LINK"].config(text=f"{source.describe(now)} | {link.summary(now)}{rejected_text()}")
+    root.after(1000, update_link)
+
 # === GAUGES ===
 gauge_frame = tk.Frame(root, bg="#1e1e1e")
 gauge_frame.grid(row=1, column=1, rowspan=3, sticky="nsew", padx=20)
@@ -102,31 +125,53 @@ def draw_gauge(canvas, angle, label):
     canvas.create_text(cx, cy + r + 10, text=f"{angle:.1f}°", font=("Arial", 10))
 
 # === PLOTS ===
-telemetry_data = {k: deque(maxlen=100) for k in ["time", "Alt", "P", "T", "Lat", "Lon"]}
 plot_fields = ["Alt", "P", "T", "Lat", "Lon"]
-figs, axes, plots = [], [], []
-
 plot_frame = tk.Frame(root, bg="#1e1e1e")
 plot_frame.grid(row=4, column=0, columnspan=2, sticky="nsew", padx=10, pady=10)
+panel = PlotPanel(plot_frame, plot_fields)
 
-for i, field in enumerate(plot_fields):
-    plot_frame.grid_rowconfigure(i // 2, weight=1)
-    plot_frame.grid_columnconfigure(i % 2, weight=1)
-
-    fig, ax = plt.subplots(figsize=(3, 1.5))
-    fig.patch.set_facecolor('#1e1e1e')
-    ax.set_facecolor('#2e2e2e')
-    ax.tick_params(colors='white')
-    ax.set_title(f"{field} vs Time", color='white', fontsize=8)
-    ax.set_xlabel("Time (s)", color='white', fontsize=6)
-    ax.set_ylabel(field, color='white', fontsize=6)
-    line, = ax.plot([], [], color='cyan', linewidth=1)
-
-    canvas = FigureCanvasTkAgg(fig, master=plot_frame)
-    canvas.get_tk_widget().grid(row=i // 2, column=i % 2, padx=5, pady=5, sticky="nsew")
-    figs.append(fig)
-    axes.append(ax)
-    plots.append((line, canvas))
+# Channels can be switched on and off at runtime; hidden ones keep recording
+plot_vars = {field: tk.BooleanVar(value=True) for field in plot_fields}
+plot_menu_button = tk.Menubutton(plot_frame, text="Plots ▾", font=("Consolas", 9), fg="white", bg="#1e1e1e", relief="raised")
+plot_menu = tk.Menu(plot_menu_button, tearoff=0)
+for field in plot_fields:
+    plot_menu.add_checkbutton(label=field, variable=plot_vars[field], command=lambda: toggle_plots())
+plot_menu_button["menu"] = plot_menu
+plot_menu_button.pack(anchor="ne")
+tk.Button(plot_frame, text="Waterfall", font=("Consolas", 9), fg="white", bg="#1e1e1e",
+          command=lambda: toggle_waterfall()).pack(anchor="ne")
+
+def toggle_plots():
+    panel.set_channels([f for f in plot_fields if plot_vars[f].get()])
+    if vehicles.focused():
+        update_plots(vehicles.focused())
+
+panel.widget.pack(fill="both", expand=True)
+
+# === WATERFALL ===
+# Live spectrogram of the vibration-prone channels; the STFT runs on every packet, the window is optional
+waterfall_fields = ["P", "Alt"]
+waterfall = None
+
+def toggle_waterfall():
+    global waterfall
+    if waterfall is not None:
+        waterfall.widget.master.destroy()
+        waterfall = None
+        return
+    win = tk.Toplevel(root, bg="#1e1e1e")
+    win.title("Waterfall")
+    win.protocol("WM_DELETE_WINDOW", toggle_waterfall)
+    waterfall = SpectrogramPanel(win, waterfall_fields)
+    waterfall.widget.pack(fill="both", expand=True)
+    if vehicles.focused():
+        update_waterfall(vehicles.focused())
+
+def update_waterfall(v):
+    if waterfall is None:
+        return
+    if any([waterfall.set_stream(f, v.spectra[f]) for f in waterfall_fields]):
+        waterfall.draw()
 
 # === GPS MAP VIEW (bottom-right) ===
 map_frame = tk.Frame(root, bg="#1e1e1e")
@@ -134,82 +179,225 @@ map_frame.grid(row=4, column=2, rowspan=2, padx=10, pady=10, sticky="se")
 
 map_widget = TkinterMapView(map_frame, width=400, height=300, corner_radius=10)
 map_widget.pack(fill="both", expand=True)
-map_widget.set_position(47.986916, -81.848300)
+station = Station()
+map_widget.set_position(station.lat, station.lon)
 map_widget.set_zoom(14)
-map_widget.set_marker(47.986916, -81.848300, text="Ground Station")
+map_widget.set_marker(station.lat, station.lon, text="Ground Station")
 
-rocket_marker = None
-def update_rocket_position(lat, lon):
-    global rocket_marker
-    if rocket_marker:
-        rocket_marker.set_position(lat, lon)
+def update_rocket_position(v, lat, lon):
+    if v.marker:
+        v.marker.set_position(lat, lon)
     else:
-        rocket_marker = map_widget.set_marker(lat, lon, text="Rocket")
+        v.marker = map_widget.set_marker(lat, lon, text=f"Rocket {v.id}")
+
+def update_tracking(v, t, lat, lon):
+    # Pointing numbers for the antenna crew; height is the filtered altitude above the pad
+    track = v.tracker.update(t, lat, lon, station.alt + v.kf.alt)
+    v.latest["Rng"] = f"{track['Range']:.0f} m"
+    v.latest["Az"] = f"{track['Az']:.1f}°"
+    v.latest["El"] = f"{track['El']:.1f}°"
+    if track["GSpd"] is not None:
+        v.latest["GSpd"] = f"{track['GSpd']:.1f} m/s"
+
+# === LANDING PREDICTION ===
+# Ensembles run on a process pool every few seconds during the focused vehicle's descent
+landing = LandingPredictor()
+landing_shapes = []
+
+def heat_color(w):
+    return f"#ff{int(220 * (1 - w)):02x}00"     # yellow (sparse) to red (dense)
+
+def predict_landing(v, t, lat, lon):
+    if vehicles.is_focused(v) and v.detector.phase == DESCENT and v.kf.alt > 5:
+        landing.maybe_run(t, {"lat": lat, "lon": lon, "alt": v.kf.alt, "vz": v.kf.vel, "drift": v.tracker.drift})
+
+def draw_landing():
+    try:
+        result = landing.poll()
+        if result:
+            for shape in landing_shapes:
+                shape.delete()
+            landing_shapes.clear()
+            for corners, w in reversed(result["heat"]):
+                landing_shapes.append(map_widget.set_polygon(corners, fill_color=heat_color(w), outline_color=heat_color(w), border_width=1))
+            landing_shapes.append(map_widget.set_polygon(result["ellipse"], fill_color=None, outline_color="red", border_width=2))
+            landing_shapes.append(map_widget.set_marker(result["lat"], result["lon"], text=f"Landing ~{result['eta']:.0f}s"))
+    finally:
+        root.after(250, draw_landing)    # keep polling even if a map call fails
+
+# === VEHICLES ===
+# Every vehicle on the frequency is buffered and tracked; only the focused one is drawn
+def new_vehicle(vid):
+    v = VehicleState(vid, plot_fields)
+    v.detector.subscribe(lambda ev: on_flight_event(v, ev))
+    v.spectra = {f: StftStream() for f in waterfall_fields}
+    v.tracker = Tracker(station)
+    vehicle_menu["menu"].add_command(label=vid, command=lambda: set_focus(vid))
+    return v
 
-# === BASELINE ALTITUDE ===
-baseline_altitude = None
+vehicles = VehicleRegistry(new_vehicle)
+update_link()                   # the readout counts rejects across the registry
+
+vehicle_var = tk.StringVar(value="---")
+vehicle_row = tk.Frame(clock_frame, bg="#1e1e1e")
+vehicle_row.pack(anchor="w", pady=(5, 0))
+tk.Label(vehicle_row, text="Vehicle:", font=("Consolas", 10), fg="white", bg="#1e1e1e").pack(side="left")
+vehicle_menu = tk.OptionMenu(vehicle_row, vehicle_var, "---")
+vehicle_menu["menu"].delete(0, "end")
+vehicle_menu.pack(side="left")
+
+def set_focus(vid):
+    vehicles.focus = vid
+    vehicle_var.set(vid)
+    v = vehicles.focused()
+    panel.clear_markers()
+    for ev in v.detector.events:
+        mark_event(ev)
+    show_vehicle(v)
+
+def fmt(val):
+    return f"{val:g}" if isinstance(val, float) else str(val)
+
+def show_vehicle(v):
+    for key, val in v.latest.items():
+        if key in labels:
+            labels[key].config(text=fmt(val))
+    yaw, pitch, roll = v.attitude
+    draw_gauge(yaw_canvas, yaw % 360, "Yaw")
+    draw_gauge(pitch_canvas, pitch, "Pitch")
+    draw_gauge(roll_canvas, roll, "Roll")
+    update_plots(v)
+    update_waterfall(v)
+
+# === FLIGHT EVENTS ===
+def mark_event(ev):
+    panel.add_marker(ev.t)
+
+def on_flight_event(v, ev):
+    labels["EVENT"].config(text=f"[{v.id}] {ev.name} @ {ev.t - start_time:.1f}s ({ev.confidence:.0%})")
+    if vehicles.is_focused(v):
+        mark_event(ev)
+    print(f"Flight event (vehicle {v.id}):", ev)
 
 # === TELEMETRY PARSER ===
-def parse_telemetry(line):
-    global baseline_altitude
+dirty = set()   # vehicles with packets not yet drawn; read_serial redraws the focused one
+
+def parse_imu(t, line):
+    # Raw IMU batches: the ground-side filter's attitude replaces the flight computer's angles
+    rec = decode_line(line)
+    if rec is None:
+        return
+    v = vehicles.route(rec)
+    v.ingest(t, rec)
+    for key, val in zip(("Yaw", "Pitch", "Roll"), v.attitude):
+        v.latest[key] = round(val, 2)
+    dirty.add(v.id)
+
+def parse_gps(t, line):
+    # A GPS on the same link sends no ID: its altitude fuses into the vehicle heard last
+    rec = decode_line(line)
+    if rec is not None:
+        vehicles.route(rec).ingest(t, rec)
+
+def parse_telemetry(t, line):
     if "EVENT" in line:
         labels["EVENT"].config(text=line.replace("Received: ", ""))
         return
+    if "IMU:" in line:
+        try:
+            parse_imu(t, line)
+        except Exception as e:
+            link.on_error(t)
+            print("IMU parse error:", e)
+        return
+    if line.startswith("GPS:"):
+        try:
+            parse_gps(t, line)
+        except Exception as e:
+            link.on_error(t)
+            print("GPS parse error:", e)
+        return
     if "Yaw:" in line:
         try:
-            now = time.time()
-            data = line.replace("Received: ", "").split(", ")
-            yaw = pitch = roll = 0
-            for d in data:
-                if ": " in d:
-                    key, val = d.split(": ")
-                    val = val.strip().replace("m", "").replace("Pa", "").replace("C", "")
-                    if key in labels:
-                        labels[key].config(text=val)
-                    if key in telemetry_data:
-                        if key == "Alt":
-                            raw_alt = float(val)
-                            if baseline_altitude is None:
-                                baseline_altitude = raw_alt
-                            alt = raw_alt - baseline_altitude
-                            telemetry_data["Alt"].append(alt)
-                            telemetry_data["time"].append(now)
-                        else:
-                            telemetry_data[key].append(float(val))
-                    if key == "Yaw": yaw = float(val)
-                    if key == "Pitch": pitch = float(val)
-                    if key == "Roll": roll = float(val)
-            draw_gauge(yaw_canvas, yaw % 360, "Yaw")
-            draw_gauge(pitch_canvas, pitch, "Pitch")
-            draw_gauge(roll_canvas, roll, "Roll")
-            update_plots()
-            if telemetry_data["Lat"] and telemetry_data["Lon"]:
-                update_rocket_position(telemetry_data["Lat"][-1], telemetry_data["Lon"][-1])
+            rec = decode_line(line)
+            v = vehicles.route(rec)
+            alt, _, vel = v.ingest(t, rec)     # sanity, Kalman and events; buffering stays here
+            for key, val in rec.items():
+                v.latest[key] = val
+                if key not in v.data:
+                    continue
+                if key == "Alt":
+                    if alt is None:
+                        continue
+                    v.data["Alt"].append(alt)
+                    v.data["time"].append(t)
+                    v.history["Alt"].append(t, alt)
+                    v.latest["Vel"] = round(vel, 1)
+                else:
+                    v.data[key].append(val)
+                    v.history[key].append(t, val)
+                if key in v.spectra:
+                    v.spectra[key].push(t, v.data[key][-1])
+            if "Lat" in rec and "Lon" in rec:
+                update_rocket_position(v, rec["Lat"], rec["Lon"])
+                update_tracking(v, t, rec["Lat"], rec["Lon"])
+                predict_landing(v, t, rec["Lat"], rec["Lon"])
+            dirty.add(v.id)
         except Exception as e:
+            link.on_error(t)
             print("Parse error:", e)
 
 # === PLOT UPDATER ===
-def update_plots():
-    times = telemetry_data["time"]
-    for i, field in enumerate(plot_fields):
-        line, canvas = plots[i]
-        y = telemetry_data[field]
-        if len(times) == len(y):
-            line.set_data(times, y)
-            axes[i].relim()
-            axes[i].autoscale_view()
-            canvas.draw()
+def update_plots(v):
+    for field in panel.channels:
+        series = v.history[field]
+        if len(series):
+            # Whole session, reduced to about one min/max pair per pixel column
+            panel.set_data(field, *series.view(panel.width))
+    panel.draw()
 
 # === SERIAL LOOP ===
 def read_serial():
+    # The reader thread queues complete lines and reconnects on its own; take all that arrived
     try:
-        if ser and ser.in_waiting:
-            line = ser.readline().decode('utf-8', errors='ignore').strip()
-            if line:
-                parse_telemetry(line)
+        for t, line in source.drain():
+            link.observe_line(t, line)
+            parse_telemetry(t, line)     # arrival time, stamped by the reader thread
+        # One redraw per drain, however many packets it held
+        v = vehicles.focused()
+        if v is not None and vehicle_var.get() != v.id:
+            set_focus(v.id)             # first vehicle heard
+        elif v is not None and v.id in dirty:
+            show_vehicle(v)
+        dirty.clear()
     except Exception as e:
         print("Serial read error:", e)
     root.after(10, read_serial)
 
+# === SESSION SNAPSHOT ===
+# History, baselines and estimator state are saved every second so a restart resumes mid-flight
+snapshot = SessionSnapshot(SNAPSHOT_DIR)
+
+def save_snapshot():
+    try:
+        snapshot.save(vehicles, extra={"start_time": start_time})
+    except OSError as e:
+        print("Snapshot error:", e)
+    root.after(1000, save_snapshot)
+
+start_time = time.time()
+resumed = snapshot.restore(vehicles)
+if resumed:
+    start_time = resumed["start_time"]
+    for v in vehicles:
+        if isinstance(v.latest.get("Lat"), float) and isinstance(v.latest.get("Lon"), float):
+            update_rocket_position(v, v.latest["Lat"], v.latest["Lon"])
+    focused = vehicles.focused()
+    if focused.marker:
+        map_widget.set_position(*focused.marker.position)
+    set_focus(vehicles.focus)
+    print(f"Resumed session with {len(vehicles)} vehicle(s)")
 root.after(10, read_serial)
+root.after(1000, save_snapshot)
+draw_landing()
 root.mainloop()
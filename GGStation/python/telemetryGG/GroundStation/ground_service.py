@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+Headless ground-station service for a field computer next to the antenna.
+
+Runs the receiver pipeline with no GUI imports (no Tk, matplotlib, PIL or
+map tiles): serial ingest, decoding, sanity checks, altitude/velocity
+estimation (baro, acceleration and GPS altitude in one filter), IMU
+fusion and flight-event detection. Every raw line is recorded with its
+arrival time in the "<seconds>\\t<line>" log format that
+PostFlight/flight_analysis.py reads, and relayed over UDP in the same
+format to any number of listeners (a dashboard laptop, a second logger).
+Detected events are relayed as "Ground: EVENT: ..." lines.
+
+The main loop blocks on the serial queue instead of polling a GUI timer,
+so an idle link costs nothing. State per vehicle is the dashboards'
+VehicleState without plot buffers, so memory stays flat over a session.
+
+--curses shows a text readout of the key fields and rates. Otherwise one
+status line goes to stdout every --status seconds. CPU time and peak
+memory are printed on exit.
+
+    python ground_service.py --port /dev/ttyUSB0 --log flight.log --udp 192.168.1.20:5005 --curses
+"""
+
+import argparse
+import os
+import socket
+import sys
+import time
+
+try:
+    import resource                 # peak RSS on Unix; not available on Windows
+except ImportError:
+    resource = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from link_monitor import LinkMonitor
+from serial_source import SerialSource
+from telemetry_decode import decode_line
+from vehicles import VehicleRegistry, VehicleState
+
+READOUT_FIELDS = ["Alt", "Vel", "P", "T", "Acc", "Yaw", "Pitch", "Roll", "Stage", "Lat", "Lon"]
+
+
+# === RECORDING AND RELAY ===
+class Recorder:
+    """Timestamped raw-line log, written through a large buffer and flushed once a second."""
+
+    def __init__(self, path, flush_every=1.0):
+        self.path = path
+        self.file = open(path, "a", encoding="utf-8", buffering=1 << 16)
+        self.flush_every = flush_every
+        self.last_flush = time.time()
+        self.lines = 0
+
+    def write(self, t, line):
+        self.file.write(f"{t:.4f}\t{line}\n")
+        self.lines += 1
+
+    def tick(self, now):
+        if now - self.last_flush >= self.flush_every:
+            self.file.flush()
+            self.last_flush = now
+
+    def close(self):
+        self.file.close()
+
+
+class UdpRelay:
+    """Forwards lines to UDP listeners, packing several lines into each datagram."""
+
+    def __init__(self, targets, max_datagram=1400):
+        self.targets = targets
+        self.max_datagram = max_datagram
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sent = 0
+        self.errors = 0
+
+    def send(self, lines):
+        chunk, size = [], 0
+        for line in lines:
+            n = len(line) + 1
+            if chunk and size + n > self.max_datagram:
+                self._send("\n".join(chunk) + "\n")
+                chunk, size = [], 0
+            chunk.append(line)
+            size += n
+        if chunk:
+            self._send("\n".join(chunk) + "\n")
+
+    def _send(self, text):
+        data = text.encode("utf-8")
+        for target in self.targets:
+            try:
+                self.sock.sendto(data, target)
+                self.sent += 1
+            except OSError:
+                self.errors += 1        # listener gone or network down; the log still has everything
+
+
+def parse_target(text):
+    host, _, port = text.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+# === PIPELINE ===
+class GroundService:
+    def __init__(self, source, recorder=None, relay=None):
+        self.source = source
+        self.recorder = recorder
+        self.relay = relay
+        self.link = LinkMonitor()
+        self.vehicles = VehicleRegistry(self.new_vehicle)
+        self.events = []                # (vehicle ID, FlightEvent), newest last
+        self.echo = True                # print events; off under curses
+        self.lines = 0
+        self.errors = 0
+        self.started = time.time()
+        self.cpu_started = time.process_time()
+
+    def new_vehicle(self, vid):
+        v = VehicleState(vid, [])       # no plot buffers: only the estimators
+        v.detector.subscribe(lambda ev: self.on_event(v, ev))
+        return v
+
+    def on_event(self, v, ev):
+        self.events.append((v.id, ev))
+        del self.events[:-20]
+        text = f"Ground: EVENT: [{v.id}] {ev.name} @ {ev.t - self.started:.1f}s ({ev.confidence:.0%})"
+        if self.relay is not None:
+            self.relay.send([f"{ev.t:.4f}\t{text}"])
+        if self.echo:
+            print(text, flush=True)
+
+    def step(self, timeout=0.2):
+        """Handle everything that arrived, waiting up to timeout for the first line."""
+        first = self.source.get(timeout=timeout)
+        batch = [first] + self.source.drain() if first is not None else []
+        for t, line in batch:
+            self.handle(t, line)
+        now = time.time()
+        if self.relay is not None and batch:
+            self.relay.send([f"{t:.4f}\t{line}" for t, line in batch])
+        if self.recorder is not None:
+            self.recorder.tick(now)
+        return len(batch)
+
+    def handle(self, t, line):
+        self.lines += 1
+        if self.recorder is not None:
+            self.recorder.write(t, line)
+        # Bare GPS lines are not link packets but still carry an altitude
+        if not self.link.observe_line(t, line) and not line.startswith("GPS:"):
+            return
+        try:
+            rec = decode_line(line)
+            if rec is None or "EVENT" in rec:
+                return
+            v = self.vehicles.route(rec)
+            alt, acc, vel = v.ingest(t, rec)     # the same estimation the dashboards run
+            v.latest.update((k, x) for k, x in rec.items() if k in READOUT_FIELDS)
+            if v.ahrs.active or "Yaw" in rec or "AngleX" in rec:
+                v.latest.update(zip(("Yaw", "Pitch", "Roll"), v.attitude))
+            if alt is not None:
+                v.latest["Alt"], v.latest["Vel"] = alt, vel
+            if acc is not None:
+                v.latest["Acc"] = acc
+        except Exception as e:
+            self.link.on_error(t)
+            self.errors += 1
+            print("Parse error:", e)
+
+    # --- reporting ---
+    def usage(self):
+        """(CPU seconds, CPU share since start, peak RSS in MB or None)."""
+        cpu = time.process_time() - self.cpu_started
+        wall = max(time.time() - self.started, 1e-9)
+        rss = None
+        if resource is not None:
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            rss = peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+        return cpu, cpu / wall, rss
+
+    def status(self, now):
+        cpu, share, rss = self.usage()
+        text = f"{self.source.describe(now)} | {self.link.summary(now)} | lines {self.lines}"
+        text += f" | CPU {100 * share:.1f}%"
+        if rss is not None:
+            text += f" | RSS {rss:.0f} MB"
+        return text
+
+    def readout(self, v):
+        rows = []
+        for key in READOUT_FIELDS:
+            val = v.latest.get(key)
+            if val is not None:
+                rows.append(f"{key:>6}: {val:.2f}" if isinstance(val, float) else f"{key:>6}: {val}")
+        if v.sanity.rejected_total:
+            rows.append(f"Rejected: {v.sanity.summary()}")
+        return rows
+
+
+# === TEXT READOUT ===
+def run_curses(service, refresh=0.25):
+    import curses                   # imported only when asked for; Windows needs windows-curses
+
+    def loop(stdscr):
+        service.echo = False
+        curses.curs_set(0)
+        stdscr.nodelay(True)
+        last = 0.0
+        while stdscr.getch() not in (ord("q"), ord("Q")):
+            service.step(timeout=refresh / 2)
+            now = time.time()
+            if now - last < refresh:
+                continue
+            last = now
+            stdscr.erase()
+            h, w = stdscr.getmaxyx()
+            lines = ["GGStation ground service   (q to quit)", service.status(now), ""]
+            for v in service.vehicles:
+                lines.append(f"Vehicle {v.id}  phase {v.detector.phase}")
+                lines += ["  " + row for row in service.readout(v)]
+                lines.append("")
+            lines += [f"[{vid}] {ev.name} @ {ev.t - service.started:.1f}s ({ev.confidence:.0%})"
+                      for vid, ev in service.events[-5:]]
+            for y, text in enumerate(lines[:h - 1]):
+                stdscr.addnstr(y, 0, text, w - 1)
+            stdscr.refresh()
+
+    curses.wrapper(loop)
+
+
+def run_plain(service, every=5.0):
+    last = time.time()
+    while True:
+        service.step()
+        now = time.time()
+        if every > 0 and now - last >= every:
+            last = now
+            print(service.status(now), flush=True)
+
+
+# === ENTRY POINT ===
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless receiver: record, detect events and relay telemetry")
+    parser.add_argument("--port", default=None, help="serial port; default finds the receiver by USB ID and line format")
+    parser.add_argument("--baud", type=int, default=115200)
+    parser.add_argument("--log", default=None, help="append timestamped raw lines to this file")
+    parser.add_argument("--udp", action="append", default=[], help="host:port to relay lines to (repeatable)")
+    parser.add_argument("--curses", action="store_true", help="full-screen text readout")
+    parser.add_argument("--status", type=float, default=5.0, help="seconds between status lines without --curses")
+    args = parser.parse_args(argv)
+
+    source = SerialSource(args.port, args.baud, sniff=r"Received:", name="Receiver").start()
+    recorder = Recorder(args.log) if args.log else None
+    relay = UdpRelay([parse_target(u) for u in args.udp]) if args.udp else None
+    service = GroundService(source, recorder, relay)
+    try:
+        if args.curses:
+            run_curses(service)
+        else:
+            run_plain(service, args.status)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        source.close()
+        if recorder is not None:
+            recorder.close()
+        cpu, share, rss = service.usage()
+        print(f"{service.lines} lines in {time.time() - service.started:.1f} s; CPU {cpu:.2f} s ({100 * share:.1f}%)"
+              + (f", peak RSS {rss:.0f} MB" if rss is not None else ""))
+
+
+if __name__ == "__main__":
+    main()
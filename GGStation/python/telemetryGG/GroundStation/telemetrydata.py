@@ -1,23 +1,26 @@
-import serial
 import tkinter as tk
 from PIL import Image, ImageTk
+import os
 import sys
 from math import sin, cos, radians
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from collections import deque
 from datetime import datetime
 import time
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from link_monitor import LinkMonitor
+from plot_panel import PlotPanel
+from serial_source import SerialSource
+from snapshot import SessionSnapshot
+from spectrogram import SpectrogramPanel, StftStream
+from telemetry_decode import decode_line
+from vehicles import VehicleRegistry, VehicleState
+
 # === SERIAL CONFIG ===
-SERIAL_PORT = 'COM14'  # Replace with your actual port
+SERIAL_PORT = None  # e.g. 'COM14'; None finds the receiver by USB ID, then by its line format
 BAUD_RATE = 115200
 
-try:
-    ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1)
-except Exception as e:
-    print(f"❌ Could not open {SERIAL_PORT}: {e}")
-    sys.exit()
+source = SerialSource(SERIAL_PORT, BAUD_RATE, sniff=r"Received:.*(Filt_Alt|IMU):", name="Receiver").start()
+SNAPSHOT_DIR = "telemetry_session"  # resumed on launch if it was saved in the last 30 min
 
 root = tk.Tk()
 root.title("🚀 Arbalest Rocketry - Telemetry Dashboard")
@@ -57,7 +60,7 @@ update_clock()
 # === TELEMETRY LABELS ===
 labels = {}
 # fields = ["Yaw", "Pitch", "Roll", "Alt", "P", "T", "LED"]
-fields = ["Yaw", "Pitch", "Roll", "Alt", "P", "Stage", "LED"]
+fields = ["Yaw", "Pitch", "Roll", "Alt", "Vel", "P", "Stage", "LED"]
 telemetry_frame = tk.Frame(root, bg="#1e1e1e")
 telemetry_frame.grid(row=2, column=0, sticky="nw", padx=20)
 
@@ -75,6 +78,23 @@ tk.Label(event_frame, text="EVENT:", font=("Helvetica", 11, "bold"), fg="white",
 labels["EVENT"] = tk.Label(event_frame, text="---", font=("Helvetica", 11), fg="cyan", bg="#1e1e1e")
 labels["EVENT"].pack(side="left")
 
+# === LINK QUALITY ===
+link_frame = tk.Frame(root, bg="#1e1e1e")
+link_frame.grid(row=5, column=0, columnspan=2, sticky="w", padx=20, pady=5)
+tk.Label(link_frame, text="LINK:", font=("Helvetica", 11, "bold"), fg="white", bg="#1e1e1e").pack(side="left")
+labels["LINK"] = tk.Label(link_frame, text="---", font=("Consolas", 10), fg="cyan", bg="#1e1e1e")
+labels["LINK"].pack(side="left")
+link = LinkMonitor()
+
+def rejected_text():
+    n = sum(v.sanity.rejected_total for v in vehicles)
+    return f" | {n} rejected" if n else ""
+
+def update_link():
+    now = time.time()
+    labels["LINK"].config(text=f"{source.describe(now)} | {link.summary(now)}{rejected_text()}")
+    root.after(1000, update_link)
+
 # === GAUGES ===
 gauge_frame = tk.Frame(root, bg="#1e1e1e")
 gauge_frame.grid(row=1, column=1, rowspan=3, sticky="nsew", padx=20)
@@ -98,36 +118,104 @@ def draw_gauge(canvas, angle, label):
 
 # === PLOTS ===
 #telemetry_data = {k: deque(maxlen=100) for k in ["time", "Alt", "P", "T", "Lat", "Lon"]}
-telemetry_data = {k: deque(maxlen=100) for k in ["time", "Alt", "P"]}
 # plot_fields = ["Alt", "P", "T", "Lat", "Lon"]
 
-plot_fields = ["Alt", "P"]
-figs, axes, plots = [], [], []
-
+plot_fields = ["Alt", "P", "Vel"]
 plot_frame = tk.Frame(root, bg="#1e1e1e")
 plot_frame.grid(row=4, column=0, columnspan=3, sticky="nsew", padx=10, pady=10)
+panel = PlotPanel(plot_frame, plot_fields)
+
+# Channels can be switched on and off at runtime; hidden ones keep recording
+plot_vars = {field: tk.BooleanVar(value=True) for field in plot_fields}
+plot_menu_button = tk.Menubutton(plot_frame, text="Plots ▾", font=("Consolas", 9), fg="white", bg="#1e1e1e", relief="raised")
+plot_menu = tk.Menu(plot_menu_button, tearoff=0)
+for field in plot_fields:
+    plot_menu.add_checkbutton(label=field, variable=plot_vars[field], command=lambda: toggle_plots())
+plot_menu_button["menu"] = plot_menu
+plot_menu_button.pack(anchor="ne")
+tk.Button(plot_frame, text="Waterfall", font=("Consolas", 9), fg="white", bg="#1e1e1e",
+          command=lambda: toggle_waterfall()).pack(anchor="ne")
+
+def toggle_plots():
+    panel.set_channels([f for f in plot_fields if plot_vars[f].get()])
+    if vehicles.focused():
+        update_plots(vehicles.focused())
+
+panel.widget.pack(fill="both", expand=True)
+
+# === WATERFALL ===
+# Live spectrogram of the vibration-prone channels; the STFT runs on every packet, the window is optional
+waterfall_fields = ["Filt_Acc", "Alt"]
+waterfall = None
+
+def toggle_waterfall():
+    global waterfall
+    if waterfall is not None:
+        waterfall.widget.master.destroy()
+        waterfall = None
+        return
+    win = tk.Toplevel(root, bg="#1e1e1e")
+    win.title("Waterfall")
+    win.protocol("WM_DELETE_WINDOW", toggle_waterfall)
+    waterfall = SpectrogramPanel(win, waterfall_fields)
+    waterfall.widget.pack(fill="both", expand=True)
+    if vehicles.focused():
+        update_waterfall(vehicles.focused())
+
+def update_waterfall(v):
+    if waterfall is None:
+        return
+    if any([waterfall.set_stream(f, v.spectra[f]) for f in waterfall_fields]):
+        waterfall.draw()
+
+# === VEHICLES ===
+# Every vehicle on the frequency is buffered and tracked; only the focused one is drawn
+def new_vehicle(vid):
+    v = VehicleState(vid, plot_fields)
+    v.detector.subscribe(lambda ev: on_flight_event(v, ev))
+    v.spectra = {f: StftStream() for f in waterfall_fields}
+    vehicle_menu["menu"].add_command(label=vid, command=lambda: set_focus(vid))
+    return v
+
+vehicles = VehicleRegistry(new_vehicle)
+update_link()                   # the readout counts rejects across the registry
 
-for i, field in enumerate(plot_fields):
-    plot_frame.grid_rowconfigure(i // 2, weight=1)
-    plot_frame.grid_columnconfigure(i % 2, weight=1)
+vehicle_var = tk.StringVar(value="---")
+vehicle_row = tk.Frame(clock_frame, bg="#1e1e1e")
+vehicle_row.pack(anchor="w", pady=(5, 0))
+tk.Label(vehicle_row, text="Vehicle:", font=("Consolas", 10), fg="white", bg="#1e1e1e").pack(side="left")
+vehicle_menu = tk.OptionMenu(vehicle_row, vehicle_var, "---")
+vehicle_menu["menu"].delete(0, "end")
+vehicle_menu.pack(side="left")
 
-    fig, ax = plt.subplots(figsize=(3, 1.5))
-    fig.patch.set_facecolor('#1e1e1e')
-    ax.set_facecolor('#2e2e2e')
-    ax.tick_params(colors='white')
-    ax.set_title(f"{field} vs Time", color='white', fontsize=8)
-    ax.set_xlabel("Time (s)", color='white', fontsize=6)
-    ax.set_ylabel(field, color='white', fontsize=6)
-    line, = ax.plot([], [], color='cyan', linewidth=1)
+def set_focus(vid):
+    vehicles.focus = vid
+    vehicle_var.set(vid)
+    v = vehicles.focused()
+    panel.clear_markers()
+    for ev in v.detector.events:
+        mark_event(ev)
+    show_vehicle(v)
 
-    canvas = FigureCanvasTkAgg(fig, master=plot_frame)
-    canvas.get_tk_widget().grid(row=i // 2, column=i % 2, padx=5, pady=5, sticky="nsew")
-    figs.append(fig)
-    axes.append(ax)
-    plots.append((line, canvas))
+def show_vehicle(v):
+    for key, text in v.latest.items():
+        labels[key].config(text=text)
+    yaw, pitch, roll = v.attitude
+    draw_gauge(yaw_canvas, yaw % 360, "Yaw")
+    draw_gauge(pitch_canvas, pitch, "Pitch")
+    draw_gauge(roll_canvas, roll, "Roll")
+    update_plots(v)
+    update_waterfall(v)
 
-# === ALTITUDE BASELINE ===
-baseline_altitude = None
+# === FLIGHT EVENTS ===
+def mark_event(ev):
+    panel.add_marker(ev.t)
+
+def on_flight_event(v, ev):
+    labels["EVENT"].config(text=f"[{v.id}] {ev.name} @ {ev.t - start_time:.1f}s ({ev.confidence:.0%})")
+    if vehicles.is_focused(v):
+        mark_event(ev)
+    print(f"Flight event (vehicle {v.id}):", ev)
 
 # === PARSER ===
 # def parse_telemetry(line):
@@ -166,70 +254,117 @@ baseline_altitude = None
 #        except Exception as e:
 #            print("Parse error:", e)
 
-def parse_telemetry(line):
-    global baseline_altitude
+dirty = set()   # vehicles with packets not yet drawn; read_serial redraws the focused one
+
+def parse_imu(t, line):
+    # Raw IMU batches: the ground-side filter adds roll, which the Stage lines do not carry
+    rec = decode_line(line)
+    if rec is None:
+        return
+    v = vehicles.route(rec)
+    v.ingest(t, rec)
+    for key, val in zip(("Yaw", "Pitch", "Roll"), v.attitude):
+        v.latest[key] = f"{val:.2f}"
+    dirty.add(v.id)
+
+def parse_gps(t, line):
+    # A GPS on the same link sends no ID: its altitude fuses into the vehicle heard last
+    rec = decode_line(line)
+    if rec is not None:
+        vehicles.route(rec).ingest(t, rec)
+
+def parse_telemetry(t, line):
+    if "Received:" in line and "IMU:" in line:
+        try:
+            parse_imu(t, line)
+        except Exception as e:
+            link.on_error(t)
+            print("IMU parse error:", e)
+        return
+    if line.startswith("GPS:"):
+        try:
+            parse_gps(t, line)
+        except Exception as e:
+            link.on_error(t)
+            print("GPS parse error:", e)
+        return
     if "Received:" in line and "Stage:" in line:
         try:
-            now = time.time()
-            data = line.replace("Received: ", "").split(", ")
-            yaw = pitch = roll = stage = 0.0
-            for d in data:
-                if ": " in d:
-                    key, val = d.split(": ")
-                    val = val.strip()
-                    if key == "Filt_Alt":
-                        alt = float(val)
-                        if baseline_altitude is None:
-                            baseline_altitude = alt
-                        rel_alt = alt - baseline_altitude
-                        labels["Alt"].config(text=f"{rel_alt:.2f}")
-                        telemetry_data["Alt"].append(rel_alt)
-                        telemetry_data["time"].append(now)
-                    elif key == "Filt_Acc":
-                        acc = float(val)
-                        labels["P"].config(text=f"{acc:.2f}")
-                        telemetry_data["P"].append(acc)
-                    elif key == "AngleX":
-                        yaw = float(val)
-                        labels["Yaw"].config(text=f"{yaw:.2f}")
-                    elif key == "AngleY":
-                        pitch = float(val)
-                        labels["Pitch"].config(text=f"{pitch:.2f}")
-                    elif key == "Stage":
-                        stage = int(val)
-                        labels["Stage"].config(text=f"{stage}")
-                        labels["EVENT"].config(text=f"Stage {stage}")
-            draw_gauge(yaw_canvas, yaw % 360, "Yaw")
-            draw_gauge(pitch_canvas, pitch, "Pitch")
-            draw_gauge(roll_canvas, roll, "Roll")
-            update_plots()
+            rec = decode_line(line)
+            v = vehicles.route(rec)
+            prev_stage = v.detector.stage
+            rel_alt, acc, vel = v.ingest(t, rec)    # sanity, Kalman and events; buffering stays here
+            if rel_alt is not None:
+                v.latest["Alt"] = f"{rel_alt:.2f}"
+                v.data["Alt"].append(rel_alt)
+                v.data["time"].append(t)
+                v.history["Alt"].append(t, rel_alt)
+                v.spectra["Alt"].push(t, rel_alt)
+                v.data["Vel"].append(vel)
+                v.history["Vel"].append(t, vel)
+                v.latest["Vel"] = f"{vel:.2f}"
+            if acc is not None:
+                v.latest["P"] = f"{acc:.2f}"
+                v.data["P"].append(acc)
+                v.history["P"].append(t, acc)
+                v.spectra["Filt_Acc"].push(t, acc)
+            if not v.ahrs.active:
+                v.latest["Yaw"] = f"{v.attitude[0]:.2f}"
+                v.latest["Pitch"] = f"{v.attitude[1]:.2f}"
+            if v.detector.stage is not None:
+                v.latest["Stage"] = f"{v.detector.stage}"
+                if v.detector.stage != prev_stage and vehicles.is_focused(v):
+                    labels["EVENT"].config(text=f"Stage {v.detector.stage}")
+            dirty.add(v.id)
         except Exception as e:
+            link.on_error(t)
             print("Parse error:", e)
 
 
-
 # === PLOT UPDATER ===
-def update_plots():
-    times = telemetry_data["time"]
-    for i, field in enumerate(plot_fields):
-        line, canvas = plots[i]
-        y = telemetry_data[field]
-        if len(times) == len(y):
-            line.set_data(times, y)
-            axes[i].relim()
-            axes[i].autoscale_view()
-            canvas.draw()
+def update_plots(v):
+    for field in panel.channels:
+        series = v.history[field]
+        if len(series):
+            # Whole session, reduced to about one min/max pair per pixel column
+            panel.set_data(field, *series.view(panel.width))
+    panel.draw()
 
 # === SERIAL READER ===
 def read_serial():
+    # The reader thread queues complete lines and reconnects on its own; take all that arrived
     try:
-        if ser.in_waiting:
-            line = ser.readline().decode('utf-8', errors='ignore').strip()
-            if line:
-                parse_telemetry(line)
+        for t, line in source.drain():
+            link.observe_line(t, line)
+            parse_telemetry(t, line)     # arrival time, stamped by the reader thread
+        # One redraw per drain, however many packets it held
+        v = vehicles.focused()
+        if v is not None and vehicle_var.get() != v.id:
+            set_focus(v.id)             # first vehicle heard
+        elif v is not None and v.id in dirty:
+            show_vehicle(v)
+        dirty.clear()
     except Exception as e:
         print("Serial read error:", e)
     root.after(10, read_serial)
 
+# === SESSION SNAPSHOT ===
+# History, baselines and estimator state are saved every second so a restart resumes mid-flight
+snapshot = SessionSnapshot(SNAPSHOT_DIR)
+
+def save_snapshot():
+    try:
+        snapshot.save(vehicles, extra={"start_time": start_time})
+    except OSError as e:
+        print("Snapshot error:", e)
+    root.after(1000, save_snapshot)
+
+start_time = time.time()
+resumed = snapshot.restore(vehicles)
+if resumed:
+    start_time = resumed["start_time"]
+    set_focus(vehicles.focus)
+    print(f"Resumed session with {len(vehicles)} vehicle(s)")
 root.after(10, read_serial)
+root.after(1000, save_snapshot)
 root.mainloop()
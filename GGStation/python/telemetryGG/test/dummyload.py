@@ -8,14 +8,20 @@ Created on Thu Apr 17 08:52:57 2025
 import tkinter as tk
 from PIL import Image, ImageTk
 from math import sin, cos, radians
-from random import uniform
 import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from collections import deque
 from datetime import datetime
+import os
+import sys
 import time
 from tkintermapview import TkinterMapView
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from decimate import DecimatedSeries
+from flight_sim import resample, simulate
+from plot_panel import PlotPanel
+from analysis_cache import WindowAnalysis, window_from
+
 # === MAIN WINDOW ===
 root = tk.Tk()
 root.title("🚀 Arbalest Rocketry - Telemetry Dashboard (Demo)")
@@ -92,51 +98,42 @@ def draw_gauge(canvas, angle, label):
     canvas.create_text(cx, cy + r + 10, text=f"{angle:.1f}°", font=("Arial", 10))
 
 # === TELEMETRY PLOTS ===
-telemetry_data = {k: deque(maxlen=100) for k in ["time", "Alt", "P", "T", "Lat", "Lon"]}
+telemetry_data = {k: deque(maxlen=100) for k in ["time", "Alt", "P", "T", "Lat", "Lon", "Pitch", "Roll"]}
+# Results are memoised per window version, so pressing a button again without new data is free
+analysis = WindowAnalysis(window_from(telemetry_data))
 plot_fields = ["Alt", "P", "T", "Lat", "Lon"]
-figs, axes, plots = [], [], []
 plot_frame = tk.Frame(root, bg="#1e1e1e")
 plot_frame.grid(row=4, column=0, columnspan=2, sticky="nsew", padx=10, pady=10)
+panel = PlotPanel(plot_frame, plot_fields)
+panel.widget.pack(fill="both", expand=True)
 
-for i, field in enumerate(plot_fields):
-    plot_frame.grid_rowconfigure(i // 2, weight=1)
-    plot_frame.grid_columnconfigure(i % 2, weight=1)
-
-    fig, ax = plt.subplots(figsize=(3, 1.5))
-    fig.patch.set_facecolor('#1e1e1e')
-    ax.set_facecolor('#2e2e2e')
-    ax.tick_params(colors='white')
-    ax.set_title(f"{field} vs Time", color='white', fontsize=8)
-    ax.set_xlabel("Time (s)", color='white', fontsize=6)
-    ax.set_ylabel(field, color='white', fontsize=6)
-    line, = ax.plot([], [], color='cyan', linewidth=1)
-
-    canvas = FigureCanvasTkAgg(fig, master=plot_frame)
-    canvas.get_tk_widget().grid(row=i // 2, column=i % 2, padx=5, pady=5, sticky="nsew")
-    figs.append(fig)
-    axes.append(ax)
-    plots.append((line, canvas))
+# Full-session history per plotted field; the deques above keep the recent window
+history = {field: DecimatedSeries() for field in plot_fields}
 
 # === MAP ===
 map_frame = tk.Frame(root)
 map_frame.grid(row=1, column=2, rowspan=4, sticky="nsew", padx=10, pady=10)
 map_widget = TkinterMapView(map_frame, width=400, height=400, corner_radius=10)
 map_widget.pack(fill="both", expand=True)
-map_widget.set_position(43.7735, -79.5015)
-map_marker = map_widget.set_marker(43.7735, -79.5015, text="Rocket")
 
 # === DUMMY TELEMETRY SIMULATION ===
+# One simulated flight sampled at the 500 ms dashboard tick, replayed in a loop
+flight = resample(simulate(dt=0.01), rate=2)
+map_widget.set_position(flight["lat"][0], flight["lon"][0])
+map_marker = map_widget.set_marker(flight["lat"][0], flight["lon"][0], text="Rocket")
+
 start_time = time.time()
+tick = 0
 def simulate_telemetry():
+    global tick
     now = time.time() - start_time
-    yaw = uniform(0, 360)
-    pitch = uniform(-90, 90)
-    roll = uniform(-180, 180)
-    alt = 100 + 10 * sin(now / 5)
-    pressure = 101.3 + uniform(-2, 2)
-    temp = 25 + uniform(-1, 1)
-    lat = 43.7735 + uniform(-0.0005, 0.0005)
-    lon = -79.5015 + uniform(-0.0005, 0.0005)
+    i = tick % len(flight["t"])
+    tick += 1
+    yaw, pitch, roll = flight["yaw"][i], flight["pitch"][i], flight["roll"][i]
+    alt = flight["alt_meas"][i]
+    pressure = flight["pressure"][i]
+    temp = flight["temp"][i]
+    lat, lon = flight["lat_meas"][i], flight["lon_meas"][i]
 
     # Update labels
     labels["Yaw"].config(text=f"{yaw:.1f}")
@@ -145,7 +142,7 @@ def simulate_telemetry():
     labels["Alt"].config(text=f"{alt:.2f}")
     labels["P"].config(text=f"{pressure:.2f}")
     labels["T"].config(text=f"{temp:.2f}")
-    labels["LED"].config(text="ON" if int(now) % 2 == 0 else "OFF")
+    labels["LED"].config(text="ON" if flight["stage"][i] == 1 else "OFF")
 
     # Update data
     telemetry_data["time"].append(now)
@@ -154,6 +151,11 @@ def simulate_telemetry():
     telemetry_data["T"].append(temp)
     telemetry_data["Lat"].append(lat)
     telemetry_data["Lon"].append(lon)
+    telemetry_data["Pitch"].append(pitch)
+    telemetry_data["Roll"].append(roll)
+    analysis.bump()
+    for field, val in zip(plot_fields, (alt, pressure, temp, lat, lon)):
+        history[field].append(now, val)
 
     draw_gauge(yaw_canvas, yaw, "Yaw")
     draw_gauge(pitch_canvas, pitch, "Pitch")
@@ -168,33 +170,25 @@ def simulate_telemetry():
 
 # === PLOT UPDATER ===
 def update_plots():
-    times = telemetry_data["time"]
-    for i, field in enumerate(plot_fields):
-        line, canvas = plots[i]
-        y = telemetry_data[field]
-        if len(times) == len(y):
-            line.set_data(times, y)
-            axes[i].relim()
-            axes[i].autoscale_view()
-            canvas.draw()
+    for field in panel.channels:
+        series = history[field]
+        if len(series):
+            # Whole session, reduced to about one min/max pair per pixel column
+            panel.set_data(field, *series.view(panel.width))
+    panel.draw()
 
 simulate_telemetry()
 
 # === ADVANCED TELEMETRY ANALYSIS ===
-import numpy as np
 from scipy.fft import fft, fftfreq
-from scipy.signal import correlate, butter, filtfilt, welch
 
 def plot_psd(field):
-    data = np.array(telemetry_data[field])
-    times = np.array(telemetry_data["time"])
+    times, data = analysis.series(field)
 
     if len(data) < 10:
         return
 
-    fs = 1 / (np.mean(np.diff(times)))
-    f, Pxx = welch(data, fs=fs, nperseg=min(256, len(data)))
-
+    f, Pxx = analysis.psd(field)
     fig, ax = plt.subplots(figsize=(5, 3))
     ax.semilogy(f, Pxx, color='lime')
     ax.set_title(f"PSD of {field}", fontsize=10)
@@ -205,39 +199,27 @@ def plot_psd(field):
     plt.show()
 
 def plot_cross_corr(x_key, y_key):
-    x = np.array(telemetry_data[x_key])
-    y = np.array(telemetry_data[y_key])
+    times, x, y = analysis.series(x_key, y_key)
 
     if len(x) < 10 or len(y) < 10:
         return
 
-    corr = correlate(x - np.mean(x), y - np.mean(y), mode='full')
-    lags = np.arange(-len(x)+1, len(x))
-
+    lags, corr = analysis.cross_corr(x_key, y_key)
     fig, ax = plt.subplots(figsize=(5, 3))
     ax.plot(lags, corr, color='orange')
     ax.set_title(f"Cross-Correlation: {x_key} vs {y_key}", fontsize=10)
-    ax.set_xlabel("Lag")
+    ax.set_xlabel("Lag [s]")
     ax.set_ylabel("Correlation")
     plt.tight_layout()
     plt.show()
 
-def low_pass_filter(data, fs, cutoff=0.2):
-    nyq = 0.5 * fs
-    norm_cutoff = cutoff / nyq
-    b, a = butter(2, norm_cutoff, btype='low', analog=False)
-    return filtfilt(b, a, data)
-
 def plot_filtered_altitude():
-    data = np.array(telemetry_data["Alt"])
-    times = np.array(telemetry_data["time"])
+    times, data = analysis.series("Alt")
 
     if len(data) < 10:
         return
 
-    fs = 1 / (np.mean(np.diff(times)))
-    filtered = low_pass_filter(data, fs)
-
+    filtered = analysis.lowpass("Alt", cutoff=0.2)
     fig, ax = plt.subplots(figsize=(5, 3))
     ax.plot(times, data, label="Raw", alpha=0.5)
     ax.plot(times, filtered, label="Filtered", color='magenta')
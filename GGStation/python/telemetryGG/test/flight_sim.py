@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+"""
+Physics-based two-stage flight simulator for load-testing the ground station.
+
+simulate() integrates a 3-DOF point-mass trajectory (thrust along the
+velocity vector after the rail, altitude-dependent drag, booster burn,
+separation, sustainer burn, drogue at apogee, main at low altitude, wind
+drift) at a fixed internal step. It then builds every telemetry channel
+from that one trajectory with array operations: baro altitude, pressure,
+temperature, acceleration, Euler angles, quaternion and GPS.
+
+The streams are written in the exact line formats the receivers parse:
+
+  receive  Telemetry_receive.py   Received: Seq: n, Yaw: .., Pitch: .., Roll: .., Alt: ..m, P: ..Pa, ...
+  stage    telemetrydata.py       Received: Filt_Alt: .., Filt_Acc: .., AngleX: .., AngleY: .., Stage: n
+  quat     AV3D.py                Received: qw: .., qx: .., qy: .., qz: ..
+  imu      AV3D.py, dashboards    Received: IMU: <Hz>; gx,gy,gz,ax,ay,az,mx,my,mz; ...
+  gps      gpsliveandtlemetry.py  GPS: lat lon alt
+
+Output goes to stdout, a file, or a pseudo-terminal that pyserial can open
+like a real port:
+
+  python flight_sim.py --format receive,gps --rate 1000 --out pty
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+G = 9.80665
+R_EARTH = 6371000.0
+
+
+# === ATMOSPHERE ===
+def isa(h):
+    """ISA troposphere: temperature [K], pressure [Pa], density [kg/m^3] at altitude h [m ASL]."""
+    h = np.asarray(h, dtype=float)
+    T = 288.15 - 0.0065 * np.clip(h, None, 11000)
+    p = 101325.0 * (T / 288.15) ** 5.2559
+    return T, p, p / (287.05 * T)
+
+
+# === TRAJECTORY ===
+def simulate(dt=0.001, pad_lat=47.986916, pad_lon=-81.848300, pad_alt=300.0,
+             rail_elevation=85.0, rail_azimuth=45.0, wind=(4.0, 2.0),
+             m_booster=3.0, m_sustainer=2.0, booster_prop=1.0, sustainer_prop=0.6,
+             booster_thrust=300.0, booster_burn=2.5, sustainer_thrust=120.0, sustainer_burn=3.0,
+             sep_delay=1.0, ignition_delay=0.5, cd_a=0.006, drogue_cd_a=0.3, main_cd_a=2.0,
+             main_alt=300.0, rail_length=3.0, max_time=600.0):
+    """Integrate one flight; returns a dict of arrays sampled every dt seconds."""
+    n_max = int(max_time / dt)
+    pos = np.zeros((n_max, 3))       # ENU relative to the pad, m
+    vel = np.zeros((n_max, 3))
+    acc = np.zeros((n_max, 3))
+    stage = np.ones(n_max, dtype=np.int8)
+    chute = np.zeros(n_max, dtype=np.int8)   # 0 none, 1 drogue, 2 main
+
+    el, az = math.radians(rail_elevation), math.radians(rail_azimuth)
+    rail = np.array([math.cos(el) * math.sin(az), math.cos(el) * math.cos(az), math.sin(el)])
+    wind_v = np.array([wind[0], wind[1], 0.0])
+    t_sep = booster_burn + sep_delay
+    t_ign = t_sep + ignition_delay
+    p, v = np.zeros(3), np.zeros(3)
+    deployed, apogee_seen = 0, False
+
+    k = 0
+    for k in range(n_max):
+        t = k * dt
+        if t < booster_burn:
+            thrust, mass = booster_thrust, m_booster + m_sustainer - booster_prop * t / booster_burn
+        elif t < t_sep:
+            thrust, mass = 0.0, m_booster + m_sustainer - booster_prop
+        elif t_ign <= t < t_ign + sustainer_burn:
+            thrust, mass = sustainer_thrust, m_sustainer - sustainer_prop * (t - t_ign) / sustainer_burn
+        else:
+            thrust, mass = 0.0, m_sustainer - (sustainer_prop if t >= t_ign else 0.0)
+            if t < t_sep:
+                mass += m_booster - booster_prop
+
+        air = v - wind_v
+        speed = math.sqrt(air @ air)
+        on_rail = p @ rail < rail_length and t < booster_burn
+        direction = rail if on_rail or speed < 1e-6 else air / speed
+        T = 288.15 - 0.0065 * min(pad_alt + p[2], 11000.0)
+        rho = 101325.0 * (T / 288.15) ** 5.2559 / (287.05 * T)
+        drag_area = (cd_a, drogue_cd_a, main_cd_a)[deployed]
+        a = thrust / mass * direction - 0.5 * rho * drag_area * speed * air / mass
+        a[2] -= G
+        if on_rail:
+            a = max(0.0, a @ rail) * rail          # the rail only allows motion along itself
+        elif p[2] <= 0 and a[2] < 0 and t < booster_burn:
+            a[:] = 0.0                             # still sitting on the pad
+
+        v = v + a * dt
+        p = p + v * dt
+        if not apogee_seen and t > t_ign and v[2] < 0:
+            apogee_seen, deployed = True, 1
+        if deployed == 1 and p[2] < main_alt:
+            deployed = 2
+        pos[k], vel[k], acc[k] = p, v, a
+        stage[k] = 1 if t < t_sep else 2
+        chute[k] = deployed
+        if p[2] < 0 and t > t_ign:
+            break
+
+    n = k + 1
+    pos, vel, acc = pos[:n], vel[:n], acc[:n]
+    t = np.arange(n) * dt
+    horiz = np.hypot(vel[:, 0], vel[:, 1])
+    pitch = np.degrees(np.arctan2(vel[:, 2], horiz))
+    pitch[:int(1.0 / dt)] = rail_elevation
+    yaw = np.degrees(np.arctan2(vel[:, 0], vel[:, 1])) % 360
+    # Spin-up under thrust, slow decay afterwards; swinging under the parachute
+    spin = np.where(t < t_ign + sustainer_burn, 360.0 * np.minimum(t, 2.0), 720.0 * np.exp(-(t - t_ign - sustainer_burn) / 5))
+    roll = (np.cumsum(spin) * dt + 180) % 360 - 180
+    hanging = chute[:n] > 0
+    pitch[hanging] = -80 + 10 * np.sin(2 * np.pi * 0.3 * t[hanging])
+
+    alt_asl = pad_alt + pos[:, 2]
+    T, P, _ = isa(alt_asl)
+    lat = pad_lat + np.degrees(pos[:, 1] / R_EARTH)
+    lon = pad_lon + np.degrees(pos[:, 0] / (R_EARTH * math.cos(math.radians(pad_lat))))
+    return {"t": t, "pos": pos, "vel": vel, "acc": acc, "alt": alt_asl, "pressure": P,
+            "temp": T - 273.15, "yaw": yaw, "pitch": pitch, "roll": roll,
+            "quat": euler_to_quat(yaw, pitch, roll), "lat": lat, "lon": lon,
+            "stage": stage[:n], "chute": chute[:n], "t_sep": t_sep}
+
+
+def euler_to_quat(yaw, pitch, roll):
+    """ZYX Euler angles in degrees -> (n, 4) quaternions [w, x, y, z]."""
+    cy, sy = np.cos(np.radians(yaw) / 2), np.sin(np.radians(yaw) / 2)
+    cp, sp = np.cos(np.radians(pitch) / 2), np.sin(np.radians(pitch) / 2)
+    cr, sr = np.cos(np.radians(roll) / 2), np.sin(np.radians(roll) / 2)
+    return np.stack([cr * cp * cy + sr * sp * sy,
+                     sr * cp * cy - cr * sp * sy,
+                     cr * sp * cy + sr * cp * sy,
+                     cr * cp * sy - sr * sp * cy], axis=1)
+
+
+def quat_mul(p, q):
+    """Hamilton product of (n, 4) quaternion arrays."""
+    w1, x1, y1, z1 = p.T
+    w2, x2, y2, z2 = q.T
+    return np.stack([w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+                     w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+                     w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
+                     w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2], axis=1)
+
+
+def to_body(quat, v):
+    """Rotate earth-frame vectors (n, 3) into the body frame of each quaternion."""
+    conj = quat * np.array([1, -1, -1, -1])
+    pure = np.concatenate([np.zeros((len(v), 1)), v], axis=1)
+    return quat_mul(quat_mul(conj, pure), quat)[:, 1:]
+
+
+def imu_samples(traj, rate, seed=0, gyro_noise=0.2, acc_noise=0.1, mag_noise=0.5,
+                field=50.0, dip=70.0):
+    """Raw gyro [deg/s], accelerometer [m/s^2] and magnetometer [uT] rows at `rate` Hz.
+
+    Body rates come from differencing the attitude quaternion, the
+    accelerometer sees the specific force and the field points to earth x
+    with the given dip.
+    """
+    step = max(1, int(round(1.0 / (rate * (traj["t"][1] - traj["t"][0])))))
+    idx = np.arange(0, len(traj["t"]), step)
+    q = traj["quat"][idx]
+    dt = traj["t"][idx[1]] - traj["t"][idx[0]]
+    rng = np.random.default_rng(seed)
+    n = len(idx)
+    # Rotation between consecutive attitudes, as axis * angle
+    dq = quat_mul(q[:-1] * np.array([1, -1, -1, -1]), q[1:])
+    v = dq[:, 1:] * np.where(dq[:, :1] < 0, -1.0, 1.0)
+    s = np.linalg.norm(v, axis=1, keepdims=True)
+    angle = 2 * np.arctan2(s, np.abs(dq[:, :1]))
+    gyro = np.degrees(np.divide(v, s, out=np.zeros_like(v), where=s > 0) * angle / dt)
+    gyro = np.vstack([gyro, gyro[-1:]])
+    acc = to_body(q, traj["acc"][idx] + np.array([0.0, 0.0, G]))
+    m = np.radians(dip)
+    mag = to_body(q, np.tile([field * math.cos(m), 0.0, -field * math.sin(m)], (n, 1)))
+    return np.hstack([gyro + rng.normal(0, gyro_noise, (n, 3)), acc + rng.normal(0, acc_noise, (n, 3)),
+                      mag + rng.normal(0, mag_noise, (n, 3))])
+
+
+def resample(traj, rate, seed=0, baro_noise=0.5, acc_noise=0.3, gps_noise=2.0):
+    """Pick samples at `rate` Hz and add sensor noise; all channels at once."""
+    step = max(1, int(round(1.0 / (rate * (traj["t"][1] - traj["t"][0])))))
+    idx = np.arange(0, len(traj["t"]), step)
+    rng = np.random.default_rng(seed)
+    n = len(idx)
+    out = {key: traj[key][idx] for key in ("t", "alt", "pressure", "temp", "yaw", "pitch", "roll", "quat", "lat", "lon", "stage")}
+    out["alt_meas"] = out["alt"] + rng.normal(0, baro_noise, n)
+    out["pressure"] = out["pressure"] + rng.normal(0, 12 * baro_noise, n)
+    out["acc_z"] = traj["acc"][idx, 2] + rng.normal(0, acc_noise, n)
+    out["lat_meas"] = out["lat"] + np.degrees(rng.normal(0, gps_noise, n) / R_EARTH)
+    out["lon_meas"] = out["lon"] + np.degrees(rng.normal(0, gps_noise, n) / R_EARTH)
+    out["dist"] = np.linalg.norm(traj["pos"][idx], axis=1)
+    return out
+
+
+# === LINE FORMATS ===
+def format_lines(s, i, formats, seq, vehicle=None, imu=None, imu_rate=0.0):
+    head = "Received: " + (f"ID: {vehicle}, " if vehicle else "")
+    lines = []
+    if "receive" in formats:
+        lines.append(f"{head}Seq: {seq}, Yaw: {s['yaw'][i]:.2f}, Pitch: {s['pitch'][i]:.2f}, Roll: {s['roll'][i]:.2f}, "
+                     f"Alt: {s['alt_meas'][i]:.2f}m, P: {s['pressure'][i]:.2f}Pa, T: {s['temp'][i]:.2f}C, "
+                     f"LED: {'ON' if s['stage'][i] == 1 else 'OFF'}, Lat: {s['lat_meas'][i]:.6f}, Lon: {s['lon_meas'][i]:.6f}")
+    if "stage" in formats:
+        lines.append(f"{head}Filt_Alt: {s['alt_meas'][i]:.2f}, Filt_Acc: {s['acc_z'][i]:.2f}, "
+                     f"AngleX: {s['yaw'][i]:.2f}, AngleY: {s['pitch'][i]:.2f}, Stage: {s['stage'][i]}")
+    if "quat" in formats:
+        q = s["quat"][i]
+        lines.append(f"{head}qw: {q[0]:.4f}, qx: {q[1]:.4f}, qy: {q[2]:.4f}, qz: {q[3]:.4f}")
+    if "imu" in formats and imu is not None and len(imu):
+        rows = "; ".join(",".join(f"{x:.2f}" for x in row) for row in imu)
+        lines.append(f"{head}IMU: {imu_rate:g}; {rows}")
+    return lines
+
+
+def link_line(dist, rng):
+    # Free-space loss at 915 MHz plus fading; SNR tracks RSSI above a -120 dBm floor
+    rssi = -40 - 20 * math.log10(max(dist, 1.0) / 10) - 31.6 + rng.normal(0, 2)
+    return f"Link: RSSI: {rssi:.0f}, SNR: {min(12.0, (rssi + 120) / 4):.2f}"
+
+
+# === OUTPUT ===
+def open_output(target):
+    if target == "stdout":
+        return sys.stdout.buffer.fileno(), None
+    if target == "pty":
+        master, slave = os.openpty()
+        print(f"Simulated serial port: {os.ttyname(slave)}", file=sys.stderr)
+        return master, slave
+    return os.open(target, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644), None
+
+
+def stream(traj, formats, rate, out_fd, gps_rate=1.0, speed=1.0, loss=0.0, link=True,
+           vehicle=None, timestamps=False, seed=0, imu_batch=10):
+    """Write the flight as receiver lines, paced at `speed` x real time (0 = flat out).
+
+    IMU lines carry imu_batch raw samples per packet, so the IMU runs at
+    rate * imu_batch Hz (limited by the simulation step).
+    """
+    s = resample(traj, rate, seed=seed)
+    imu = imu_samples(traj, rate * imu_batch, seed=seed + 2) if "imu" in formats else None
+    dt_sim = traj["t"][1] - traj["t"][0]
+    imu_rate = 1.0 / (max(1, int(round(1.0 / (rate * imu_batch * dt_sim)))) * dt_sim)
+    per_packet = len(imu) / len(s["t"]) if imu is not None else 0
+    rng = np.random.default_rng(seed + 1)
+    dropped = rng.random(len(s["t"])) < loss
+    gps_every = max(1, int(round(rate / gps_rate)))
+    start = time.perf_counter()
+    sent_sep = False
+    for i, t in enumerate(s["t"]):
+        if speed > 0:
+            delay = t / speed - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+        lines = []
+        if not dropped[i]:
+            batch = imu[int(i * per_packet):int((i + 1) * per_packet)] if imu is not None else None
+            lines += format_lines(s, i, formats, i % 65536, vehicle, batch, imu_rate)
+            if lines and link:
+                lines.append(link_line(s["dist"][i], rng))
+            if not sent_sep and t >= traj["t_sep"]:
+                sent_sep = True
+                lines.append("Received: EVENT: Stage separation")
+        if "gps" in formats and i % gps_every == 0:
+            lines.append(f"GPS: {s['lat_meas'][i]:.6f} {s['lon_meas'][i]:.6f} {s['alt_meas'][i]:.1f}")
+        if timestamps:
+            lines = [f"{t:.4f}\t{line}" for line in lines]
+        if lines:
+            os.write(out_fd, ("\r\n".join(lines) + "\r\n").encode())
+    return len(s["t"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulated telemetry for the ground-station receivers")
+    parser.add_argument("--format", default="receive", help="comma list of receive, stage, quat, imu, gps")
+    parser.add_argument("--rate", type=float, default=20.0, help="telemetry packet rate in Hz (up to kHz)")
+    parser.add_argument("--gps-rate", type=float, default=1.0, help="GPS line rate in Hz")
+    parser.add_argument("--out", default="stdout", help="stdout, pty, or a file path")
+    parser.add_argument("--speed", type=float, default=1.0, help="playback speed, 0 = as fast as possible")
+    parser.add_argument("--loss", type=float, default=0.0, help="fraction of packets to drop")
+    parser.add_argument("--vehicle", default=None, help="add an ID field to every packet")
+    parser.add_argument("--timestamps", action="store_true", help="prefix lines with '<t>\\t' like a recorded log")
+    parser.add_argument("--no-link", action="store_true", help="omit the Link: RSSI/SNR lines")
+    parser.add_argument("--imu-batch", type=int, default=10, help="raw IMU samples per imu packet")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    formats = set(args.format.split(","))
+    dt = min(0.001, 1.0 / args.rate)
+    traj = simulate(dt=dt)
+    fd, slave = open_output(args.out)
+    if slave is not None:
+        input("Open the port in the dashboard, then press Enter to launch...")
+    n = stream(traj, formats, args.rate, fd, gps_rate=args.gps_rate, speed=args.speed,
+               loss=args.loss, link=not args.no_link, vehicle=args.vehicle, timestamps=args.timestamps, seed=args.seed,
+               imu_batch=args.imu_batch)
+    apogee = traj["alt"].max() - traj["alt"][0]
+    print(f"Sent {n} packets; flight {traj['t'][-1]:.1f} s, apogee {apogee:.0f} m AGL", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()